@@ -0,0 +1,267 @@
+"""
+🔌 API - the page queries and recommendations as a JSON HTTP API
+Serves the same query functions as the app from an in-memory catalog snapshot.
+Started inside the Streamlit server it shares that process's catalog and
+indexes; standalone it loads its own (or maps CINEMATCH_SHARED_CATALOG).
+Responses are cached per route and normalized parameters until the catalog
+snapshot changes.
+
+    CINEMATCH_API_PORT=8700 streamlit run streamlit_app.py     # alongside the UI
+    python api.py --port 8700                                  # or on its own
+    curl 'http://127.0.0.1:8700/v1/mood?mood=happy&k=5'
+    python benchmarks/api_load.py --duration 10 --clients 4
+
+Routes (GET; lists are comma separated, ranges are "low-high"; every route takes k, default 20):
+  /v1/top-rated                    type=movie|tv rating=7-10 years=2010-2024 languages=English,Hindi platforms=Netflix
+  /v1/genre                        type genre=Action platforms
+  /v1/language                     type language=Hindi platforms
+  /v1/mood                         mood=happy (or 0-7) platforms
+  /v1/trending                     type=movie|tv
+  /v1/similar                      tconst=tt0111161
+  /v1/users/<id>/recommendations
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+import numpy as np
+from caches import BoundedCache, cache_report
+from catalog import PLATFORM_COLUMNS
+from diversity import diversify
+from queries import (
+    MOODS, MOVIE_TYPES, TV_TYPES, TRENDING_TV_TYPES, list_scope, mood_candidates, trending_rows, top_rated_rows, genre_rows, language_rows,
+)
+from recommend import CANDIDATES, similar_titles, user_recommendations
+
+API_PORT = int(os.environ.get('CINEMATCH_API_PORT', '0'))
+API_HOST = os.environ.get('CINEMATCH_API_HOST', '127.0.0.1')
+API_CACHE_MB = float(os.environ.get('CINEMATCH_API_CACHE_MB', '64'))
+MAX_K = 100
+# How often the standalone server looks for new delta files
+REFRESH_INTERVAL = 1.0
+TYPES = {'movie': MOVIE_TYPES, 'tv': TV_TYPES}
+TRENDING_TYPES = {'movie': None, 'tv': TRENDING_TV_TYPES}
+LOG = logging.getLogger('cinematch.api')
+RESULT_COLUMNS = ['tconst', 'primaryTitle', 'titleType', 'startYear', 'averageRating', 'numVotes', 'genres', 'language']
+
+class BadRequest(ValueError):
+    """A parameter the API cannot use; answered with 400 and the message"""
+
+# Parameter parsers; each returns a hashable, normalized value
+def parse_k(value):
+    if not value.isdigit() or not 1 <= int(value) <= MAX_K:
+        raise BadRequest(f"k must be between 1 and {MAX_K}")
+    return int(value)
+
+def parse_list(value):
+    return tuple(sorted({item.strip() for item in value.split(',') if item.strip()}))
+
+def parse_range(value):
+    low, sep, high = value.partition('-')
+    try:
+        return (float(low), float(high)) if sep else (float(low), float('inf'))
+    except ValueError:
+        raise BadRequest(f"bad range {value!r}, expected low-high") from None
+
+def parse_type(value):
+    if value not in TYPES:
+        raise BadRequest(f"type must be one of {', '.join(TYPES)}")
+    return value
+
+def parse_platforms(value):
+    platforms = parse_list(value)
+    unknown = [name for name in platforms if name not in PLATFORM_COLUMNS]
+    if unknown:
+        raise BadRequest(f"unknown platforms {', '.join(unknown)}; known: {', '.join(PLATFORM_COLUMNS)}")
+    return platforms
+
+def parse_mood(value):
+    labels = [label.split(' ', 1)[1].lower() for label, _ in MOODS]
+    if value.isdigit() and int(value) < len(MOODS):
+        return int(value)
+    if value.lower() in labels:
+        return labels.index(value.lower())
+    raise BadRequest(f"mood must be one of {', '.join(labels)} or 0-{len(MOODS) - 1}")
+
+def parse_text(value):
+    return value.strip()
+
+# Route -> (accepted parameters with their parsers, defaults)
+ROUTES = {
+    'top-rated': ({'type': parse_type, 'rating': parse_range, 'years': parse_range, 'languages': parse_list, 'platforms': parse_platforms}, {'type': 'movie'}),
+    'genre': ({'type': parse_type, 'genre': parse_text, 'platforms': parse_platforms}, {'type': 'movie'}),
+    'language': ({'type': parse_type, 'language': parse_text, 'platforms': parse_platforms}, {'type': 'movie'}),
+    'mood': ({'mood': parse_mood, 'platforms': parse_platforms}, {}),
+    'trending': ({'type': parse_type}, {'type': 'movie'}),
+    'similar': ({'tconst': parse_text}, {}),
+    'users': ({}, {}),
+}
+REQUIRED = {'genre': 'genre', 'language': 'language', 'mood': 'mood', 'similar': 'tconst'}
+
+# Normalized (route, params) of a request path; raises BadRequest, or KeyError for unknown routes
+def normalize(path, query):
+    parts = path.strip('/').split('/')
+    if parts[:1] != ['v1'] or len(parts) < 2:
+        raise KeyError(path)
+    route = parts[1]
+    if route == 'users':
+        if len(parts) != 4 or parts[3] != 'recommendations' or not parts[2].isdigit():
+            raise KeyError(path)
+    elif len(parts) != 2 or route not in ROUTES:
+        raise KeyError(path)
+    parsers, defaults = ROUTES[route]
+    params = dict(defaults, k=20)
+    for name, value in parse_qsl(query):
+        if name == 'k':
+            params['k'] = parse_k(value)
+        elif name in parsers:
+            params[name] = parsers[name](value)
+        else:
+            raise BadRequest(f"unknown parameter {name!r} for /v1/{route}")
+    if route in REQUIRED and REQUIRED[route] not in params:
+        raise BadRequest(f"/v1/{route} needs {REQUIRED[route]}")
+    if route == 'users':
+        params['user'] = int(parts[2])
+    return route, tuple(sorted(params.items()))
+
+# Catalog positions for a normalized request; None when the title or user is unknown
+def query(snapshot, route, params):
+    k = params['k']
+    platforms = params.get('platforms')
+    if route == 'mood':
+        return diversify(snapshot.movies, mood_candidates(snapshot, MOODS[params['mood']][1], CANDIDATES, platforms), k)
+    if route == 'trending':
+        return trending_rows(snapshot, TRENDING_TYPES[params['type']], k=k)
+    if route == 'similar':
+        return similar_titles(snapshot, params['tconst'], k)
+    if route == 'users':
+        return user_recommendations(snapshot, params['user'], k)
+    # Same row ids and query-cache entries as the list pages with these platforms picked
+    types = TYPES[params['type']]
+    rows = snapshot.rows_of_type(*types)
+    if platforms:
+        rows = snapshot.on_platforms(rows, platforms)
+    scope = list_scope(types, platforms)
+    if route == 'genre':
+        return genre_rows(snapshot, rows, params['genre'], k, scope)
+    if route == 'language':
+        return language_rows(snapshot, rows, params['language'], k, scope)
+    return top_rated_rows(snapshot, rows, params.get('rating'), params.get('years'), params.get('languages'), k, scope)
+
+def json_body(payload):
+    return json.dumps(payload).encode()
+
+class Api:
+    """Routes requests to the query functions and caches encoded responses"""
+
+    def __init__(self, get_snapshot, cache_mb=API_CACHE_MB):
+        self.get_snapshot = get_snapshot
+        self.cache = BoundedCache('api', cache_mb * 2 ** 20)
+        self.stats = {'requests': 0, 'hits': 0, 'errors': 0}
+        self.stats_lock = threading.Lock()
+
+    def count(self, name):
+        """Bump a /healthz counter; handlers run on many threads"""
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    def handle(self, path, query_string=''):
+        """(status, JSON body bytes) for a GET request"""
+        self.count('requests')
+        try:
+            route, params = normalize(path, query_string)
+        except KeyError:
+            return 404, json_body({'error': f"no route {path}"})
+        except BadRequest as e:
+            return 400, json_body({'error': str(e)})
+        snapshot = self.get_snapshot()
+        key = (snapshot.version, route, params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.count('hits')
+            return cached
+        try:
+            response = self.render(snapshot, route, dict(params))
+        except Exception:
+            self.count('errors')
+            LOG.exception("GET %s?%s failed", path, query_string)
+            return 500, json_body({'error': 'internal error'})
+        self.cache.put(key, response, size=len(response[1]))
+        return response
+
+    def render(self, snapshot, route, params):
+        rows = query(snapshot, route, params)
+        if rows is None:
+            return 404, json_body({'error': 'unknown title' if route == 'similar' else 'unknown user'})
+        results = snapshot.rows(np.asarray(rows, dtype=np.int64))[RESULT_COLUMNS].to_json(orient='records')
+        return 200, f'{{"version":{snapshot.version},"count":{len(rows)},"results":{results}}}'.encode()
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """Keep-alive JSON responses; the Api instance hangs off the server"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        api = self.server.api
+        if url.path == '/healthz':
+            with api.stats_lock:
+                stats = dict(api.stats)
+            status, body = 200, json_body(dict(stats, version=api.get_snapshot().version, cached=len(api.cache)))
+        elif url.path == '/admin/caches':
+            status, body = 200, json_body(cache_report())
+        else:
+            status, body = api.handle(url.path, url.query)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_api_server(get_snapshot, port=API_PORT, host=API_HOST):
+    """Serve on a daemon thread; return (server, base_url), call server.shutdown() when done"""
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    server.api = Api(get_snapshot)
+    threading.Thread(target=server.serve_forever, name='cinematch-api', daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+# Live snapshot of a CatalogStore, checking for delta files at most once per interval
+def throttled_refresh(store, interval=REFRESH_INTERVAL):
+    state = {'checked': 0.0}
+
+    def get_snapshot():
+        now = time.monotonic()
+        if now - state['checked'] >= interval:
+            state['checked'] = now
+            return store.refresh()
+        return store.snapshot
+    return get_snapshot
+
+def main():
+    parser = argparse.ArgumentParser(description="CineMatch JSON API")
+    parser.add_argument('--host', default=API_HOST)
+    parser.add_argument('--port', type=int, default=API_PORT or 8700)
+    parser.add_argument('--data-dir', default='data')
+    args = parser.parse_args()
+
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    from catalog import CatalogStore
+    store = CatalogStore(args.data_dir, shared_dir=os.environ.get('CINEMATCH_SHARED_CATALOG'))
+    server, url = start_api_server(throttled_refresh(store), args.port, args.host)
+    print(f"Serving {len(store.snapshot.movies):,} titles on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+"""
+📦 Batch Export - top-k recommendations for every user and every title, offline
+For email digests and pre-rendered pages. The parent process writes the title
+feature matrix, one profile per user in user_interactions.csv and each user's
+rated titles as .npy files, then a process pool scores shards of users (and of
+titles) against blocks of titles with one matrix multiply per block, keeping a
+running top k. Titles are visited best rated first, so a shard stops as soon
+as no remaining title can enter any of its lists. Workers map the inputs read-only and write their rows straight
+into the mapped output files.
+
+Scores are the ones the app ranks with: rating/10 + PROFILE_WEIGHT × profile
+similarity, over the whole catalog rather than a candidate pool. Rated titles
+are excluded from a user's list and a title from its own.
+
+    python batch.py export --k 20 --workers 8        # writes data/batch/
+    python batch.py show --user 42
+    python batch.py show --title tt0111161
+
+Output (replaced atomically; ids are catalog positions, -1 pads short lists):
+    titles.txt                              tconst of every position
+    users.npy                               user_id per row of the user lists
+    user_ids.npy, user_scores.npy           int32 / float16, one row of k per user
+    similar_ids.npy, similar_scores.npy     int32 / float16, one row of k per title
+    manifest.json                           k, counts, timings and throughput
+"""
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from recommend import PROFILE_DECAY, PROFILE_WEIGHT, SHOWN, item_features
+
+BATCH_DIR = os.environ.get('CINEMATCH_BATCH_DIR', os.path.join('data', 'batch'))
+# Users (or titles) per task, and titles per matrix multiply
+SHARD_ROWS = 4096
+BLOCK_ITEMS = 8192
+# Profiles are built from each user's latest well-rated titles, as SessionRecommender.seed does
+MIN_RATING = 7
+PROFILE_TITLES = 50
+# Files prepare() writes for the workers, removed once scoring is done
+INPUTS = ('items', 'ratings', 'order', 'positions', 'profiles', 'rated_indptr', 'rated_rows')
+# Inputs and outputs each worker maps once
+WORKER = {}
+
+# Profile of every user code: decayed sum of the binary features of their latest well-rated titles (rated before end)
+def user_profiles(snapshot, matrix, end=None):
+    store = snapshot.interactions
+    positions = pd.Index(snapshot.movies['tconst']).get_indexer(store.items.values) if len(store.items) else np.empty(0, dtype=np.int64)
+    users, rows, stamps, rated_users, rated_rows = [], [], [], [], []
+    for chunk in store.chunks(end=end, columns=['user', 'item', 'rating', 'timestamp']):
+        row = positions[chunk['item'].to_numpy()]
+        known = row >= 0
+        rated_users.append(chunk['user'].to_numpy()[known])
+        rated_rows.append(row[known])
+        good = known & (chunk['rating'].to_numpy() >= MIN_RATING)
+        users.append(chunk['user'].to_numpy()[good])
+        rows.append(row[good])
+        stamps.append(chunk['timestamp'].to_numpy()[good])
+    empty = [np.empty(0, dtype=np.int64)]
+    users, rows, stamps = (np.concatenate(part or empty).astype(np.int64) for part in (users, rows, stamps))
+
+    # Oldest first per user, first rating of a title only, then the latest PROFILE_TITLES of those
+    order = np.lexsort((stamps, users))
+    users, rows = users[order], rows[order]
+    pairs = pd.DataFrame({'user': users, 'row': rows}).drop_duplicates(keep='first')
+    users, rows = pairs['user'].to_numpy(), pairs['row'].to_numpy()
+    from_end = np.zeros(len(users), dtype=np.int64)
+    if len(users):
+        last = np.r_[np.flatnonzero(np.diff(users)), len(users) - 1]
+        ends = np.repeat(last, np.diff(np.r_[-1, last]))
+        from_end = ends - np.arange(len(users))
+    keep = from_end < PROFILE_TITLES
+    users, rows, weights = users[keep], rows[keep], PROFILE_DECAY ** from_end[keep].astype(np.float32)
+
+    profiles = np.zeros((store.user_count, matrix.shape[1]), dtype=np.float32)
+    for feature, column in enumerate(matrix.T > 0):
+        profiles[:, feature] = np.bincount(users, weights=weights * column[rows], minlength=store.user_count)
+    norms = np.linalg.norm(profiles, axis=1, keepdims=True)
+    profiles /= np.where(norms == 0, 1, norms)
+
+    # Rated titles per user code, CSR style
+    rated = pd.DataFrame({'user': np.concatenate(rated_users or empty), 'row': np.concatenate(rated_rows or empty)}).drop_duplicates()
+    rated = rated.sort_values(['user', 'row'], kind='stable')
+    indptr = np.r_[0, np.cumsum(np.bincount(rated['user'].to_numpy(), minlength=store.user_count))]
+    return profiles, indptr.astype(np.int64), rated['row'].to_numpy().astype(np.int32)
+
+# Keep the k best (score, id) columns of each row, best first
+def merge_top_k(best_scores, best_ids, scores, ids, k):
+    scores = np.hstack([best_scores, scores])
+    ids = np.hstack([best_ids, ids])
+    if scores.shape[1] > k:
+        keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, keep, axis=1)
+        ids = np.take_along_axis(ids, keep, axis=1)
+    order = np.argsort(-scores, axis=1, kind='stable')
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+# Merge a block into full top-k lists, looking only at scores above each row's current k-th best
+def merge_above(best_scores, best_ids, scores, first, k):
+    rows, columns = np.nonzero(scores > best_scores[:, -1:])
+    if not len(rows):
+        return best_scores, best_ids
+    count = len(best_scores)
+    rows = np.concatenate([np.repeat(np.arange(count), k), rows])
+    merged_scores = np.concatenate([best_scores.ravel(), scores[rows[count * k:], columns]])
+    merged_ids = np.concatenate([best_ids.ravel(), (columns + first).astype(np.int32)])
+    order = np.lexsort((-merged_scores, rows))
+    rows = rows[order]
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    keep = order[rank < k]
+    return merged_scores[keep].reshape(count, k), merged_ids[keep].reshape(count, k)
+
+# Open the inputs and outputs of an export in a worker
+def open_worker(root):
+    WORKER.clear()
+    for name in INPUTS:
+        WORKER[name] = np.load(os.path.join(root, f'{name}.npy'), mmap_mode='r')
+    for name in ('user_ids', 'user_scores', 'similar_ids', 'similar_scores'):
+        WORKER[name] = np.load(os.path.join(root, f'{name}.npy'), mmap_mode='r+')
+
+# Score rows [start, stop) of 'users' or 'similar' against every title; returns the rows done
+def score_shard(kind, start, stop, k, block=BLOCK_ITEMS):
+    items, ratings, order = WORKER['items'], WORKER['ratings'], WORKER['order']
+    if kind == 'users':
+        queries = np.asarray(WORKER['profiles'][start:stop])
+    else:
+        own = np.asarray(WORKER['positions'][start:stop])
+        queries = items[own]
+    count = stop - start
+    best_scores = np.full((count, 0), -np.inf, dtype=np.float32)
+    best_ids = np.full((count, 0), -1, dtype=np.int32)
+    if kind == 'users':
+        indptr = WORKER['rated_indptr']
+        rated_rows = np.asarray(WORKER['rated_rows'][indptr[start]:indptr[stop]])
+        rated_users = np.repeat(np.arange(count), np.diff(indptr[start:stop + 1]))
+        by_row = np.argsort(rated_rows, kind='stable')
+        rated_rows, rated_users = rated_rows[by_row], rated_users[by_row]
+    for first in range(0, len(items), block):
+        last = min(first + block, len(items))
+        if best_scores.shape[1] < k:
+            open_rows = np.arange(count)
+        else:
+            # Titles come best rated first: a row whose k-th best beats the highest
+            # score left (rating + full similarity) is done, and so is the shard once all are
+            open_rows = np.flatnonzero(best_scores[:, -1] < ratings[first] + PROFILE_WEIGHT)
+            if not len(open_rows):
+                break
+        scores = np.asarray(ratings[first:last]) + PROFILE_WEIGHT * (queries[open_rows] @ np.asarray(items[first:last]).T)
+        local = np.full(count, -1)
+        local[open_rows] = np.arange(len(open_rows))
+        if kind == 'users':
+            lo, hi = np.searchsorted(rated_rows, [first, last])
+            users, rows = local[rated_users[lo:hi]], rated_rows[lo:hi]
+        else:
+            users, rows = local, own
+        excluded = (users >= 0) & (rows >= first) & (rows < last)
+        scores[users[excluded], rows[excluded] - first] = -np.inf
+        if best_scores.shape[1] == k:
+            best_scores[open_rows], best_ids[open_rows] = merge_above(best_scores[open_rows], best_ids[open_rows], scores, first, k)
+            continue
+        ids = np.broadcast_to(np.arange(first, last, dtype=np.int32), scores.shape)
+        if scores.shape[1] > k:
+            keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores, ids = np.take_along_axis(scores, keep, axis=1), np.take_along_axis(ids, keep, axis=1)
+        best_scores, best_ids = merge_top_k(best_scores, best_ids, scores, ids, k)
+    best_ids = np.where(np.isfinite(best_scores), order[best_ids], -1)
+    prefix = 'user' if kind == 'users' else 'similar'
+    WORKER[f'{prefix}_ids'][start:stop, :best_ids.shape[1]] = best_ids
+    WORKER[f'{prefix}_scores'][start:stop, :best_ids.shape[1]] = np.where(best_ids >= 0, best_scores, np.nan)
+    return count
+
+# Write the inputs and empty outputs of an export to root, from interactions before end; returns the row counts to score
+def prepare(snapshot, root, k, end=None):
+    features = item_features(snapshot)
+    matrix = features.vectors(np.arange(len(snapshot.movies))).astype(np.float32)
+    profiles, indptr, rated_rows = user_profiles(snapshot, matrix, end)
+    # Titles are scored in rating order; order maps a slot to its catalog position, positions back
+    order = np.argsort(-features.rating, kind='stable').astype(np.int32)
+    positions = np.empty_like(order)
+    positions[order] = np.arange(len(order), dtype=np.int32)
+    np.save(os.path.join(root, 'items.npy'), matrix[order])
+    np.save(os.path.join(root, 'ratings.npy'), features.rating[order].astype(np.float32))
+    np.save(os.path.join(root, 'order.npy'), order)
+    np.save(os.path.join(root, 'positions.npy'), positions)
+    np.save(os.path.join(root, 'profiles.npy'), profiles)
+    np.save(os.path.join(root, 'rated_indptr.npy'), indptr)
+    np.save(os.path.join(root, 'rated_rows.npy'), positions[rated_rows])
+    np.save(os.path.join(root, 'users.npy'), np.asarray(snapshot.interactions.users.values).astype(np.int64))
+    with open(os.path.join(root, 'titles.txt'), 'w') as f:
+        f.writelines(f"{tconst}\n" for tconst in snapshot.movies['tconst'])
+    for prefix, rows in (('user', len(profiles)), ('similar', len(matrix))):
+        np.lib.format.open_memmap(os.path.join(root, f'{prefix}_ids.npy'), 'w+', np.int32, (rows, k))[:] = -1
+        np.lib.format.open_memmap(os.path.join(root, f'{prefix}_scores.npy'), 'w+', np.float16, (rows, k))[:] = np.nan
+    return {'users': len(profiles), 'similar': len(matrix)}
+
+def export(snapshot, root=BATCH_DIR, k=SHOWN, workers=None, shard=SHARD_ROWS, kinds=('users', 'similar'), progress=None):
+    """Score every user and title into root, replacing any previous export atomically; returns the manifest"""
+    workers = workers or os.cpu_count() or 1
+    staging = f"{root.rstrip(os.sep)}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    started = time.perf_counter()
+    counts = prepare(snapshot, staging, k)
+    timings = {'prepare_s': time.perf_counter() - started}
+
+    # One BLAS thread per process; the pool is the parallelism
+    for name in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ.setdefault(name, '1')
+    context = multiprocessing.get_context('spawn')
+    titles = counts['similar']
+    throughput = {}
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=open_worker, initargs=(staging,)) as pool:
+        for kind in kinds:
+            began = time.perf_counter()
+            tasks = [pool.submit(score_shard, kind, start, min(start + shard, counts[kind]), k) for start in range(0, counts[kind], shard)]
+            done = 0
+            for task in tasks:
+                done += task.result()
+                if progress:
+                    progress(f"{kind}: {done:,}/{counts[kind]:,}")
+            seconds = time.perf_counter() - began
+            timings[f'{kind}_s'] = seconds
+            # Scores per second as if every (row, title) pair were scored, pruned or not
+            throughput[kind] = {'rows': counts[kind], 'rows_per_s': counts[kind] / seconds if seconds else 0.0,
+                                'scores_per_s': counts[kind] * titles / seconds if seconds else 0.0}
+    for name in INPUTS:
+        os.remove(os.path.join(staging, f'{name}.npy'))
+    for kind in ('users', 'similar'):
+        if kind not in kinds:
+            prefix = 'user' if kind == 'users' else 'similar'
+            for suffix in ('ids', 'scores'):
+                os.remove(os.path.join(staging, f'{prefix}_{suffix}.npy'))
+
+    timings['total_s'] = time.perf_counter() - started
+    manifest = {'k': k, 'version': snapshot.version, 'created': int(time.time()), 'workers': workers,
+                'titles': titles, 'users': counts['users'] if 'users' in kinds else 0,
+                'timings': timings, 'throughput': throughput}
+    with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    retired = f"{root.rstrip(os.sep)}.old-{os.getpid()}"
+    if os.path.exists(root):
+        os.rename(root, retired)
+    os.rename(staging, root)
+    shutil.rmtree(retired, ignore_errors=True)
+    return manifest
+
+class BatchExport:
+    """Read view of an export; lists are mapped, so opening one is cheap"""
+
+    def __init__(self, root=BATCH_DIR):
+        self.root = root
+        with open(os.path.join(root, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        with open(os.path.join(root, 'titles.txt')) as f:
+            self.titles = np.array(f.read().split('\n')[:-1], dtype=object)
+        self.lists = {}
+        for prefix in ('user', 'similar'):
+            if os.path.exists(os.path.join(root, f'{prefix}_ids.npy')):
+                self.lists[prefix] = (np.load(os.path.join(root, f'{prefix}_ids.npy'), mmap_mode='r'),
+                                      np.load(os.path.join(root, f'{prefix}_scores.npy'), mmap_mode='r'))
+        self.users = pd.Index(np.load(os.path.join(root, 'users.npy'))) if 'user' in self.lists else pd.Index([])
+        self.title_index = pd.Index(self.titles)
+
+    def _list(self, prefix, row):
+        ids, scores = self.lists[prefix]
+        ids, scores = np.asarray(ids[row]), np.asarray(scores[row])
+        keep = ids >= 0
+        return pd.DataFrame({'tconst': self.titles[ids[keep]], 'score': scores[keep].astype(np.float32)})
+
+    def for_user(self, user_id):
+        """(tconst, score) of a user's list, best first; None for a user not in the export"""
+        row = self.users.get_indexer([user_id])[0]
+        return self._list('user', row) if row >= 0 else None
+
+    def similar_to(self, tconst):
+        """(tconst, score) of the titles most like tconst, best first; None for an unknown title"""
+        row = self.title_index.get_indexer([tconst])[0]
+        return self._list('similar', row) if row >= 0 and 'similar' in self.lists else None
+
+def main():
+    parser = argparse.ArgumentParser(description="CineMatch batch recommendation export")
+    parser.add_argument('--output', default=BATCH_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    run = sub.add_parser('export', help="score every user and title")
+    run.add_argument('--data-dir', default='data')
+    run.add_argument('--k', type=int, default=SHOWN)
+    run.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    run.add_argument('--shard', type=int, default=SHARD_ROWS, help="users or titles per task")
+    run.add_argument('--only', choices=('users', 'similar'), help="export one kind of list")
+    show = sub.add_parser('show', help="print one list from an export")
+    show.add_argument('--user', type=int)
+    show.add_argument('--title')
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        if (args.user is None) == (args.title is None):
+            parser.error("show needs one of --user or --title")
+        batch = BatchExport(args.output)
+        found = batch.for_user(args.user) if args.user is not None else batch.similar_to(args.title)
+        if found is None:
+            print(f"{args.user if args.user is not None else args.title} is not in the export")
+        else:
+            print(found.to_string(index=False))
+        return
+
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    from catalog import load_data
+    snapshot = load_data(args.data_dir, os.environ.get('CINEMATCH_SHARED_CATALOG'))
+    kinds = (args.only,) if args.only else ('users', 'similar')
+    manifest = export(snapshot, args.output, args.k, args.workers, args.shard, kinds, progress=print)
+    timings = manifest['timings']
+    print(f"Prepared features and {manifest['users']:,} user profiles in {timings['prepare_s']:.1f}s")
+    for kind, result in manifest['throughput'].items():
+        print(f"{kind}: {result['rows']:,} lists in {timings[f'{kind}_s']:.1f}s, {result['rows_per_s']:,.0f}/s, "
+              f"{result['scores_per_s'] / 1e6:,.0f}M scores/s")
+    print(f"Wrote top {manifest['k']} lists to {args.output} in {timings['total_s']:.1f}s with {manifest['workers']} workers")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+🔌 API Load Test - requests per second and latency of the JSON API
+Starts `python api.py` in its own process (or targets --url), then drives it
+from client processes with keep-alive connections over a mix of routes and
+parameters. The first pass over the mix is reported separately (cache misses).
+
+    python benchmarks/api_load.py --duration 10 --clients 4
+    python benchmarks/api_load.py --url http://127.0.0.1:8700 --output api.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import statistics
+import subprocess
+import http.client
+import multiprocessing
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from queries import MOODS
+
+# Request mix: the list pages' filters, moods, trending and title/user recommendations
+def request_mix(tconsts, users, seed=0):
+    rng = random.Random(seed)
+    paths = []
+    for kind in ('movie', 'tv'):
+        for low in (6, 7, 8):
+            paths.append(f"/v1/top-rated?type={kind}&rating={low}-10&years=2010-2024&languages=English,Hindi")
+        for genre in ('Action', 'Drama', 'Comedy', 'Thriller', 'Romance'):
+            paths.append(f"/v1/genre?type={kind}&genre={genre}")
+        for language in ('English', 'Hindi', 'Tamil', 'Telugu'):
+            paths.append(f"/v1/language?type={kind}&language={language}")
+        paths.append(f"/v1/trending?type={kind}&k=5")
+    for mood in range(len(MOODS)):
+        paths += [f"/v1/mood?mood={mood}", f"/v1/mood?mood={mood}&platforms=Netflix"]
+    paths += [f"/v1/similar?tconst={tconst}&k=10" for tconst in rng.sample(tconsts, min(50, len(tconsts)))]
+    paths += [f"/v1/users/{user}/recommendations?k=10" for user in rng.sample(users, min(20, len(users)))]
+    return paths
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_ready(url, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection(urlsplit(url).netloc, timeout=5)
+            connection.request('GET', '/healthz')
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"API at {url} did not come up")
+
+# One client process: keep-alive requests over the mix until the deadline
+def client(netloc, paths, deadline, seed, results):
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection(netloc, timeout=30)
+    latencies, errors = [], 0
+    while time.time() < deadline:
+        start = time.perf_counter()
+        connection.request('GET', rng.choice(paths))
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        errors += response.status >= 500
+    results.put((latencies, errors))
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+def run(url, paths, duration, clients):
+    netloc = urlsplit(url).netloc
+    connection = http.client.HTTPConnection(netloc, timeout=120)
+    cold = []
+    for path in paths:
+        start = time.perf_counter()
+        connection.request('GET', path)
+        connection.getresponse().read()
+        cold.append(time.perf_counter() - start)
+
+    results = multiprocessing.Queue()
+    deadline = time.time() + duration
+    workers = [multiprocessing.Process(target=client, args=(netloc, paths, deadline, seed, results)) for seed in range(clients)]
+    for worker in workers:
+        worker.start()
+    collected = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    latencies = [latency for part, _ in collected for latency in part]
+    connection.request('GET', '/healthz')
+    server = json.loads(connection.getresponse().read())
+    return {
+        'paths': len(paths),
+        'cold': {'mean_ms': 1000 * statistics.mean(cold), 'p99_ms': 1000 * percentile(cold, 0.99), 'max_ms': 1000 * max(cold)},
+        'warm': {
+            'requests': len(latencies),
+            'rps': len(latencies) / duration,
+            'p50_ms': 1000 * percentile(latencies, 0.5),
+            'p99_ms': 1000 * percentile(latencies, 0.99),
+            'errors': sum(errors for _, errors in collected),
+        },
+        'server': server,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="CineMatch JSON API load test")
+    parser.add_argument('--url', help="running API to test (default: start api.py)")
+    parser.add_argument('--data-dir', default=os.path.join(ROOT, 'data'))
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    from catalog import load_data
+    snapshot = load_data(args.data_dir, os.environ.get('CINEMATCH_SHARED_CATALOG'))
+    paths = request_mix(list(snapshot.movies['tconst']), [int(u) for u in snapshot.interactions.users.values[:1000]])
+
+    server = None
+    url = args.url
+    if not url:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'api.py'), '--port', str(port), '--data-dir', args.data_dir],
+                                  cwd=ROOT, stdout=subprocess.DEVNULL)
+    try:
+        wait_ready(url)
+        result = run(url, paths, args.duration, args.clients)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    cold, warm = result['cold'], result['warm']
+    print(f"{result['paths']} distinct requests, first pass: mean {cold['mean_ms']:.1f} ms, p99 {cold['p99_ms']:.1f} ms, max {cold['max_ms']:.1f} ms")
+    print(f"{warm['requests']:,} requests in {args.duration:.0f}s from {args.clients} clients: {warm['rps']:,.0f} req/s, "
+          f"p50 {warm['p50_ms']:.2f} ms, p99 {warm['p99_ms']:.2f} ms, {warm['errors']} errors")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+⏱ Startup Benchmark - import-to-first-paint for streamlit_app.py
+Runs the app headlessly in a fresh interpreter, then visits every page, and
+records timings plus which heavy modules each page pulled in.
+
+    python benchmarks/startup.py --repeat 3 --max-first-paint 4.0 --output startup.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+APP = os.path.join(ROOT, 'streamlit_app.py')
+# Modules that should only load on the pages that need them
+HEAVY_MODULES = ['plotly.express', 'PIL.Image']
+
+# One cold start, measured inside a fresh interpreter
+def measure_once():
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    imported = time.perf_counter()
+
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.run()
+    first_paint = time.perf_counter()
+    # Imported after the first paint, so the cold start is measured without it
+    from queries import PAGES
+    result = {
+        'import_s': imported - start,
+        'first_paint_s': first_paint - start,
+        'exceptions': [e.message for e in at.exception],
+        'pages': {},
+    }
+
+    for page in PAGES:
+        page_start = time.perf_counter()
+        at.radio[0].set_value(page).run()
+        result['pages'][page] = {
+            'rerun_s': time.perf_counter() - page_start,
+            'heavy_modules': [name for name in HEAVY_MODULES if name in sys.modules],
+        }
+    return result
+
+def run_child():
+    # The app reads data/ relative to the working directory
+    os.chdir(ROOT)
+    print(json.dumps(measure_once()))
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CineMatch cold start")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-first-paint', type=float, help="exit non-zero if the median first paint is slower (seconds)")
+    parser.add_argument('--output', help="write results as JSON")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child()
+        return
+
+    from queries import PAGES
+    runs = []
+    for _ in range(args.repeat):
+        out = subprocess.run([sys.executable, __file__, '--child'], capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    summary = {
+        'import_s': statistics.median(r['import_s'] for r in runs),
+        'first_paint_s': statistics.median(r['first_paint_s'] for r in runs),
+        'pages': {
+            page: {
+                'rerun_s': statistics.median(r['pages'][page]['rerun_s'] for r in runs),
+                'heavy_modules': runs[-1]['pages'][page]['heavy_modules'],
+            }
+            for page in PAGES
+        },
+        'runs': runs,
+    }
+
+    print(f"import          {summary['import_s']:.3f}s")
+    print(f"first paint     {summary['first_paint_s']:.3f}s")
+    for page, stats in summary['pages'].items():
+        print(f"{page:<15} {stats['rerun_s']:.3f}s  loaded: {', '.join(stats['heavy_modules']) or '-'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+    errors = [e for r in runs for e in r['exceptions']]
+    if errors:
+        print(f"App raised: {errors[0]}")
+        sys.exit(1)
+    if args.max_first_paint and summary['first_paint_s'] > args.max_first_paint:
+        print(f"First paint {summary['first_paint_s']:.3f}s exceeds {args.max_first_paint:.3f}s")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""
+📈 Benchmark Suite - page renders, catalog queries and enrichment throughput
+Everything runs against the local mock upstream, so results are comparable
+across commits and machines without network access.
+
+    python benchmarks/suite.py                           # all sections, 10K/150K/1M rows
+    python benchmarks/suite.py --sizes 10000 150000 --skip-pages
+    python benchmarks/suite.py --compare benchmarks/results/<old commit>.json
+
+Results are written to benchmarks/results/<commit>.json unless --output is given.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import statistics
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import datagen
+
+APP = os.path.join(ROOT, 'streamlit_app.py')
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+DEFAULT_SIZES = [10_000, 150_000, 1_000_000]
+MOOD_BUTTONS = 8
+
+# Median/min wall time of repeated calls
+def timed(fn, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {'median_ms': statistics.median(samples) * 1000, 'min_ms': min(samples) * 1000}
+
+# Synthetic catalog with five interactions per title
+def write_catalog(rows, directory):
+    return datagen.write_dataset(directory, rows, rows * 5, max(rows // 10, 100), progress=lambda message: None)
+
+# Catalog load and query microbenchmarks for one catalog size
+def bench_catalog(rows, repeat):
+    import catalog
+
+    workdir = tempfile.mkdtemp(prefix=f"cinematch-bench-{rows}-")
+    try:
+        data_dir = write_catalog(rows, workdir)
+        result = {'load_data': timed(lambda: catalog.load_data(data_dir), repeat=min(repeat, 3))}
+        shared_dir = os.path.join(workdir, 'shared')
+        catalog.load_data(data_dir, shared_dir)
+        result['open_shared'] = timed(lambda: catalog.open_shared(shared_dir), repeat=min(repeat, 3))
+
+        snapshot = catalog.load_data(data_dir)
+        movie_rows = snapshot.rows_of_type('movie', 'tvMovie')
+        queries = {
+            'top_rated': lambda: snapshot.top_k(snapshot.filter_rows(movie_rows, rating=(7.0, 10.0), years=(2010, 2024), languages=['English', 'Hindi'])),
+            'by_genre': lambda: snapshot.top_k(snapshot.rows_with_genres(['Drama'], within=movie_rows)),
+            'by_language': lambda: snapshot.top_k(snapshot.rows_in_language('Hindi', within=movie_rows)),
+            'mood': lambda: snapshot.top_k(snapshot.rows_with_genres(['Action', 'Thriller'])),
+            'trending': lambda: snapshot.top_k(k=5, by='numVotes'),
+            'genre_options': lambda: snapshot.genres_within(movie_rows),
+            'indian': lambda: catalog.top_k(snapshot.indian_movies, catalog.filter_rows(snapshot.indian_movies, rating=(6.0, 10.0), languages=['Hindi'])),
+            'popularity_last_90d': lambda: snapshot.interactions.item_counts(start=1_760_000_000 - 90 * 86_400),
+            'user_history': lambda: snapshot.interactions.user_history(1),
+            'render_rows': lambda: catalog.generate_plot_descriptions(snapshot.rows(snapshot.top_k(movie_rows))),
+            'plot_descriptions_all': lambda: catalog.generate_plot_descriptions(snapshot.movies),
+        }
+        result['queries'] = {name: timed(query, repeat) for name, query in queries.items()}
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# Enrichment throughput against the mock upstream (bypassing the response caches)
+def bench_enrichment(titles, workers):
+    import upstream
+
+    fetch = upstream.get_movie_details.__wrapped__
+    decode = upstream.get_image.__wrapped__
+    calls = [(row.primaryTitle, row.startYear, row.tconst, row.titleType) for row in titles.itertuples()]
+    urls = [upstream.tmdb_image_url(f"/poster-{i}.jpg") for i in range(len(calls))]
+
+    def throughput(fn, args, pool_size):
+        start = time.perf_counter()
+        if pool_size == 1:
+            for arg in args:
+                fn(*arg)
+        else:
+            with ThreadPoolExecutor(max_workers=pool_size) as pool:
+                list(pool.map(lambda arg: fn(*arg), args))
+        elapsed = time.perf_counter() - start
+        return {'calls': len(args), 'total_s': elapsed, 'calls_per_s': len(args) / elapsed}
+
+    cached = upstream.get_movie_details
+    cached(*calls[0])
+    return {
+        'get_movie_details_serial': throughput(fetch, calls, 1),
+        'get_movie_details_pooled': throughput(fetch, calls, workers),
+        'get_movie_details_cache_hit': timed(lambda: cached(*calls[0]), repeat=50),
+        'get_image_serial': throughput(decode, [(url,) for url in urls], 1),
+        'get_image_pooled': throughput(decode, [(url,) for url in urls], workers),
+    }
+
+# Headless page renders with AppTest: cold (empty st caches) and warm
+def bench_pages(rows, timeout):
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+    from caches import clear_caches
+    from queries import PAGES
+
+    # Result names from the labels after Home, e.g. "📺 TV Series" -> tv_series
+    pages = {label.split(' ', 1)[1].lower().replace(' ', '_'): label for label in PAGES[1:]}
+    workdir = tempfile.mkdtemp(prefix='cinematch-pages-')
+    cwd = os.getcwd()
+    try:
+        write_catalog(rows, workdir)
+        os.chdir(workdir)
+
+        def visit(action):
+            at = AppTest.from_file(APP, default_timeout=timeout)
+            at.run()
+            start = time.perf_counter()
+            action(at)
+            elapsed = time.perf_counter() - start
+            if at.exception:
+                raise RuntimeError(at.exception[0].message)
+            return elapsed
+
+        def scenario(action):
+            st.cache_data.clear()
+            clear_caches()
+            cold = visit(action)
+            warm = visit(action)
+            return {'cold_s': cold, 'warm_s': warm}
+
+        start = time.perf_counter()
+        AppTest.from_file(APP, default_timeout=timeout).run()
+        result = {'catalog_rows': rows, 'first_run_s': time.perf_counter() - start}
+        st.cache_data.clear()
+        clear_caches()
+        result['home'] = scenario(lambda at: at.run())
+        for i in range(MOOD_BUTTONS):
+            result[f'home_mood_{i}'] = scenario(lambda at, i=i: at.button(key=f"mood_{i}").click().run())
+        for name, label in pages.items():
+            result[name] = scenario(lambda at, label=label: at.radio[0].set_value(label).run())
+        return result
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# Flatten nested results to {"a.b.c": value}
+def flatten(tree, prefix=''):
+    flat = {}
+    for key, value in tree.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+def compare(baseline_path, current):
+    """Print metric ratios current/baseline; time metrics >10% slower are flagged"""
+    with open(baseline_path) as f:
+        baseline = flatten(json.load(f)['results'])
+    current = flatten(current['results'])
+    print(f"\n{'metric':<60} {'baseline':>12} {'current':>12} {'ratio':>7}")
+    for name in sorted(set(baseline) & set(current)):
+        if not (name.endswith('_ms') or name.endswith('_s') or name.endswith('_per_s')):
+            continue
+        old, new = baseline[name], current[name]
+        ratio = new / old if old else float('nan')
+        worse = ratio < 0.9 if name.endswith('_per_s') else ratio > 1.1
+        print(f"{name:<60} {old:>12.3f} {new:>12.3f} {ratio:>6.2f}x{'  ⚠' if worse else ''}")
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True)
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        return out.stdout.strip() + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def main():
+    parser = argparse.ArgumentParser(description="CineMatch benchmark suite")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="catalog sizes for the microbenchmarks")
+    parser.add_argument('--page-rows', type=int, default=150_000, help="catalog size for the page renders")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=50, help="mock upstream latency in ms")
+    parser.add_argument('--enrichment-calls', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--timeout', type=float, default=300, help="AppTest timeout per run in seconds")
+    parser.add_argument('--skip-pages', action='store_true')
+    parser.add_argument('--skip-micro', action='store_true')
+    parser.add_argument('--output')
+    parser.add_argument('--compare', help="baseline results JSON to compare against")
+    args = parser.parse_args()
+
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    # Background prefetch would warm the caches between the cold and warm visits
+    os.environ.setdefault('CINEMATCH_PREFETCH', '0')
+    from mock_upstream import start_mock_upstream
+    server, base_url = start_mock_upstream(latency=args.latency)
+    os.environ['CINEMATCH_UPSTREAM'] = base_url
+    # Measure the app and the mock, not the upstream rate limiter
+    os.environ['CINEMATCH_UPSTREAM_RPS'] = '0'
+    os.environ['CINEMATCH_UPSTREAM_BACKGROUND_RPS'] = '0'
+
+    results = {}
+    if not args.skip_micro:
+        results['catalog'] = {}
+        for rows in args.sizes:
+            print(f"catalog {rows:,} rows...", flush=True)
+            results['catalog'][str(rows)] = bench_catalog(rows, args.repeat)
+        print("enrichment...", flush=True)
+        titles = datagen.generate_movies(args.enrichment_calls, seed=1)
+        results['enrichment'] = bench_enrichment(titles, args.workers)
+    if not args.skip_pages:
+        print(f"pages ({args.page_rows:,} rows, {args.latency:.0f}ms upstream)...", flush=True)
+        results['pages'] = bench_pages(args.page_rows, args.timeout)
+    server.shutdown()
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'settings': vars(args),
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for name, value in flatten(results).items():
+        print(f"{name:<60} {value:>12.3f}")
+    print(f"\nWrote {output}")
+    if args.compare:
+        compare(args.compare, report)
+
+if __name__ == '__main__':
+    main()
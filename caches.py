@@ -0,0 +1,227 @@
+"""
+🗄️ Caches - byte-budgeted in-process caches with LRU/LFU eviction and statistics
+Every cache estimates the size of what it stores (JSON payloads, decoded
+images, arrays, frames) and evicts least recently or least frequently used
+entries to stay within its budget. Expired entries are dropped when read.
+All caches register by name, so the admin view (?admin=1) and the API's
+/admin/caches can list entries, bytes and hit ratios per cache.
+
+    @bounded_cache('tmdb', max_mb=64, ttl=3600)
+    def get_tmdb_movie_details(movie_id): ...
+
+CINEMATCH_CACHE_MB_<NAME> overrides a cache's budget (e.g. CINEMATCH_CACHE_MB_IMAGES=512).
+Cached values are shared between sessions and threads; treat them as read-only.
+"""
+import os
+import sys
+import time
+import functools
+import threading
+from collections import OrderedDict
+
+# Every cache by name, for introspection
+CACHES = {}
+CACHES_LOCK = threading.Lock()
+# Per-entry bookkeeping (key, slot, counters), on top of the value
+ENTRY_OVERHEAD = 256
+# Containers deeper than this are sized by their top levels only
+MAX_DEPTH = 6
+MISSING = object()
+
+# Approximate bytes held by a value
+def estimate_size(value, depth=0):
+    if hasattr(value, 'memory_usage') and hasattr(value, 'index'):
+        # DataFrame (per-column sizes) or Series
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, 'sum') else int(usage)
+    if hasattr(value, 'nbytes') and not callable(value.nbytes):
+        return int(value.nbytes) + 128
+    if hasattr(value, 'getbands') and hasattr(value, 'size'):
+        # Decoded PIL image: one byte per band per pixel
+        width, height = value.size
+        return width * height * len(value.getbands()) + 1024
+    size = sys.getsizeof(value)
+    if depth >= MAX_DEPTH:
+        return size
+    if isinstance(value, dict):
+        return size + sum(estimate_size(k, depth + 1) + estimate_size(v, depth + 1) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(estimate_size(item, depth + 1) for item in value)
+    return size
+
+class Entry:
+    __slots__ = ('value', 'size', 'expires', 'hits', 'created')
+
+    def __init__(self, value, size, expires):
+        self.value = value
+        self.size = size
+        self.expires = expires
+        self.hits = 0
+        self.created = time.time()
+
+class BoundedCache:
+    """Thread-safe map bounded by an estimated byte budget
+
+    'lru' evicts the least recently used entry. 'lfu' evicts the least
+    frequently used one (oldest first among equals) via frequency buckets,
+    so lookups and evictions stay O(1).
+    """
+
+    def __init__(self, name, max_bytes, policy='lru', ttl=None):
+        if policy not in ('lru', 'lfu'):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.name = name
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.ttl = ttl
+        self.entries = {}
+        self.buckets = {1: OrderedDict()}
+        self.min_hits = 1
+        self.bytes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'rejected': 0}
+        self.lock = threading.Lock()
+        with CACHES_LOCK:
+            CACHES[name] = self
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.expires is not None and entry.expires < time.time():
+                self._remove(key)
+                self.stats['expirations'] += 1
+                entry = None
+            if entry is None:
+                self.stats['misses'] += 1
+                return default
+            self.stats['hits'] += 1
+            self._touch(key, entry)
+            return entry.value
+
+    def put(self, key, value, size=None, ttl=None):
+        """Store value (sized by estimate_size unless given); values over the whole budget are not kept"""
+        size = (estimate_size(value) if size is None else size) + ENTRY_OVERHEAD
+        ttl = self.ttl if ttl is None else ttl
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                self.stats['rejected'] += 1
+                return
+            # Make room first: under LFU a new entry would otherwise be the
+            # least used one and evict itself
+            while self.bytes + size > self.max_bytes:
+                self._evict()
+            entry = Entry(value, size, time.time() + ttl if ttl else None)
+            self.entries[key] = entry
+            self.buckets.setdefault(self._bucket(entry), OrderedDict())[key] = None
+            self.min_hits = 1
+            self.bytes += size
+
+    def pop(self, key):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.buckets = {1: OrderedDict()}
+            self.min_hits = 1
+            self.bytes = 0
+
+    def _bucket(self, entry):
+        return entry.hits + 1 if self.policy == 'lfu' else 1
+
+    def _touch(self, key, entry):
+        if self.policy == 'lru':
+            self.buckets[1].move_to_end(key)
+            entry.hits += 1
+            return
+        bucket = self.buckets[entry.hits + 1]
+        del bucket[key]
+        if not bucket:
+            if entry.hits + 1 == self.min_hits:
+                self.min_hits += 1
+            if entry.hits:
+                del self.buckets[entry.hits + 1]
+        entry.hits += 1
+        self.buckets.setdefault(entry.hits + 1, OrderedDict())[key] = None
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        hits = self._bucket(entry)
+        del self.buckets[hits][key]
+        if not self.buckets[hits] and hits != 1:
+            del self.buckets[hits]
+        self.bytes -= entry.size
+
+    def _evict(self):
+        bucket = self.buckets.get(self.min_hits)
+        if not bucket:
+            self.min_hits = min((hits for hits, keys in self.buckets.items() if keys), default=1)
+            bucket = self.buckets[self.min_hits]
+        key = next(iter(bucket))
+        self._remove(key)
+        self.stats['evictions'] += 1
+
+    def report(self):
+        """Entries, bytes and counters of this cache"""
+        with self.lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return dict(name=self.name, policy=self.policy, entries=len(self.entries), bytes=self.bytes, max_bytes=self.max_bytes,
+                        hit_ratio=self.stats['hits'] / lookups if lookups else 0.0, **self.stats)
+
+    def largest(self, limit=20):
+        """(key, bytes, hits, age in seconds) of the biggest entries"""
+        now = time.time()
+        with self.lock:
+            entries = sorted(self.entries.items(), key=lambda item: item[1].size, reverse=True)[:limit]
+            return [(repr(key)[:120], entry.size, entry.hits, now - entry.created) for key, entry in entries]
+
+# Whether this session asked for the cache admin view (?admin=1 or CINEMATCH_ADMIN=1)
+def admin_requested(query_params):
+    return os.environ.get('CINEMATCH_ADMIN', '') not in ('', '0') or query_params.get('admin', '0') not in ('', '0')
+
+# Budget of a named cache, overridable per cache from the environment
+def budget(name, max_mb):
+    return float(os.environ.get(f"CINEMATCH_CACHE_MB_{name.upper()}", max_mb)) * 2 ** 20
+
+# The registered cache called name, created with this budget and policy on first use
+def named_cache(name, max_mb, policy='lru', ttl=None):
+    with CACHES_LOCK:
+        cache = CACHES.get(name)
+    return cache if cache is not None else BoundedCache(name, budget(name, max_mb), policy, ttl)
+
+# Memoize a function in a named cache (shared by every function decorated with that name)
+def bounded_cache(name, max_mb, ttl=None, policy='lru'):
+    cache = named_cache(name, max_mb, policy)
+
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            key = (function.__name__, args, tuple(sorted(kwargs.items())))
+            value = cache.get(key, MISSING)
+            if value is MISSING:
+                value = function(*args, **kwargs)
+                cache.put(key, value, ttl=ttl)
+            return value
+        wrapper.cache = cache
+        wrapper.clear = cache.clear
+        return wrapper
+    return decorate
+
+# Empty every registered cache (cold-start benchmarks)
+def clear_caches():
+    with CACHES_LOCK:
+        caches = list(CACHES.values())
+    for cache in caches:
+        cache.clear()
+
+# Reports of every registered cache, biggest first
+def cache_report():
+    with CACHES_LOCK:
+        caches = list(CACHES.values())
+    return sorted((cache.report() for cache in caches), key=lambda report: report['bytes'], reverse=True)
@@ -0,0 +1,666 @@
+"""
+📚 Catalog - CSV loading, derived indexes and incremental refresh
+"""
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import resource
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from string import Formatter
+from interactions import InteractionStore, file_lock, open_interactions, publish_version
+
+DATA_DIR = 'data'
+INDIAN_LANGUAGES = ['Hindi', 'Tamil', 'Telugu', 'Kannada', 'Malayalam']
+EMPTY_ROWS = np.empty(0, dtype=np.int64)
+CSV_FILES = {
+    'movies': 'imdb_movies.csv',
+    'streaming': 'streaming_platforms.csv',
+    'interactions': 'user_interactions.csv',
+    'indian_movies': 'indian_movies.csv',
+}
+# Frames kept in memory (interactions live in the day-partitioned interaction store)
+FRAMES = ('movies', 'streaming', 'indian_movies')
+SHARED_INDEXES = ('genre_index', 'language_index', 'type_index')
+PLATFORM_BITS = ('platform_bits', 'indian_platform_bits')
+PLATFORM_COLUMNS = {'Netflix': 'netflix', 'Prime': 'prime_video', 'Disney+': 'disney_plus'}
+
+# Synthetic plot description templates, keyed by the first matching genre
+PLOT_TEMPLATES = {
+    'Drama': "This compelling drama from {year} explores deep human emotions and relationships. With a rating of {rating}/10 and {votes} votes, it stands as a testament to powerful storytelling.",
+    'Action': "An action-packed thriller from {year} featuring intense sequences and thrilling moments. Rated {rating}/10, this film keeps audiences on the edge of their seats.",
+    'Comedy': "A hilarious {genre} from {year} that delivers laughs and entertainment. With {rating}/10 rating, audiences appreciate its humor and charm.",
+    'Romance': "A touching romantic tale from {year} exploring love and connection. Rated {rating}/10, it resonates with audiences seeking emotional engagement.",
+    'Horror': "A spine-chilling horror film from {year} designed to frighten and thrill. Rated {rating}/10, viewers rate this as a memorable scary experience.",
+    'Sci-Fi': "A mind-bending science fiction story from {year} exploring futuristic concepts. With {rating}/10 rating, it challenges viewers' imagination.",
+    'Animation': "A visually stunning animated feature from {year} for audiences of all ages. Rated {rating}/10, it combines artistry with engaging storytelling.",
+    'Thriller': "A suspenseful thriller from {year} filled with unexpected twists. Rated {rating}/10, this film keeps audiences guessing until the end.",
+    'Adventure': "An epic adventure from {year} taking audiences on an exciting journey. Rated {rating}/10, it delivers action and discovery.",
+    'Mystery': "An intriguing mystery from {year} that challenges viewers to solve puzzles. Rated {rating}/10, it offers engaging suspenseful entertainment.",
+    'Fallback': "A captivating {mood} production from {year} featuring {genres}. Rated {rating}/10 by {votes} viewers, this film offers quality entertainment.",
+}
+
+# Split the first two genres of every row (vectorized)
+def split_primary_genres(df):
+    split = df['genres'].astype('string').fillna('Entertainment').str.split(',')
+    return split.str[0].astype('string').str.strip(), split.str[1].astype('string').str.strip()
+
+# Pick a description template per row (vectorized, done once at catalog build time)
+def assign_plot_templates(df):
+    """Return a categorical Series naming the plot template for each row"""
+    first, second = split_primary_genres(df)
+    template = np.where(first.isin(PLOT_TEMPLATES), first,
+                        np.where(second.isin(PLOT_TEMPLATES), second, 'Fallback'))
+    return pd.Series(template, index=df.index, dtype=pd.CategoricalDtype(list(PLOT_TEMPLATES)))
+
+# Fill one template for a block of rows with vectorized string concatenation
+def render_plot_template(template, fields, rows):
+    text = np.full(len(rows), '', dtype=object)
+    for literal, name, _, _ in Formatter().parse(template):
+        text = text + literal
+        if name:
+            text = text + fields[name][rows]
+    return text
+
+# Generate detailed plot descriptions based on genres and mood
+def generate_plot_descriptions(df):
+    """Render synthetic plot descriptions for every row of df in bulk"""
+    templates = df['plot_template'] if 'plot_template' in df else assign_plot_templates(df)
+    first, second = split_primary_genres(df)
+    fields = {
+        'year': df['startYear'].astype(int).astype(str),
+        'rating': df['averageRating'].astype(str),
+        'votes': df['numVotes'].astype(int).map('{:,}'.format),
+        'genre': first.str.lower(),
+        'genres': first.where(second.isna(), first + ', ' + second),
+        'mood': df['mood'].astype('string').fillna('').str.lower(),
+    }
+    fields = {name: values.to_numpy(dtype=object) for name, values in fields.items()}
+    keys = templates.to_numpy(dtype=object)
+    descriptions = np.full(len(df), '', dtype=object)
+    for name, template in PLOT_TEMPLATES.items():
+        rows = np.flatnonzero(keys == name)
+        if len(rows):
+            descriptions[rows] = render_plot_template(template, fields, rows)
+    return pd.Series(descriptions, index=df.index)
+
+# Look up the plot description for a single row
+def generate_plot_description(movie):
+    """Return the synthetic plot description for one catalog row"""
+    description = movie.get('plot_description')
+    if isinstance(description, str):
+        return description
+    return generate_plot_descriptions(movie.to_frame().T).iloc[0]
+
+# Map each value of a (comma separated) column to the row positions holding it
+def build_index(values, multi=False):
+    """Return {value: sorted int64 row positions} for a column"""
+    values = pd.Series(values.to_numpy(), index=np.arange(len(values)))
+    if multi:
+        values = values.str.split(',').explode().str.strip()
+    values = values.dropna()
+    positions = values.index.to_numpy(dtype=np.int64)
+    return {key: positions[rows] for key, rows in values.groupby(values.to_numpy(), sort=True).indices.items()}
+
+# Positions holding any of the keys
+def union_rows(index, keys):
+    parts = [index[key] for key in keys if key in index]
+    return np.unique(np.concatenate(parts)) if parts else EMPTY_ROWS
+
+# Positions holding all of the keys
+def intersect_rows(index, keys):
+    rows = None
+    for key in keys:
+        key_rows = index.get(key, EMPTY_ROWS)
+        rows = key_rows if rows is None else np.intersect1d(rows, key_rows, assume_unique=True)
+    return EMPTY_ROWS if rows is None else rows
+
+# Per-title platform bitmask (bit i = i-th PLATFORM_COLUMNS entry), joined once by tconst
+def platform_bits(frame, streaming):
+    """uint8 mask per row of frame; titles missing from streaming get 0"""
+    positions = pd.Index(streaming['tconst']).get_indexer(frame['tconst'])
+    found = positions >= 0
+    bits = np.zeros(len(frame), dtype=np.uint8)
+    for bit, column in enumerate(PLATFORM_COLUMNS.values()):
+        available = np.zeros(len(frame), dtype=bool)
+        available[found] = streaming[column].to_numpy()[positions[found]] > 0
+        bits |= available.astype(np.uint8) << bit
+    return bits
+
+# Bitmask of the named platforms
+def platform_mask(platforms):
+    names = list(PLATFORM_COLUMNS)
+    return np.uint8(sum(1 << names.index(name) for name in platforms if name in PLATFORM_COLUMNS))
+
+# Positions passing the list-page filters
+def filter_rows(frame, rows=None, rating=None, years=None, languages=None):
+    """Positions (within rows, or all of frame) inside the rating/year ranges and languages"""
+    rows = np.arange(len(frame)) if rows is None else np.asarray(rows)
+    mask = np.ones(len(rows), dtype=bool)
+    if rating is not None:
+        values = frame['averageRating'].to_numpy()[rows]
+        mask &= (values >= rating[0]) & (values <= rating[1])
+    if years is not None:
+        values = frame['startYear'].to_numpy()[rows]
+        mask &= (values >= years[0]) & (values <= years[1])
+    if languages is not None:
+        mask &= frame['language'].iloc[rows].isin(languages).to_numpy()
+    return rows[mask]
+
+# Best k positions by a column, best first
+def top_k(frame, rows=None, k=20, by='averageRating'):
+    """Partial sort: O(n) selection of k candidates, then a sort of only those k"""
+    rows = np.arange(len(frame)) if rows is None else np.asarray(rows)
+    values = frame[by].to_numpy()[rows].astype(float)
+    if k <= 0:
+        return rows[:0]
+    best = np.argpartition(-values, k - 1)[:k] if len(rows) > k else np.arange(len(rows))
+    return rows[best[np.argsort(-values[best], kind='stable')]]
+
+# Patch an index for rows whose value changed or that were appended
+def update_index(index, positions, old_values, new_values, multi=False):
+    """Return a new index sharing every untouched posting list with the old one"""
+    def keys(value):
+        if not isinstance(value, str):
+            return set()
+        return {v.strip() for v in value.split(',')} if multi else {value}
+    
+    removed, added = {}, {}
+    for pos, old, new in zip(positions, old_values, new_values):
+        before, after = keys(old), keys(new)
+        for key in before - after:
+            removed.setdefault(key, []).append(pos)
+        for key in after - before:
+            added.setdefault(key, []).append(pos)
+    
+    index = dict(index)
+    for key in set(removed) | set(added):
+        rows = index.get(key, EMPTY_ROWS)
+        rows = np.setdiff1d(rows, removed.get(key, []))
+        rows = np.union1d(rows, np.asarray(added.get(key, []), dtype=np.int64))
+        if len(rows):
+            index[key] = rows
+        else:
+            index.pop(key, None)
+    return index
+
+# Add/subtract value counts without recounting the whole column
+def update_counts(counts, old_values, new_values):
+    counts = counts.sub(pd.Series(np.asarray(old_values, dtype=object)).value_counts(), fill_value=0)
+    counts = counts.add(pd.Series(np.asarray(new_values, dtype=object)).value_counts(), fill_value=0)
+    return counts[counts > 0].astype(np.int64).sort_values(ascending=False)
+
+# Add any values a categorical column has no category for yet
+def widen_categories(series, values):
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return series
+    missing = pd.Index(pd.Series(values).dropna().unique()).difference(series.cat.categories)
+    return series.cat.add_categories(missing) if len(missing) else series
+
+# Upsert rows by tconst; returns the new frame, touched positions and the rows they replaced
+def upsert_rows(frame, delta, key='tconst'):
+    """Update matching rows (copy-on-write) and append the rest, keeping every column's dtype
+    
+    Blank delta cells keep the old value; new rows missing the key or a value
+    for an integer column are dropped instead of being stored as garbage.
+    Categorical columns (as mapped from a shared export) gain new categories.
+    """
+    delta = delta.drop_duplicates(key, keep='last').reset_index(drop=True)
+    positions = pd.Index(frame[key]).get_indexer(delta[key])
+    changed = positions >= 0
+    replaced = frame.iloc[positions[changed]]
+    
+    updated = frame.copy(deep=False)
+    for column in delta.columns.intersection(frame.columns):
+        updated[column] = widen_categories(updated[column], delta[column])
+        values = delta.loc[changed, column]
+        present = values.notna().to_numpy()
+        if present.any():
+            series = updated[column].copy()
+            series.iloc[positions[changed][present]] = values[present].astype(series.dtype).to_numpy()
+            updated[column] = series
+    
+    required = [key] + [column for column in frame.columns if frame[column].dtype.kind in 'biu']
+    appended = delta[~changed]
+    appended = appended[appended.reindex(columns=required).notna().all(axis=1).to_numpy()]
+    if len(appended):
+        shared = appended.columns.intersection(frame.columns)
+        updated = pd.concat([updated, appended.astype({column: updated[column].dtype for column in shared})], ignore_index=True)
+    touched = np.concatenate([positions[changed], np.arange(len(frame), len(frame) + len(appended))])
+    return updated, touched, replaced
+
+class CatalogSnapshot:
+    """Immutable catalog frames plus the indexes and aggregates derived from them"""
+    
+    def __init__(self, movies, streaming, interactions, indian_movies, version=0):
+        self.movies = movies
+        self.streaming = streaming
+        self.interactions = interactions
+        self.indian_movies = indian_movies
+        self.version = version
+    
+    @classmethod
+    def build(cls, movies, streaming, interactions, indian_movies):
+        """Derive every index and aggregate from scratch (cold start only)"""
+        snapshot = cls(movies, streaming, interactions, indian_movies)
+        snapshot.genre_index = build_index(movies['genres'], multi=True)
+        snapshot.language_index = build_index(movies['language'])
+        snapshot.type_index = build_index(movies['titleType'])
+        snapshot.join_platforms()
+        snapshot.stats = {
+            'language_counts': movies['language'].value_counts(),
+            'type_counts': movies['titleType'].value_counts(),
+            'rating_counts': movies['averageRating'].value_counts(),
+            'rating_sum': float(movies['averageRating'].sum()),
+            'latest_year': int(movies['startYear'].max()),
+            'platform_totals': {name: int(streaming[col].sum()) for name, col in PLATFORM_COLUMNS.items()},
+            'user_count': interactions.user_count,
+        }
+        return snapshot
+    
+    def rows(self, positions):
+        """Catalog rows at the given index positions, in the given order"""
+        return self.movies.iloc[positions]
+    
+    def rows_of_type(self, *title_types):
+        """Positions of titles with any of the given titleType values"""
+        return union_rows(self.type_index, title_types)
+    
+    def rows_with_genres(self, genres, within=None):
+        """Positions of titles tagged with every one of the given genres"""
+        rows = intersect_rows(self.genre_index, genres)
+        return rows if within is None else np.intersect1d(rows, within, assume_unique=True)
+    
+    def rows_in_language(self, language, within=None):
+        """Positions of titles in the given language"""
+        rows = self.language_index.get(language, EMPTY_ROWS)
+        return rows if within is None else np.intersect1d(rows, within, assume_unique=True)
+    
+    def filter_rows(self, rows=None, **filters):
+        """Positions passing the rating/years/languages filters"""
+        return filter_rows(self.movies, rows, **filters)
+    
+    def top_k(self, rows=None, k=20, by='averageRating'):
+        """Best k positions by a column, best first"""
+        return top_k(self.movies, rows, k, by)
+    
+    def join_platforms(self):
+        """(Re)build the platform bitmasks of movies and indian_movies from streaming"""
+        self.platform_bits = platform_bits(self.movies, self.streaming)
+        self.indian_platform_bits = platform_bits(self.indian_movies, self.streaming)
+    
+    def on_platforms(self, rows, platforms, frame='movies'):
+        """Positions (of movies, or of indian_movies) available on any of the named platforms"""
+        bits = self.platform_bits if frame == 'movies' else self.indian_platform_bits
+        rows = np.asarray(rows)
+        return rows[(bits[rows] & platform_mask(platforms)) != 0]
+    
+    def genres_within(self, rows):
+        """Sorted genres that occur at least once among the given positions"""
+        return sorted(genre for genre, genre_rows in self.genre_index.items() if np.isin(genre_rows, rows, assume_unique=True).any())
+    
+    def apply(self, movies=None, streaming=None, interactions=None):
+        """Return a new snapshot with delta frames applied; self is left untouched"""
+        snapshot = CatalogSnapshot(self.movies, self.streaming, self.interactions, self.indian_movies, self.version + 1)
+        snapshot.genre_index = self.genre_index
+        snapshot.language_index = self.language_index
+        snapshot.type_index = self.type_index
+        stats = dict(self.stats)
+        
+        if movies is not None and len(movies):
+            updated, touched, replaced = upsert_rows(self.movies, movies.drop(columns='plot_template', errors='ignore'))
+            changed = len(replaced)
+            # Templates follow the merged genres: only new rows and rows whose
+            # genres changed get a new one
+            old_genres = np.array(list(replaced['genres']) + [None] * (len(touched) - changed), dtype=object)
+            retemplate = touched[old_genres != updated['genres'].iloc[touched].to_numpy(dtype=object)]
+            if len(retemplate):
+                templates = assign_plot_templates(updated.iloc[retemplate])
+                column = widen_categories(updated['plot_template'], templates).copy()
+                column.iloc[retemplate] = templates.to_numpy()
+                updated['plot_template'] = column
+            new = updated.iloc[touched]
+            for attr, column, multi in [('genre_index', 'genres', True), ('language_index', 'language', False), ('type_index', 'titleType', False)]:
+                old_values = list(replaced[column]) + [None] * (len(touched) - changed)
+                setattr(snapshot, attr, update_index(getattr(snapshot, attr), touched, old_values, new[column], multi))
+            for stat, column in [('language_counts', 'language'), ('type_counts', 'titleType'), ('rating_counts', 'averageRating')]:
+                stats[stat] = update_counts(stats[stat], replaced[column], new[column])
+            stats['rating_sum'] += float(new['averageRating'].sum() - replaced['averageRating'].sum())
+            stats['latest_year'] = max(stats['latest_year'], int(new['startYear'].max()))
+            snapshot.movies = updated
+            
+            # Keep the Indian cinema view in step with the main catalog, matching
+            # on the merged rows so deltas without a language column still sync
+            indian = new[new['tconst'].isin(self.indian_movies['tconst']) | new['language'].isin(INDIAN_LANGUAGES)]
+            if len(indian):
+                columns = list(movies.columns.intersection(new.columns).drop('plot_template', errors='ignore'))
+                if 'genres' in columns:
+                    columns.append('plot_template')
+                snapshot.indian_movies = upsert_rows(self.indian_movies, indian[columns])[0]
+        
+        if streaming is not None and len(streaming):
+            updated, touched, replaced = upsert_rows(self.streaming, streaming)
+            new = updated.iloc[touched]
+            stats['platform_totals'] = {
+                name: stats['platform_totals'][name] + int(new[col].sum() - replaced[col].sum())
+                for name, col in PLATFORM_COLUMNS.items()
+            }
+            snapshot.streaming = updated
+        
+        if interactions is not None and len(interactions):
+            # A dict names each batch (the delta file), so it is stored only once
+            batches = interactions.items() if isinstance(interactions, dict) else [(None, interactions)]
+            for batch, frame in batches:
+                snapshot.interactions = snapshot.interactions.append(frame, batch)
+            stats['user_count'] = snapshot.interactions.user_count
+        
+        if (movies is not None and len(movies)) or (streaming is not None and len(streaming)):
+            snapshot.join_platforms()
+        else:
+            snapshot.platform_bits = self.platform_bits
+            snapshot.indian_platform_bits = self.indian_platform_bits
+        
+        snapshot.stats = stats
+        return snapshot
+
+# Parse the catalog CSVs
+def read_catalog(data_dir=DATA_DIR):
+    """Parse the catalog CSVs and build a snapshot from scratch"""
+    movies = pd.read_csv(os.path.join(data_dir, CSV_FILES['movies']))
+    streaming = pd.read_csv(os.path.join(data_dir, CSV_FILES['streaming']))
+    # Ingested into the interaction store on first use, then opened without parsing the CSV
+    interactions = open_interactions(data_dir)
+    try:
+        indian_movies = pd.read_csv(os.path.join(data_dir, CSV_FILES['indian_movies']))
+    except FileNotFoundError:
+        indian_movies = movies[movies['language'].isin(INDIAN_LANGUAGES)].reset_index(drop=True)
+    # Plot description templates are chosen in bulk here; the text itself is
+    # only rendered for rows that get displayed or exported
+    movies['plot_template'] = assign_plot_templates(movies)
+    indian_movies = indian_movies.assign(plot_template=assign_plot_templates(indian_movies))
+    return CatalogSnapshot.build(movies, streaming, interactions, indian_movies)
+
+# Size and modification time of a file, or None if it is gone
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+# Identify the CSVs a shared catalog was built from
+def source_signature(data_dir):
+    signature = {}
+    for name in CSV_FILES.values():
+        path = os.path.join(data_dir, name)
+        if os.path.exists(path):
+            signature[name] = file_signature(path)
+    return signature
+
+# Convert a column to an Arrow array that can be read back without copying
+def to_arrow_column(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return pa.array(series.astype('string'), from_pandas=True).dictionary_encode()
+    if pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+        # Keep NaN as a value rather than a null so floats stay zero-copy
+        return pa.array(series.to_numpy(), from_pandas=False)
+    array = pa.array(series.astype('string'), from_pandas=True)
+    # Low-cardinality text (languages, genres, types) is dictionary-encoded
+    if len(series) and series.nunique() <= len(series) // 2:
+        array = array.dictionary_encode()
+    return array
+
+def write_arrow(frame, path):
+    table = pa.table([to_arrow_column(frame[column]) for column in frame.columns], names=list(frame.columns))
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+def read_arrow(path):
+    # split_blocks keeps numeric columns as views into the mapped file
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    return table.to_pandas(split_blocks=True, self_destruct=False)
+
+# Write a snapshot as memory-mappable Arrow/NumPy files
+def export_shared(snapshot, shared_dir, signature=None):
+    """Write snapshot files to a new version directory and publish it as shared_dir"""
+    shared_dir = shared_dir.rstrip(os.sep)
+    staging = f"{shared_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    
+    for name in FRAMES:
+        write_arrow(getattr(snapshot, name), os.path.join(staging, f'{name}.arrow'))
+    
+    # Posting-list indexes are stored CSR style: keys and offsets in the
+    # manifest, all row positions in one mapped array
+    indexes = {}
+    for name in SHARED_INDEXES:
+        index = getattr(snapshot, name)
+        keys = list(index)
+        lengths = [len(index[key]) for key in keys]
+        np.save(os.path.join(staging, f'{name}.npy'), np.concatenate([index[key] for key in keys]) if keys else EMPTY_ROWS)
+        indexes[name] = {'keys': keys, 'offsets': np.concatenate([[0], np.cumsum(lengths)]).tolist()}
+    for name in PLATFORM_BITS:
+        np.save(os.path.join(staging, f'{name}.npy'), getattr(snapshot, name))
+    
+    stats = snapshot.stats
+    manifest = {
+        'source': signature or {},
+        'interactions': os.path.abspath(snapshot.interactions.path),
+        'indexes': indexes,
+        'stats': {
+            'language_counts': stats['language_counts'].to_dict(),
+            'type_counts': stats['type_counts'].to_dict(),
+            'rating_counts': {str(k): int(v) for k, v in stats['rating_counts'].items()},
+            'rating_sum': stats['rating_sum'],
+            'latest_year': stats['latest_year'],
+            'platform_totals': stats['platform_totals'],
+        },
+    }
+    with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+    
+    # Processes that still map older files keep reading them after the swap
+    with file_lock(f"{shared_dir}.lock"):
+        publish_version(staging, shared_dir, time.time_ns())
+
+# Open a shared export; frames and indexes are memory-mapped
+def open_shared(shared_dir):
+    """Return a snapshot backed by the page cache copy in shared_dir"""
+    # Resolve the symlink once so every file comes from the same version
+    shared_dir = os.path.realpath(shared_dir)
+    with open(os.path.join(shared_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    frames = {name: read_arrow(os.path.join(shared_dir, f'{name}.arrow')) for name in FRAMES}
+    snapshot = CatalogSnapshot(interactions=InteractionStore.open(manifest['interactions']), **frames)
+    
+    for name in SHARED_INDEXES:
+        positions = np.load(os.path.join(shared_dir, f'{name}.npy'), mmap_mode='r')
+        layout = manifest['indexes'][name]
+        offsets = layout['offsets']
+        setattr(snapshot, name, {key: positions[offsets[i]:offsets[i + 1]] for i, key in enumerate(layout['keys'])})
+    for name in PLATFORM_BITS:
+        setattr(snapshot, name, np.load(os.path.join(shared_dir, f'{name}.npy'), mmap_mode='r'))
+    
+    stats = manifest['stats']
+    snapshot.stats = {
+        'language_counts': pd.Series(stats['language_counts'], dtype=np.int64),
+        'type_counts': pd.Series(stats['type_counts'], dtype=np.int64),
+        'rating_counts': pd.Series({float(k): v for k, v in stats['rating_counts'].items()}, dtype=np.int64),
+        'rating_sum': stats['rating_sum'],
+        'latest_year': stats['latest_year'],
+        'platform_totals': stats['platform_totals'],
+        'user_count': snapshot.interactions.user_count,
+    }
+    return snapshot
+
+# Load data
+def load_data(data_dir=DATA_DIR, shared_dir=None):
+    """Build the first snapshot, from the shared export when one is given
+    
+    The first process to start with a stale or missing export rebuilds it from
+    the CSVs; every process then maps the same files read-only.
+    """
+    if not shared_dir:
+        return read_catalog(data_dir)
+    signature = source_signature(data_dir)
+    try:
+        with open(os.path.join(shared_dir, 'manifest.json')) as f:
+            current = json.load(f)['source'] == signature
+    except (FileNotFoundError, ValueError, KeyError):
+        current = False
+    if not current:
+        export_shared(read_catalog(data_dir), shared_dir, signature)
+    return open_shared(shared_dir)
+
+class CatalogStore:
+    """Holds the live snapshot and hot-swaps in refreshed ones
+    
+    Delta files dropped into data/deltas/ are applied in name order:
+      *.movies.csv        new or changed catalog rows (upsert by tconst)
+      *.streaming.csv     new or changed platform rows (upsert by tconst)
+      *.interactions.csv  user interactions, appended to the interaction store once per file
+    Write them elsewhere and rename into place so half-written files are never read.
+    A file that fails to apply is recorded in failed and skipped until it changes.
+    """
+    
+    DELTA_KINDS = ('movies', 'streaming', 'interactions')
+    
+    def __init__(self, data_dir=DATA_DIR, delta_dir=None, shared_dir=None):
+        self.delta_dir = delta_dir or os.path.join(data_dir, 'deltas')
+        self.snapshot = load_data(data_dir, shared_dir)
+        self._applied = set()
+        # path -> (file signature, error) of deltas that could not be applied
+        self.failed = {}
+        self._delta_mtime = None
+        self._lock = threading.Lock()
+    
+    def read_delta(self, path):
+        """Parse one delta file into snapshot.apply keyword arguments"""
+        kind = os.path.basename(path).rsplit('.', 2)[-2]
+        if kind not in self.DELTA_KINDS:
+            raise ValueError(f"Unknown delta file type: {path}")
+        frame = pd.read_csv(path)
+        # Interaction batches are named after the file so each is stored only once
+        return {kind: {os.path.basename(path): frame} if kind == 'interactions' else frame}
+    
+    def skipped(self, path):
+        """True if path failed before and has not changed since"""
+        return path in self.failed and self.failed[path][0] == file_signature(path)
+    
+    def apply(self, *paths):
+        """Apply delta files one at a time and atomically publish the result
+        
+        A file that cannot be parsed or applied is recorded in failed and
+        skipped until it changes; the files after it are still applied.
+        """
+        with self._lock:
+            snapshot = self.snapshot
+            for path in paths:
+                # Another thread (e.g. the JSON API) may have applied it meanwhile
+                if path in self._applied or self.skipped(path):
+                    continue
+                try:
+                    snapshot = snapshot.apply(**self.read_delta(path))
+                except Exception as error:
+                    self.failed[path] = (file_signature(path), f"{type(error).__name__}: {error}")
+                    print(f"Skipping delta {path}: {self.failed[path][1]}", file=sys.stderr)
+                    continue
+                self._applied.add(path)
+                self.failed.pop(path, None)
+            # Readers holding the old snapshot keep a consistent view;
+            # new reruns pick up the replacement with a single assignment
+            self.snapshot = snapshot
+            return self.snapshot
+    
+    def refresh(self):
+        """Apply any delta files not seen yet and return the live snapshot"""
+        try:
+            mtime = os.stat(self.delta_dir).st_mtime_ns
+        except FileNotFoundError:
+            return self.snapshot
+        if mtime == self._delta_mtime:
+            return self.snapshot
+        paths = glob.glob(os.path.join(self.delta_dir, '*.csv'))
+        for path in set(self.failed).difference(paths):
+            self.failed.pop(path, None)
+        pending = sorted(path for path in paths if path not in self._applied and not self.skipped(path))
+        snapshot = self.apply(*pending) if pending else self.snapshot
+        # A failed file rewritten in place does not touch the directory mtime;
+        # keep checking while there is one so the fixed file is picked up
+        self._delta_mtime = None if self.failed else mtime
+        return snapshot
+
+# Memory of this process in MiB
+def memory_usage():
+    """Return rss/pss/shared/private MiB from smaps_rollup (Linux), else peak RSS"""
+    try:
+        fields = {}
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+        return {
+            'rss': fields['Rss'],
+            'pss': fields['Pss'],
+            'shared': fields['Shared_Clean'] + fields['Shared_Dirty'],
+            'private': fields['Private_Clean'] + fields['Private_Dirty'],
+        }
+    except (OSError, KeyError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {'rss': peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024}
+
+# One simulated app worker for the memory report
+def measure_worker(data_dir, shared_dir, barrier, results):
+    snapshot = load_data(data_dir, shared_dir)
+    # Touch every column once so mapped pages are resident, as in a warm server
+    for name in FRAMES:
+        pd.util.hash_pandas_object(getattr(snapshot, name), index=False).sum()
+    # Measure while all workers are alive so shared pages are split between them
+    barrier.wait()
+    results.put((os.getpid(), memory_usage()))
+    barrier.wait()
+
+def report_memory(data_dir, shared_dir, workers):
+    """Print per-process memory for private CSV loads vs. the shared export"""
+    import multiprocessing
+    ctx = multiprocessing.get_context('spawn')
+    print(f"{'mode':<8} {'pid':>8} {'rss MiB':>9} {'pss MiB':>9} {'shared':>9} {'private':>9}")
+    for mode, directory in [('csv', None), ('shared', shared_dir)]:
+        if directory:
+            load_data(data_dir, directory)
+        barrier, results = ctx.Barrier(workers), ctx.Queue()
+        procs = [ctx.Process(target=measure_worker, args=(data_dir, directory, barrier, results)) for _ in range(workers)]
+        for proc in procs:
+            proc.start()
+        rows = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+        for pid, mem in sorted(rows):
+            print(f"{mode:<8} {pid:>8} {mem['rss']:>9.1f} {mem.get('pss', float('nan')):>9.1f} {mem.get('shared', float('nan')):>9.1f} {mem.get('private', float('nan')):>9.1f}")
+        print(f"{mode:<8} {'total':>8} {sum(m['rss'] for _, m in rows):>9.1f} {sum(m.get('pss', m['rss']) for _, m in rows):>9.1f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Catalog maintenance")
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help="write the shared memory-mapped catalog")
+    export.add_argument('shared_dir')
+    memory = sub.add_parser('memory', help="compare per-process memory of CSV and shared loads")
+    memory.add_argument('shared_dir')
+    memory.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    
+    if args.command == 'export':
+        export_shared(read_catalog(args.data_dir), args.shared_dir, source_signature(args.data_dir))
+        print(f"Wrote shared catalog to {args.shared_dir}")
+    else:
+        report_memory(args.data_dir, args.shared_dir, args.workers)
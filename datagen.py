@@ -0,0 +1,199 @@
+"""
+🎲 Data Generator - synthetic catalogs and interaction logs for scale testing
+Writes schema-compatible imdb_movies.csv, streaming_platforms.csv,
+user_interactions.csv and indian_movies.csv with IMDb-like skew: heavy-tailed
+numVotes, a few dominant genres and languages, prolific directors and a small
+share of very active users.
+
+    python datagen.py --titles 150000 --interactions 5000000 --users 200000 --output /tmp/cinematch-150k
+    python catalog.py --data-dir /tmp/cinematch-150k/data export /tmp/cinematch-150k/shared
+
+Output is deterministic for a given --seed, and interactions are streamed to
+disk in chunks so tens of millions of rows never sit in memory at once.
+"""
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from catalog import CSV_FILES, INDIAN_LANGUAGES
+
+CHUNK_SIZE = 1_000_000
+# Relative frequencies, roughly matching IMDb title counts
+TITLE_TYPES = {'movie': 0.62, 'tvSeries': 0.22, 'tvMiniSeries': 0.08, 'tvMovie': 0.08}
+GENRES = {
+    'Action': 9, 'Adventure': 5, 'Animation': 3, 'Biography': 2, 'Comedy': 14, 'Crime': 6, 'Documentary': 5,
+    'Drama': 24, 'Family': 2.5, 'Fantasy': 2.5, 'Game-Show': 0.4, 'History': 1.5, 'Horror': 4, 'Music': 1,
+    'Musical': 0.8, 'Mystery': 3, 'News': 0.2, 'Reality-TV': 1, 'Romance': 7, 'Sci-Fi': 2, 'Short': 0.2,
+    'Sport': 0.8, 'Talk-Show': 0.3, 'Thriller': 6, 'War': 0.6, 'Western': 0.4,
+}
+LANGUAGES = {
+    'English': 48, 'Hindi': 8, 'Spanish': 6, 'French': 5, 'Japanese': 5, 'Korean': 3.5, 'German': 3,
+    'Italian': 2.5, 'Tamil': 2.5, 'Telugu': 2.5, 'Malayalam': 2, 'Mandarin': 2, 'Portuguese': 2,
+    'Russian': 1.5, 'Turkish': 1.5, 'Bengali': 1, 'Kannada': 1, 'Marathi': 0.8, 'Swedish': 0.7, 'Urdu': 0.5,
+}
+# Moods that go with each genre; a title takes the moods of its first genre
+GENRE_MOODS = {
+    'Action': 'Action-Packed,Thrilling', 'Adventure': 'Adventurous,Epic', 'Animation': 'Whimsical,Fun',
+    'Biography': 'Inspiring,Thought-Provoking', 'Comedy': 'Fun,Light-Hearted', 'Crime': 'Gritty,Intense',
+    'Documentary': 'Educational,Thought-Provoking', 'Drama': 'Emotional,Thought-Provoking',
+    'Family': 'Heartwarming,Fun', 'Fantasy': 'Magical,Adventurous', 'Game-Show': 'Entertaining,Fun',
+    'History': 'Educational,Epic', 'Horror': 'Scary,Dark', 'Music': 'Uplifting,Entertaining',
+    'Musical': 'Uplifting,Light-Hearted', 'Mystery': 'Mysterious,Suspenseful', 'News': 'Educational',
+    'Reality-TV': 'Entertaining', 'Romance': 'Romantic,Heartwarming', 'Sci-Fi': 'Mind-Bending,Thought-Provoking',
+    'Short': 'Light-Hearted', 'Sport': 'Inspiring,Heroic', 'Talk-Show': 'Entertaining,Light-Hearted',
+    'Thriller': 'Suspenseful,Intense', 'War': 'Intense,Heroic', 'Western': 'Classic,Gritty',
+}
+# Platform share of the catalog, and genres each platform over-indexes on
+PLATFORMS = {
+    'netflix': (0.16, ['Crime', 'Thriller', 'Documentary']),
+    'prime_video': (0.22, ['Action', 'Drama', 'Comedy']),
+    'disney_plus': (0.05, ['Animation', 'Family', 'Adventure']),
+}
+TITLE_WORDS = (
+    ['The', 'Last', 'Silent', 'Broken', 'Golden', 'Hidden', 'Lost', 'Crimson', 'Eternal', 'Wild', 'Dark', 'Little', 'Final', 'Secret', 'Midnight'],
+    ['River', 'Kingdom', 'Promise', 'Road', 'Summer', 'City', 'Garden', 'Storm', 'Empire', 'Letter', 'Game', 'Journey', 'Mirror', 'Harbor', 'Dream'],
+    ['', '', '', ' II', ' Returns', ' of Fire', ' in Paris', ' Rising', ': Origins', ' Forever'],
+)
+
+# Names and normalized probabilities of a frequency table
+def weights(table):
+    names = np.array(list(table), dtype=object)
+    values = np.array(list(table.values()), dtype=np.float64)
+    return names, values / values.sum()
+
+# Weighted sampling of up to `k` distinct genres per title (Gumbel top-k),
+# joined alphabetically like IMDb's "Action,Drama,Thriller"
+def sample_genres(rng, rows, k=3):
+    names, p = weights(GENRES)
+    keys = np.log(p).astype(np.float32) - np.log(-np.log(rng.random((rows, len(names)), dtype=np.float32)))
+    top = np.argpartition(-keys, k, axis=1)[:, :k]
+    top = np.take_along_axis(top, np.argsort(-np.take_along_axis(keys, top, axis=1), axis=1), axis=1)
+    primary = names[top[:, 0]]
+    counts = rng.choice(np.arange(1, k + 1), size=rows, p=[0.35, 0.35, 0.30])
+    top[np.arange(k) >= counts[:, None]] = len(names)
+    top.sort(axis=1)
+    padded = np.append(names, '')
+    genres = padded[top[:, 0]]
+    for column in range(1, k):
+        rest = top[:, column]
+        genres = genres + np.where(rest < len(names), ',', '') + padded[rest]
+    return genres, primary
+
+def generate_movies(rows, seed=0, offset=0):
+    """Generate `rows` titles with tconsts starting after `offset`"""
+    rng = np.random.default_rng([seed, offset])
+    types, type_p = weights(TITLE_TYPES)
+    languages, language_p = weights(LANGUAGES)
+    title_type = rng.choice(types, size=rows, p=type_p)
+    is_tv = (title_type == 'tvSeries') | (title_type == 'tvMiniSeries')
+
+    genres, first_genre = sample_genres(rng, rows)
+    start_year = np.clip(2025 - rng.exponential(14, rows), 1920, 2025).astype(np.int64)
+    ended = is_tv & (rng.random(rows) < 0.6)
+    end_year = np.where(ended, np.minimum(start_year + rng.geometric(0.35, rows), 2025), np.nan)
+    runtime = np.where(is_tv, rng.normal(45, 12, rows), rng.normal(105, 20, rows))
+
+    rating = np.clip(rng.normal(6.4, 1.1, rows), 1.0, 10.0).round(1)
+    # Log-normal votes give a median of a few hundred and a tail into the millions;
+    # better-rated and newer titles get more votes
+    log_votes = rng.normal(5.8 + 0.45 * (rating - 6.4) + 0.01 * (start_year - 2000), 2.1)
+    votes = np.clip(np.exp(log_votes), 5, 3_000_000).astype(np.int64)
+
+    # Few directors make many titles: Pareto-distributed director ids
+    directors = max(rows // 4, 1)
+    director = (rng.pareto(1.1, rows) * directors / 20).astype(np.int64) % directors + offset // 4
+
+    first, second, suffix = (np.array(words, dtype=object) for words in TITLE_WORDS)
+    title = first[rng.integers(0, len(first), rows)] + ' ' + second[rng.integers(0, len(second), rows)] + suffix[rng.integers(0, len(suffix), rows)]
+
+    return pd.DataFrame({
+        'tconst': pd.Series(np.arange(offset, offset + rows) + 1).astype(str).str.zfill(8).radd('tt'),
+        'titleType': title_type,
+        'primaryTitle': title,
+        'originalTitle': title,
+        'isAdult': 0,
+        'startYear': start_year,
+        'endYear': end_year,
+        'runtimeMinutes': np.clip(runtime, 5, 240).astype(np.int64),
+        'genres': genres,
+        'averageRating': rating,
+        'numVotes': votes,
+        'director': pd.Series(director).astype(str).str.zfill(7).radd('nm'),
+        'language': rng.choice(languages, size=rows, p=language_p),
+        'mood': pd.Series(first_genre).map(GENRE_MOODS),
+    })
+
+def generate_streaming(movies, seed=0):
+    """Platform availability per title, favouring popular titles and each platform's genres"""
+    rng = np.random.default_rng([seed, len(movies), 1])
+    popularity = movies['numVotes'].rank(pct=True).to_numpy()
+    streaming = pd.DataFrame({'tconst': movies['tconst'].to_numpy()})
+    for column, (share, favoured) in PLATFORMS.items():
+        boost = movies['genres'].str.contains('|'.join(favoured), regex=True).to_numpy()
+        p = share * (0.3 + 1.4 * popularity) * np.where(boost, 1.6, 1.0)
+        streaming[column] = (rng.random(len(movies)) < p).astype(np.int64)
+    return streaming
+
+def generate_interactions(movies, count, users, seed=0, start=1_600_000_000, end=1_760_000_000, chunk_size=CHUNK_SIZE):
+    """Yield time-ordered interaction chunks (user_id, tconst, rating, timestamp)"""
+    rng = np.random.default_rng([seed, count, 2])
+    tconst = movies['tconst'].to_numpy()
+    average = movies['averageRating'].to_numpy()
+    # Item popularity follows numVotes (slightly flattened); user activity is log-normal
+    item_cdf = np.cumsum(movies['numVotes'].to_numpy() ** 0.8)
+    item_cdf /= item_cdf[-1]
+    user_cdf = np.cumsum(rng.lognormal(0, 1.2, users))
+    user_cdf /= user_cdf[-1]
+
+    chunks = max(-(-count // chunk_size), 1)
+    bounds = np.linspace(start, end, chunks + 1)
+    for chunk in range(chunks):
+        rows = min(chunk_size, count - chunk * chunk_size)
+        items = np.minimum(np.searchsorted(item_cdf, rng.random(rows)), len(tconst) - 1)
+        timestamp = np.sort(rng.uniform(bounds[chunk], bounds[chunk + 1], rows)).astype(np.int64)
+        yield pd.DataFrame({
+            'user_id': np.minimum(np.searchsorted(user_cdf, rng.random(rows)), users - 1) + 1,
+            'tconst': tconst[items],
+            'rating': np.clip(np.rint(average[items] + rng.normal(0, 1.5, rows)), 1, 10).astype(np.int64),
+            'timestamp': timestamp,
+        })
+
+def write_dataset(output, titles, interactions, users, seed=0, chunk_size=CHUNK_SIZE, progress=print):
+    """Write a full data/ directory under `output`"""
+    data_dir = os.path.join(output, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    started = time.perf_counter()
+
+    movies = pd.concat([generate_movies(min(chunk_size, titles - offset), seed, offset) for offset in range(0, titles, chunk_size)], ignore_index=True)
+    movies.to_csv(os.path.join(data_dir, CSV_FILES['movies']), index=False)
+    movies[movies['language'].isin(INDIAN_LANGUAGES)].to_csv(os.path.join(data_dir, CSV_FILES['indian_movies']), index=False)
+    progress(f"{len(movies):,} titles ({time.perf_counter() - started:.1f}s)")
+
+    generate_streaming(movies, seed).to_csv(os.path.join(data_dir, CSV_FILES['streaming']), index=False)
+    progress(f"streaming availability ({time.perf_counter() - started:.1f}s)")
+
+    path = os.path.join(data_dir, CSV_FILES['interactions'])
+    written = 0
+    for i, chunk in enumerate(generate_interactions(movies, interactions, users, seed, chunk_size=chunk_size)):
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        written += len(chunk)
+        progress(f"{written:,}/{interactions:,} interactions ({time.perf_counter() - started:.1f}s)")
+    return data_dir
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic CineMatch catalog")
+    parser.add_argument('--titles', type=int, default=150_000)
+    parser.add_argument('--interactions', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=50_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--output', default='.', help="directory to create data/ in")
+    args = parser.parse_args()
+
+    data_dir = write_dataset(args.output, args.titles, args.interactions, args.users, args.seed, args.chunk_size)
+    print(f"Wrote {data_dir}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+🎨 Diversity - re-rank a list so no franchise, director or language takes it over
+Lists are cut from the top few hundred candidates in ranked order. A candidate
+is taken only while its attributes are under their caps:
+- one title per normalized title and year (the same film as movie and tvMovie)
+- two per TMDB collection
+- two per director
+- half the list per language
+
+If the pool runs out of candidates under every cap, the caps are relaxed one at
+a time (the duplicate cap last), so a list on a one-language page still fills up.
+
+    rows = diverse_top_k(catalog.movies, rows, k=20)        # instead of top_k
+    rows = diversify(catalog.movies, ranked_candidates, k=20)
+
+Title, director and language codes are computed once per catalog frame; a
+re-rank then works on the candidates' codes with NumPy and takes well under a
+millisecond. The result keeps rank order. CINEMATCH_DIVERSITY=0 turns it off.
+"""
+import os
+import re
+import weakref
+import numpy as np
+import pandas as pd
+from catalog import top_k
+from franchises import current_graph
+from recommend import CANDIDATES
+
+ENABLED = os.environ.get('CINEMATCH_DIVERSITY', '1') not in ('', '0')
+# Candidates a list of k is cut from, as many as a session re-ranks
+POOL = CANDIDATES
+# Most titles per attribute value in one list; values below 1 are shares of the list
+CAPS = {'duplicate': 1, 'collection': 2, 'director': 2, 'language': 0.5}
+# Relaxed in this order when no candidate left is under every cap
+RELAX_ORDER = ('language', 'director', 'collection', 'duplicate')
+NON_WORD = re.compile(r'[\W_]+')
+MISSING = ('', '\\N')
+# Codes per live frame, keyed by id (frames are unhashable) and dropped with the frame
+CODES = {}
+
+# Integer codes of values, in order of appearance; missing values get -1
+def codes_of(values):
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    blank = np.flatnonzero(pd.Index(uniques).isin(MISSING))
+    codes[np.isin(codes, blank)] = -1
+    return codes.astype(np.int64)
+
+# Title/year, director and language codes of every row, computed once per frame
+def frame_codes(frame):
+    cached = CODES.get(id(frame))
+    if cached is not None and cached[0]() is frame:
+        return cached[1]
+    titles = frame['primaryTitle'].astype('string').str.lower().str.replace(NON_WORD, '', regex=True)
+    codes = {'duplicate': codes_of(titles + '|' + frame['startYear'].astype('string'))}
+    if 'director' in frame:
+        codes['director'] = codes_of(frame['director'])
+    codes['language'] = codes_of(frame['language'])
+    CODES[id(frame)] = (weakref.ref(frame), codes)
+    weakref.finalize(frame, CODES.pop, id(frame), None)
+    return codes
+
+# Per-candidate codes of each attribute, as an (attributes × candidates) array
+def attribute_codes(frame, rows, collections=None):
+    if collections is None:
+        collections = current_graph().titles
+    codes = {name: values[rows] for name, values in frame_codes(frame).items()}
+    if collections:
+        codes['collection'] = codes_of(frame['tconst'].iloc[rows].map(collections))
+    return list(codes), np.vstack(list(codes.values()))
+
+# How many earlier entries of codes share each entry's code
+def running_counts(codes):
+    order = np.argsort(codes, kind='stable')
+    ordered = codes[order]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    counts = np.empty(len(codes), dtype=np.int64)
+    counts[order] = np.arange(len(codes)) - np.repeat(starts, np.diff(np.r_[starts, len(codes)]))
+    return counts
+
+def diversify(frame, rows, k=20, caps=None, collections=None):
+    """The first k of `rows` (positions in frame, best first) that keep every attribute under its cap
+    
+    Each pass takes the longest run of candidates still under every cap (from
+    per-code running counts), then drops every candidate of a value that hit
+    its cap. The result keeps the input rank order.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    if not ENABLED or len(rows) <= 1 or k <= 1:
+        return rows[:k]
+    names, codes = attribute_codes(frame, rows, collections)
+    caps = CAPS if caps is None else caps
+    shares = {name: max(1, int(cap * k)) if cap < 1 else int(cap) for name, cap in caps.items()}
+    limits = np.array([shares.get(name, len(rows)) for name in names])
+    known = codes >= 0
+    counts = [np.zeros(max(codes[i].max(), 0) + 1, dtype=np.int64) for i in range(len(names))]
+    chosen, taken, left = [], 0, np.arange(len(rows))
+    for relaxed in range(len(RELAX_ORDER) + 1):
+        capped = [i for i, name in enumerate(names) if name not in RELAX_ORDER[:relaxed]]
+        skipped = []
+        while len(left) and taken < k:
+            over = np.zeros(len(left), dtype=bool)
+            for i in capped:
+                before = counts[i][np.where(known[i, left], codes[i, left], 0)] + running_counts(codes[i, left])
+                over |= known[i, left] & (before >= limits[i])
+            run = left[:min(np.argmax(over) if over.any() else len(left), k - taken)]
+            chosen.append(run)
+            taken += len(run)
+            for i in range(len(names)):
+                np.add.at(counts[i], codes[i, run][known[i, run]], 1)
+            left = left[len(run):]
+            full = np.zeros(len(left), dtype=bool)
+            for i in capped:
+                full |= known[i, left] & (counts[i][np.where(known[i, left], codes[i, left], 0)] >= limits[i])
+            skipped.append(left[full])
+            left = left[~full]
+        left = np.sort(np.concatenate([left] + skipped))
+        if taken == k or not len(left):
+            break
+    return rows[np.sort(np.concatenate(chosen))] if chosen else rows[:0]
+
+# Top k of frame by rating, diversified from the best `pool`
+def diverse_top_k(frame, rows=None, k=20, pool=POOL, collections=None):
+    return diversify(frame, top_k(frame, rows, k=max(k, pool) if ENABLED else k), k, collections=collections)
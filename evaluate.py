@@ -0,0 +1,264 @@
+"""
+🎯 Evaluate - offline ranking quality of the recommenders, with their serving cost
+user_interactions.csv is split in time: interactions before the cutoff (by
+default everything but the latest 20%) are what a recommender may use, and
+each user's well-rated titles after it are what it should surface. Every
+recommender ranks k titles for all evaluated users, then precision@k,
+recall@k, NDCG@k, hit rate and catalog coverage are computed for all users at
+once from one hit matrix. Each run also reports its latency per user and the
+peak memory it allocated, so accuracy can be traded against serving cost.
+
+    python evaluate.py                                      # every recommender, k=20
+    python evaluate.py --recommenders profile,profile-batch --k 10 --output eval.json
+    python evaluate.py --test-fraction 0.1 --max-users 2000
+
+Recommenders (register more with @recommender):
+  top-rated       best rated titles the user has not rated
+  popular         most interacted titles before the cutoff
+  profile         the app's user recommendations: profile candidate pool, re-ranked
+  profile-diverse the same ranking of the whole pool, cut with the diversity re-rank
+  profile-batch   batch.py's full-catalog scoring of the same profile
+"""
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+import batch
+from diversity import diversify
+from recommend import CANDIDATES, SHOWN, user_recommendations
+
+TEST_FRACTION = 0.2
+# Held-out interactions rated at least this are the titles a recommender should find
+MIN_RATING = 7
+# name -> (function, per_user)
+RECOMMENDERS = {}
+
+class Split:
+    """A temporal split of the interaction log, over catalog positions
+
+    Training interactions are sorted by user code then time, with train_indptr
+    giving each user code's slice. users are the codes evaluated (active before
+    the cutoff, with relevant titles after it); relevant and seen hold their
+    held-out and training titles CSR style, one row per evaluated user.
+    """
+
+    def __init__(self, snapshot, cutoff, train, users, relevant, seen):
+        self.snapshot = snapshot
+        self.cutoff = cutoff
+        self.titles = len(snapshot.movies)
+        self.tconst = snapshot.movies['tconst'].to_numpy()
+        self.train_users, self.train_rows, self.train_ratings, self.train_stamps = train
+        self.train_indptr = np.r_[0, np.cumsum(np.bincount(self.train_users, minlength=snapshot.interactions.user_count))]
+        self.users = users
+        self.user_ids = np.asarray(snapshot.interactions.users.values)[users]
+        self.relevant_indptr, self.relevant_rows = relevant
+        self.seen_indptr, self.seen_rows = seen
+        self.max_seen = int(np.diff(self.seen_indptr).max()) if len(users) else 0
+
+    def __len__(self):
+        return len(self.users)
+
+    def keys(self, indptr, rows):
+        """(evaluated user index, row) pairs as single int64 keys"""
+        return np.repeat(np.arange(len(indptr) - 1, dtype=np.int64), np.diff(indptr)) * self.titles + rows
+
+    def history(self, index):
+        """Training interactions of one evaluated user, oldest first, as user_history returns them"""
+        code = self.users[index]
+        part = slice(self.train_indptr[code], self.train_indptr[code + 1])
+        return pd.DataFrame({'tconst': self.tconst[self.train_rows[part]],
+                             'rating': self.train_ratings[part], 'timestamp': self.train_stamps[part]})
+
+# CSR (indptr, rows) of (index, row) pairs, with len(indptr) == count + 1
+def csr(index, rows, count):
+    order = np.lexsort((rows, index))
+    return np.r_[0, np.cumsum(np.bincount(index, minlength=count))].astype(np.int64), rows[order].astype(np.int64)
+
+def temporal_split(snapshot, test_fraction=TEST_FRACTION, min_rating=MIN_RATING, max_users=None, seed=0):
+    """Split the interaction log at the (1 - test_fraction) quantile of its timestamps"""
+    store = snapshot.interactions
+    positions = pd.Index(snapshot.movies['tconst']).get_indexer(store.items.values) if len(store.items) else np.empty(0, dtype=np.int64)
+    columns = {'user': [], 'row': [], 'rating': [], 'timestamp': []}
+    for chunk in store.chunks(columns=['user', 'item', 'rating', 'timestamp']):
+        row = positions[chunk['item'].to_numpy()]
+        known = row >= 0
+        columns['user'].append(chunk['user'].to_numpy()[known].astype(np.int64))
+        columns['row'].append(row[known].astype(np.int64))
+        columns['rating'].append(chunk['rating'].to_numpy()[known])
+        columns['timestamp'].append(chunk['timestamp'].to_numpy()[known])
+    if not columns['user']:
+        raise ValueError("the interaction log is empty")
+    user, row, rating, timestamp = (np.concatenate(columns[name]) for name in ('user', 'row', 'rating', 'timestamp'))
+    cutoff = int(np.quantile(timestamp, 1 - test_fraction))
+    train = timestamp < cutoff
+
+    order = np.lexsort((timestamp[train], user[train]))
+    train_part = tuple(values[train][order] for values in (user, row, rating, timestamp))
+    titles = len(snapshot.movies)
+    # Titles a user rated before the cutoff are not new finds
+    known_pairs = np.unique(train_part[0] * titles + train_part[1])
+    held = ~train & (rating >= min_rating)
+    held_pairs = np.unique(user[held] * titles + row[held])
+    held_pairs = held_pairs[~np.isin(held_pairs, known_pairs)]
+
+    users = np.intersect1d(held_pairs // titles, train_part[0])
+    if max_users and len(users) > max_users:
+        users = np.sort(np.random.default_rng(seed).choice(users, max_users, replace=False))
+    held_pairs = held_pairs[np.isin(held_pairs // titles, users)]
+    known_pairs = known_pairs[np.isin(known_pairs // titles, users)]
+    relevant = csr(np.searchsorted(users, held_pairs // titles), held_pairs % titles, len(users))
+    seen = csr(np.searchsorted(users, known_pairs // titles), known_pairs % titles, len(users))
+    return Split(snapshot, cutoff, train_part, users, relevant, seen)
+
+def recommender(name, per_user=False):
+    """Register fn(snapshot, split, k) -> (users × k) catalog positions, -1 padded
+
+    A per_user recommender is fn(snapshot, split, index, k) -> positions of one
+    evaluated user, and is timed call by call.
+    """
+    def register(function):
+        RECOMMENDERS[name] = (function, per_user)
+        return function
+    return register
+
+# First k titles of a global ranking that each evaluated user has not rated before the cutoff
+def unseen_top(split, ranked, k):
+    ranked = np.asarray(ranked[:k + split.max_seen], dtype=np.int64)
+    keys = np.arange(len(split), dtype=np.int64)[:, None] * split.titles + ranked
+    seen = np.isin(keys, split.keys(split.seen_indptr, split.seen_rows))
+    first = np.argsort(seen, axis=1, kind='stable')[:, :k]
+    return np.where(np.take_along_axis(seen, first, axis=1), -1, ranked[first])
+
+@recommender('top-rated')
+def top_rated(snapshot, split, k):
+    return unseen_top(split, snapshot.top_k(None, k=k + split.max_seen), k)
+
+@recommender('popular')
+def popular(snapshot, split, k):
+    counts = np.bincount(split.train_rows, minlength=split.titles)
+    return unseen_top(split, np.argsort(-counts, kind='stable'), k)
+
+@recommender('profile', per_user=True)
+def profile(snapshot, split, index, k):
+    rows = user_recommendations(snapshot, int(split.user_ids[index]), k, split.history(index))
+    return rows if rows is not None else np.empty(0, dtype=np.int64)
+
+@recommender('profile-diverse', per_user=True)
+def profile_diverse(snapshot, split, index, k):
+    rows = user_recommendations(snapshot, int(split.user_ids[index]), CANDIDATES, split.history(index))
+    return diversify(snapshot.movies, rows, k) if rows is not None else np.empty(0, dtype=np.int64)
+
+@recommender('profile-batch')
+def profile_batch(snapshot, split, k):
+    root = tempfile.mkdtemp(prefix='cinematch-eval-')
+    try:
+        batch.prepare(snapshot, root, k, end=split.cutoff)
+        batch.open_worker(root)
+        # Only the shards holding evaluated users are scored
+        for start in np.unique(split.users // batch.SHARD_ROWS) * batch.SHARD_ROWS:
+            batch.score_shard('users', int(start), int(min(start + batch.SHARD_ROWS, len(batch.WORKER['profiles']))), k)
+        positions = np.asarray(batch.WORKER['user_ids'][split.users], dtype=np.int64)
+    finally:
+        batch.WORKER.clear()
+        shutil.rmtree(root, ignore_errors=True)
+    return positions
+
+# Rank k titles for every evaluated user; returns (positions, seconds, per-user call seconds or None)
+def run_recommender(snapshot, split, name, k):
+    function, per_user = RECOMMENDERS[name]
+    started = time.perf_counter()
+    if not per_user:
+        positions = function(snapshot, split, k)
+        return positions, time.perf_counter() - started, None
+    positions = np.full((len(split), k), -1, dtype=np.int64)
+    calls = np.empty(len(split))
+    for index in range(len(split)):
+        began = time.perf_counter()
+        rows = function(snapshot, split, index, k)[:k]
+        calls[index] = time.perf_counter() - began
+        positions[index, :len(rows)] = rows
+    return positions, time.perf_counter() - started, calls
+
+def ranking_metrics(split, positions, k):
+    """precision@k, recall@k, NDCG@k and hit rate averaged over users, and catalog coverage"""
+    positions = positions[:, :k]
+    listed = positions >= 0
+    keys = np.arange(len(split), dtype=np.int64)[:, None] * split.titles + positions
+    hits = listed & np.isin(keys, split.keys(split.relevant_indptr, split.relevant_rows))
+    relevant = np.diff(split.relevant_indptr)
+    discounts = 1 / np.log2(np.arange(2, positions.shape[1] + 2))
+    ideal = np.cumsum(discounts)[np.minimum(relevant, positions.shape[1]) - 1]
+    found = hits.sum(axis=1)
+    return {
+        'precision': float(found.mean() / k),
+        'recall': float((found / relevant).mean()),
+        'ndcg': float((hits @ discounts / ideal).mean()),
+        'hit_rate': float((found > 0).mean()),
+        'coverage': len(np.unique(positions[listed])) / split.titles,
+    }
+
+def evaluate(snapshot, split, names=None, k=SHOWN, memory=True):
+    """Quality, latency and (unless memory=False) peak allocation of each recommender"""
+    results = []
+    for name in names or RECOMMENDERS:
+        positions, seconds, calls = run_recommender(snapshot, split, name, k)
+        result = {'recommender': name, 'k': k, 'users': len(split), **ranking_metrics(split, positions, k),
+                  'total_s': seconds, 'ms_per_user': 1000 * seconds / max(len(split), 1)}
+        if calls is not None:
+            result['p50_ms'] = 1000 * float(np.percentile(calls, 50))
+            result['p99_ms'] = 1000 * float(np.percentile(calls, 99))
+        if memory:
+            # A second run under tracemalloc, which would skew the timing of the first
+            tracemalloc.start()
+            try:
+                run_recommender(snapshot, split, name, k)
+                result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            finally:
+                tracemalloc.stop()
+        results.append(result)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="CineMatch offline recommender evaluation")
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--recommenders', default=','.join(RECOMMENDERS), help="comma separated, from: " + ', '.join(RECOMMENDERS))
+    parser.add_argument('--k', type=int, default=SHOWN)
+    parser.add_argument('--test-fraction', type=float, default=TEST_FRACTION)
+    parser.add_argument('--min-rating', type=float, default=MIN_RATING)
+    parser.add_argument('--max-users', type=int, help="evaluate a random sample of users")
+    parser.add_argument('--skip-memory', action='store_true', help="don't re-run under tracemalloc")
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    names = [name.strip() for name in args.recommenders.split(',') if name.strip()]
+    unknown = [name for name in names if name not in RECOMMENDERS]
+    if unknown:
+        parser.error(f"unknown recommenders {', '.join(unknown)}")
+
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    from catalog import load_data
+    snapshot = load_data(args.data_dir, os.environ.get('CINEMATCH_SHARED_CATALOG'))
+    split = temporal_split(snapshot, args.test_fraction, args.min_rating, args.max_users)
+    relevant = np.diff(split.relevant_indptr)
+    print(f"Cutoff {time.strftime('%Y-%m-%d', time.gmtime(split.cutoff))}: {len(split.train_users):,} training interactions, "
+          f"{len(split):,} users with {relevant.sum():,} held-out titles rated {args.min_rating:g}+")
+    results = evaluate(snapshot, split, names, args.k, memory=not args.skip_memory)
+
+    k = args.k
+    print(f"{'recommender':<15} {f'P@{k}':>7} {f'R@{k}':>7} {f'NDCG@{k}':>8} {'hit':>6} {'cover':>6} {'ms/user':>8} {'p99 ms':>7} {'peak MB':>8}")
+    for result in results:
+        print(f"{result['recommender']:<15} {result['precision']:>7.4f} {result['recall']:>7.4f} {result['ndcg']:>8.4f} "
+              f"{result['hit_rate']:>6.3f} {result['coverage']:>6.3f} {result['ms_per_user']:>8.3f} "
+              f"{result.get('p99_ms', float('nan')):>7.2f} {result.get('peak_mb', float('nan')):>8.1f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'cutoff': split.cutoff, 'test_fraction': args.test_fraction, 'min_rating': args.min_rating,
+                       'users': len(split), 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
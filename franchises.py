@@ -0,0 +1,245 @@
+"""
+🎞️ Franchises - TMDB collections as a local graph of ordered parts
+Expanding a collection fetches its parts' details concurrently (through the
+shared upstream rate limiter), maps each part to a catalog tconst by IMDb id or
+by title and year, and saves collection -> ordered parts and title -> collection
+to disk. Franchise pages and "next in series" are then served from the graph
+without calling TMDB again until an entry is older than MAX_AGE.
+
+    python franchises.py expand 119 10 1241        # collection ids
+    python franchises.py discover --top 2000        # find the collections of the most voted movies
+    python franchises.py show tt0167261
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from interactions import write_atomic
+from providers import current_store, resolve_tmdb_id
+from trending import match_tmdb_result
+from upstream import tmdb_get
+
+FRANCHISE_DIR = os.environ.get('CINEMATCH_FRANCHISE_DIR', os.path.join('data', 'franchises'))
+EXPAND_WORKERS = 8
+MAX_AGE = 30 * 86_400
+# Open graphs by directory, with the mtime they were read at
+GRAPHS = {}
+GRAPHS_LOCK = threading.Lock()
+
+class FranchiseGraph:
+    """Collections with their parts in release order, and the collection of every known title"""
+
+    def __init__(self, root=FRANCHISE_DIR):
+        self.root = root
+        self.collections = {}
+        self.titles = {}
+        self.checked = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, root=FRANCHISE_DIR):
+        graph = cls(root)
+        try:
+            with open(os.path.join(root, 'franchises.json')) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return graph
+        graph.collections = data['collections']
+        graph.titles = data['titles']
+        graph.checked = data.get('checked', {})
+        return graph
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock:
+            data = {'collections': self.collections, 'titles': self.titles, 'checked': self.checked}
+            write_atomic(os.path.join(self.root, 'franchises.json'), lambda f: json.dump(data, f), 'w')
+
+    def __len__(self):
+        return len(self.collections)
+
+    def get(self, collection_id, max_age=None):
+        entry = self.collections.get(str(collection_id))
+        if entry and max_age is not None and entry['fetched'] < time.time() - max_age:
+            return None
+        return entry
+
+    def add(self, collection, parts):
+        """Store a collection payload with its parts ([{'id', 'title', 'year', 'tconst'}]); returns the entry"""
+        parts = sorted(parts, key=lambda part: (part['year'] or 9999, part['title']))
+        entry = {
+            'id': collection['id'], 'name': collection.get('name', ''), 'overview': collection.get('overview', ''),
+            'poster_path': collection.get('poster_path'), 'parts': parts, 'fetched': int(time.time()),
+        }
+        with self._lock:
+            old = self.collections.get(str(collection['id']))
+            for part in old['parts'] if old else []:
+                if part['tconst'] and self.titles.get(part['tconst']) == str(collection['id']):
+                    del self.titles[part['tconst']]
+            self.collections[str(collection['id'])] = entry
+            for part in parts:
+                if part['tconst']:
+                    self.titles[part['tconst']] = str(collection['id'])
+                    self.checked[part['tconst']] = entry['fetched']
+        return entry
+
+    def collection_of(self, tconst):
+        collection_id = self.titles.get(tconst)
+        return self.collections.get(collection_id) if collection_id else None
+
+    def next_in_series(self, tconst):
+        """The part released after tconst in its collection, or None"""
+        entry = self.collection_of(tconst)
+        if not entry:
+            return None
+        position = next(i for i, part in enumerate(entry['parts']) if part['tconst'] == tconst)
+        return entry['parts'][position + 1] if position + 1 < len(entry['parts']) else None
+
+    def part_rows(self, snapshot, entry):
+        """Catalog positions of a collection's parts that are in the catalog, in release order"""
+        tconsts = [part['tconst'] for part in entry['parts'] if part['tconst']]
+        rows = pd.Index(snapshot.movies['tconst']).get_indexer(tconsts) if tconsts else np.empty(0, dtype=np.int64)
+        return rows[rows >= 0]
+
+    def unchecked(self, snapshot, limit=None, max_age=MAX_AGE):
+        """Movies never looked up (or looked up before max_age), most voted first"""
+        movies = snapshot.movies
+        rows = snapshot.rows_of_type('movie', 'tvMovie')
+        rows = rows[np.argsort(-movies['numVotes'].to_numpy()[rows], kind='stable')]
+        cutoff = time.time() - max_age
+        due = [row for row, tconst in zip(rows, movies['tconst'].to_numpy()[rows]) if self.checked.get(tconst, 0) < cutoff]
+        return movies.iloc[due[:limit]]
+
+# The graph at root, re-opened whenever it was saved (by this or another process)
+def current_graph(root=FRANCHISE_DIR):
+    try:
+        mtime = os.stat(os.path.join(root, 'franchises.json')).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    with GRAPHS_LOCK:
+        cached = GRAPHS.get(root)
+        if cached is None or cached[0] != mtime:
+            cached = GRAPHS[root] = (mtime, FranchiseGraph.open(root))
+    return cached[1]
+
+# Thread pool whose workers carry a Streamlit script context when one is given
+def fetch_pool(workers, ctx=None):
+    initializer = None
+    if ctx is not None:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx
+        initializer = lambda: add_script_run_ctx(threading.current_thread(), ctx)
+    return ThreadPoolExecutor(max_workers=workers, initializer=initializer)
+
+# One collection part as stored in the graph, mapped to a catalog tconst by IMDb id, else by title and year
+def map_part(snapshot, catalog_ids, part, details):
+    date = part.get('release_date') or ''
+    tconst = details.get('imdb_id') if details else None
+    if snapshot is not None and (not tconst or tconst not in catalog_ids):
+        row = match_tmdb_result(snapshot, part)
+        tconst = catalog_ids[row] if row is not None else None
+    return {'id': part['id'], 'title': part.get('title') or part.get('name') or '', 'year': int(date[:4]) if date[:4].isdigit() else None,
+            'tconst': tconst, 'poster_path': part.get('poster_path')}
+
+# Fetch a collection and all its parts' details concurrently; cached in the graph for max_age
+def expand_collection(graph, collection_id, snapshot=None, workers=EXPAND_WORKERS, ctx=None, max_age=MAX_AGE, save=True):
+    entry = graph.get(collection_id, max_age)
+    if entry:
+        return entry
+    collection = tmdb_get(f"collection/{collection_id}", {"language": "en-US"})
+    if not collection:
+        return None
+    parts = collection.get('parts') or []
+
+    def details(part):
+        try:
+            return tmdb_get(f"movie/{part['id']}")
+        except Exception:
+            return None
+
+    with fetch_pool(min(workers, max(len(parts), 1)), ctx) as pool:
+        payloads = list(pool.map(details, parts))
+    catalog_ids = pd.Index(snapshot.movies['tconst']) if snapshot is not None else None
+    entry = graph.add(collection, [map_part(snapshot, catalog_ids, part, payload) for part, payload in zip(parts, payloads)])
+    if save:
+        graph.save()
+    return entry
+
+# Look up the collection of the most voted unchecked movies and expand each new one; returns (titles, collections)
+def discover_collections(graph, snapshot, limit=1000, workers=EXPAND_WORKERS, ctx=None, max_age=MAX_AGE, progress=None):
+    titles = graph.unchecked(snapshot, limit, max_age)
+    known = current_store().tmdb
+
+    def belongs_to(movie):
+        try:
+            tmdb_id = known.get(movie['tconst']) or resolve_tmdb_id(movie)
+            if not tmdb_id or tmdb_id[0] != 'movie':
+                return movie['tconst'], None
+            details = tmdb_get(f"movie/{tmdb_id[1]}") or {}
+            return movie['tconst'], (details.get('belongs_to_collection') or {}).get('id')
+        except Exception:
+            return movie['tconst'], None
+
+    found = set()
+    with fetch_pool(workers, ctx) as pool:
+        for done, (tconst, collection_id) in enumerate(pool.map(belongs_to, (movie for _, movie in titles.iterrows())), 1):
+            graph.checked[tconst] = int(time.time())
+            if collection_id:
+                found.add(collection_id)
+            if progress and done % 200 == 0:
+                progress(f"{done}/{len(titles)} titles, {len(found)} collections")
+    for collection_id in found:
+        expand_collection(graph, collection_id, snapshot, workers, ctx, max_age, save=False)
+    graph.save()
+    return len(titles), len(found)
+
+def main():
+    parser = argparse.ArgumentParser(description="CineMatch franchise graph")
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--store', default=FRANCHISE_DIR)
+    parser.add_argument('--workers', type=int, default=EXPAND_WORKERS)
+    sub = parser.add_subparsers(dest='command', required=True)
+    expand = sub.add_parser('expand', help="fetch collections by TMDB id")
+    expand.add_argument('ids', nargs='+', type=int)
+    discover = sub.add_parser('discover', help="find the collections of the most voted movies")
+    discover.add_argument('--top', type=int, default=1000)
+    discover.add_argument('--max-age-days', type=float, default=MAX_AGE / 86_400)
+    show = sub.add_parser('show', help="print a title's collection")
+    show.add_argument('tconst')
+    args = parser.parse_args()
+
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    graph = FranchiseGraph.open(args.store)
+    if args.command == 'show':
+        entry = graph.collection_of(args.tconst)
+        if not entry:
+            print(f"{args.tconst} is in no known collection")
+            return
+        print(entry['name'])
+        for part in entry['parts']:
+            marker = '▶' if part['tconst'] == args.tconst else ' '
+            print(f" {marker} {part['year'] or '----'}  {part['title']}  {part['tconst'] or '(not in catalog)'}")
+        return
+
+    from catalog import load_data
+    started = time.perf_counter()
+    snapshot = load_data(args.data_dir, os.environ.get('CINEMATCH_SHARED_CATALOG'))
+    if args.command == 'expand':
+        for collection_id in args.ids:
+            entry = expand_collection(graph, collection_id, snapshot, args.workers, max_age=0)
+            if entry:
+                local = sum(1 for part in entry['parts'] if part['tconst'])
+                print(f"{entry['name']}: {len(entry['parts'])} parts, {local} in the catalog")
+            else:
+                print(f"Collection {collection_id} not found")
+    else:
+        checked, found = discover_collections(graph, snapshot, args.top, args.workers, max_age=args.max_age_days * 86_400, progress=print)
+        print(f"Checked {checked:,} titles and expanded {found:,} collections in {time.perf_counter() - started:.1f}s; "
+              f"{len(graph):,} collections, {len(graph.titles):,} titles in {args.store}")
+
+if __name__ == '__main__':
+    main()
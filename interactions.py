@@ -0,0 +1,441 @@
+"""
+📒 Interaction Store - day-partitioned, integer-encoded user interactions
+user_interactions.csv is ingested once, in chunks, into Arrow files under
+data/interactions/:
+
+    day=2024-05-01/part-<batch>.arrow   user, item (int32 codes), rating (int8), timestamp
+    users-<gen>.npy, items-<gen>.txt    append-only dictionaries: code -> user_id / tconst
+    counts-<gen>.npz                    interactions per user and per item code
+    manifest.json                       parts, dictionary sizes and the CSV it was built from
+
+Appends only add part files and extend the dictionaries, so earlier codes stay
+valid and a snapshot holding an older store keeps a consistent view. A rebuild
+writes a new interactions.v<build> directory and repoints the interactions
+symlink at it; views of the previous build keep reading their own files. Counts and
+popularity come from the stored aggregates or a streaming pass over the parts;
+nothing here materialises the whole log as one DataFrame.
+
+    python interactions.py ingest                    # (re)build from data/user_interactions.csv
+    python interactions.py append new.csv --batch 2024-05-01-events
+    python interactions.py stats
+"""
+import os
+import glob
+import json
+import time
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+STORE_DIR = os.environ.get('CINEMATCH_INTERACTIONS_DIR')
+CSV_NAME = 'user_interactions.csv'
+CHUNK_SIZE = 1_000_000
+COLUMNS = ['user_id', 'tconst', 'rating', 'timestamp']
+SCHEMA = pa.schema([('user', pa.int32()), ('item', pa.int32()), ('rating', pa.int8()), ('timestamp', pa.int64())])
+DAY_SECONDS = 86_400
+
+# Exclusive lock on a file shared by every process writing the store
+@contextmanager
+def file_lock(path):
+    with open(path, 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+            return
+        # msvcrt locks a byte range; LK_LOCK gives up after ~10s, so keep waiting
+        lock.seek(0)
+        while True:
+            try:
+                msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                break
+            except OSError:
+                pass
+        try:
+            yield
+        finally:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+# Move a finished directory to <root>.v<version> and point the root symlink at it
+def publish_version(staging, root, version):
+    """Swap root over to staging in one rename; call with <root>.lock held
+
+    root is a symlink to a versioned sibling directory, so it always names a
+    complete copy. The previous version stays for readers that resolved it just
+    before the swap; older ones are removed.
+    """
+    target = f"{root}.v{version}"
+    link = f"{root}.link-{os.getpid()}"
+    previous = os.readlink(root) if os.path.islink(root) else None
+    if os.path.isdir(root) and previous is None:
+        # A plain directory from before versioning is moved aside once, not atomically
+        previous = f"{root}.v0"
+        os.rename(root, previous)
+    os.rename(staging, target)
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(target), link)
+    os.replace(link, root)
+    keep = {os.path.basename(target), previous and os.path.basename(previous)}
+    for path in glob.glob(f"{glob.escape(root)}.v*"):
+        if os.path.basename(path) not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+# The versioned directory a store or export path currently points at
+def resolve_root(path):
+    return os.path.realpath(path) if os.path.islink(path) else path
+
+# Directory of the store for a data directory
+def store_dir(data_dir):
+    return STORE_DIR or os.path.join(data_dir, 'interactions')
+
+# Size and mtime of the CSV a store is built from
+def csv_signature(path):
+    try:
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+    except FileNotFoundError:
+        return None
+
+# Write a file next to its final name and rename it into place
+def write_atomic(path, write, mode='wb'):
+    staging = f"{path}.tmp-{os.getpid()}"
+    with open(staging, mode) as f:
+        write(f)
+    os.replace(staging, path)
+
+class Dictionary:
+    """Append-only mapping of raw ids to dense int32 codes"""
+
+    def __init__(self, values):
+        self.values = values
+        self._lookup = None
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def lookup(self):
+        if self._lookup is None:
+            self._lookup = pd.Index(self.values)
+        return self._lookup
+
+    def codes(self, raw):
+        """Codes of raw ids; -1 for ids never seen"""
+        return self.lookup.get_indexer(raw).astype(np.int32) if len(self.values) else np.full(len(raw), -1, dtype=np.int32)
+
+    def extend(self, raw):
+        """Codes of raw ids and the dictionary with unseen ids appended"""
+        codes = self.codes(raw)
+        unseen = codes < 0
+        if not unseen.any():
+            return codes, self
+        new = pd.unique(np.asarray(raw)[unseen])
+        extended = Dictionary(np.concatenate([self.values, new.astype(self.values.dtype)]))
+        codes[unseen] = len(self.values) + pd.Index(new).get_indexer(np.asarray(raw)[unseen])
+        return codes, extended
+
+    def decode(self, codes):
+        return self.values[codes]
+
+class InteractionStore:
+    """Read view of one generation of the store, plus append"""
+
+    def __init__(self, root, manifest, users, items, user_counts, item_counts, path=None):
+        # Files are read from root, the build this view was opened on; path is
+        # the store location as configured, which a rebuild repoints
+        self.root = root
+        self.path = path or root
+        self.manifest = manifest
+        self.users = users
+        self.items = items
+        self.user_counts = user_counts
+        self.item_counts_by_code = item_counts
+
+    @classmethod
+    def open(cls, path):
+        """Open the current generation of the store at path"""
+        root = resolve_root(path)
+        try:
+            with open(os.path.join(root, 'manifest.json')) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {'generation': 0, 'source': None, 'build': None, 'batches': [], 'parts': [], 'rows': 0}
+        generation = manifest['generation']
+        if not generation:
+            return cls(root, manifest, Dictionary(np.empty(0, dtype=np.int64)), Dictionary(np.empty(0, dtype=object)),
+                       np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), path)
+        users = np.load(os.path.join(root, f'users-{generation}.npy'), mmap_mode='r')
+        with open(os.path.join(root, f'items-{generation}.txt')) as f:
+            items = np.array(f.read().split('\n')[:-1], dtype=object)
+        counts = np.load(os.path.join(root, f'counts-{generation}.npz'))
+        return cls(root, manifest, Dictionary(np.asarray(users)), Dictionary(items), counts['users'], counts['items'], path)
+
+    def __len__(self):
+        return self.manifest['rows']
+
+    @property
+    def user_count(self):
+        return len(self.users)
+
+    @property
+    def parts(self):
+        return self.manifest['parts']
+
+    def days(self):
+        return sorted({part['day'] for part in self.parts})
+
+    # --- appending -------------------------------------------------------
+
+    def append(self, frame, batch=None):
+        """Encode and write interaction rows; returns the store that includes them
+
+        A named batch is written once: appending it again (another server
+        process, or a restart re-reading data/deltas/) is a no-op.
+        """
+        batch = batch or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{time.monotonic_ns()}"
+        # Another process may have appended, or rebuilt the store, since this view was opened
+        root = resolve_root(self.path)
+        os.makedirs(root, exist_ok=True)
+        with file_lock(os.path.join(root, '.lock')):
+            current = InteractionStore.open(self.path)
+            if batch in current.manifest['batches'] or not len(frame):
+                return current
+            return current._write([(batch, frame)])
+
+    def append_chunks(self, chunks, batch):
+        """Append an iterable of frames as parts `<batch>-<n>` under one lock"""
+        root = resolve_root(self.path)
+        os.makedirs(root, exist_ok=True)
+        with file_lock(os.path.join(root, '.lock')):
+            current = InteractionStore.open(self.path)
+            for i, frame in enumerate(chunks):
+                name = f"{batch}-{i:05d}"
+                if name not in current.manifest['batches'] and len(frame):
+                    current = current._write([(name, frame)])
+            return current
+
+    def _write(self, batches):
+        users, items = self.users, self.items
+        user_counts, item_counts = self.user_counts, self.item_counts_by_code
+        manifest = dict(self.manifest, parts=list(self.parts), batches=list(self.manifest['batches']))
+        for batch, frame in batches:
+            user_codes, users = users.extend(frame['user_id'].to_numpy(dtype=np.int64))
+            item_codes, items = items.extend(frame['tconst'].to_numpy(dtype=object))
+            encoded = pd.DataFrame({
+                'user': user_codes,
+                'item': item_codes,
+                'rating': np.rint(frame['rating'].to_numpy(dtype=np.float64)).astype(np.int8),
+                'timestamp': frame['timestamp'].to_numpy(dtype=np.int64),
+            })
+            user_counts = np.bincount(user_codes, minlength=len(users)) + np.pad(user_counts, (0, len(users) - len(user_counts)))
+            item_counts = np.bincount(item_codes, minlength=len(items)) + np.pad(item_counts, (0, len(items) - len(item_counts)))
+            days = encoded['timestamp'].to_numpy() // DAY_SECONDS
+            for day, rows in pd.Series(np.arange(len(days))).groupby(days).indices.items():
+                part = encoded.iloc[rows].sort_values('timestamp', kind='stable')
+                name = str(np.datetime64(int(day), 'D'))
+                path = os.path.join(f'day={name}', f'part-{batch}.arrow')
+                os.makedirs(os.path.join(self.root, f'day={name}'), exist_ok=True)
+                write_atomic(os.path.join(self.root, path), lambda f: write_part(part, f))
+                manifest['parts'].append({'path': path, 'day': name, 'rows': len(part),
+                                          'start': int(part['timestamp'].iloc[0]), 'end': int(part['timestamp'].iloc[-1])})
+            manifest['batches'].append(batch)
+            manifest['rows'] += len(encoded)
+        manifest['parts'].sort(key=lambda part: (part['day'], part['path']))
+
+        # Dictionaries and counts of the new generation go down before the
+        # manifest that points at them; the previous generation stays readable
+        generation = self.manifest['generation'] + 1
+        manifest['generation'] = generation
+        write_atomic(os.path.join(self.root, f'users-{generation}.npy'), lambda f: np.save(f, users.values))
+        write_atomic(os.path.join(self.root, f'items-{generation}.txt'), lambda f: f.writelines(f"{value}\n" for value in items.values), 'w')
+        write_atomic(os.path.join(self.root, f'counts-{generation}.npz'), lambda f: np.savez(f, users=user_counts, items=item_counts))
+        write_atomic(os.path.join(self.root, 'manifest.json'), lambda f: json.dump(manifest, f), 'w')
+        for name in (f'users-{generation - 2}.npy', f'items-{generation - 2}.txt', f'counts-{generation - 2}.npz'):
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+        return InteractionStore(self.root, manifest, users, items, user_counts, item_counts, self.path)
+
+    # --- reading -----------------------------------------------------------
+
+    def selected_parts(self, start=None, end=None):
+        """Parts overlapping [start, end) in unix seconds, oldest day first"""
+        return [part for part in self.parts
+                if (start is None or part['end'] >= start) and (end is None or part['start'] < end)]
+
+    def iter_tables(self, start=None, end=None, columns=None, parts=None):
+        """Yield one encoded Arrow table per part file (of `parts`, or of the window)"""
+        for part in self.selected_parts(start, end) if parts is None else parts:
+            table = read_part(os.path.join(self.root, part['path']))
+            # Only the boundary parts of a window need a row filter
+            if (start is not None and part['start'] < start) or (end is not None and part['end'] >= end):
+                timestamp = table.column('timestamp').to_numpy()
+                keep = np.ones(len(timestamp), dtype=bool)
+                if start is not None:
+                    keep &= timestamp >= start
+                if end is not None:
+                    keep &= timestamp < end
+                table = table.filter(pa.array(keep))
+            yield table if columns is None else table.select(columns)
+
+    def chunks(self, chunk_size=CHUNK_SIZE, start=None, end=None, columns=None, decode=False):
+        """Yield DataFrames of about chunk_size rows in day order
+
+        Rows hold int32 user/item codes unless decode=True, which maps them back
+        to user_id/tconst one chunk at a time.
+        """
+        pending, size = [], 0
+        for table in self.iter_tables(start, end, columns):
+            pending.append(table)
+            size += len(table)
+            if size >= chunk_size:
+                yield self._chunk(pending, decode)
+                pending, size = [], 0
+        if pending:
+            yield self._chunk(pending, decode)
+
+    def _chunk(self, tables, decode):
+        # Small day parts are stitched together before the one pandas conversion
+        frame = pa.concat_tables(tables).to_pandas(split_blocks=True, self_destruct=False)
+        return self.decode(frame) if decode else frame
+
+    def decode(self, frame):
+        """user/item codes of an encoded frame as user_id/tconst columns"""
+        decoded = frame.drop(columns=[c for c in ('user', 'item') if c in frame])
+        if 'item' in frame:
+            decoded.insert(0, 'tconst', self.items.decode(frame['item'].to_numpy()))
+        if 'user' in frame:
+            decoded.insert(0, 'user_id', self.users.decode(frame['user'].to_numpy()))
+        return decoded
+
+    # --- aggregates --------------------------------------------------------
+
+    def item_counts(self, start=None, end=None, min_rating=None):
+        """Interactions per tconst, most first (stored totals, or one streaming pass for a window)"""
+        if start is None and end is None and min_rating is None:
+            counts = self.item_counts_by_code
+        else:
+            counts = np.zeros(len(self.items), dtype=np.int64)
+            columns = ['item'] if min_rating is None else ['item', 'rating']
+            for chunk in self.chunks(start=start, end=end, columns=columns):
+                items = chunk['item'].to_numpy()
+                if min_rating is not None:
+                    items = items[chunk['rating'].to_numpy() >= min_rating]
+                counts += np.bincount(items, minlength=len(counts))
+        nonzero = np.flatnonzero(counts)
+        series = pd.Series(counts[nonzero], index=pd.Index(self.items.decode(nonzero), name='tconst'), name='count')
+        return series.sort_values(ascending=False, kind='stable')
+
+    def daily_counts(self):
+        """Interactions per day, from the manifest alone"""
+        days = pd.Series({part['day']: 0 for part in self.parts}, dtype=np.int64)
+        for part in self.parts:
+            days[part['day']] += part['rows']
+        return days
+
+    def user_history(self, user_id, min_rating=None):
+        """One user's interactions (tconst, rating, timestamp), oldest first"""
+        code = self.users.codes([user_id])[0]
+        if code < 0:
+            return pd.DataFrame(columns=['tconst', 'rating', 'timestamp'])
+        found = []
+        for chunk in self.chunks():
+            mask = chunk['user'].to_numpy() == code
+            if min_rating is not None:
+                mask &= chunk['rating'].to_numpy() >= min_rating
+            if mask.any():
+                found.append(chunk[mask])
+        if not found:
+            return pd.DataFrame(columns=['tconst', 'rating', 'timestamp'])
+        history = pd.concat(found, ignore_index=True).sort_values('timestamp', kind='stable')
+        return self.decode(history.drop(columns='user')).reset_index(drop=True)
+
+def write_part(frame, sink):
+    with pa.ipc.new_file(sink, SCHEMA) as writer:
+        writer.write_table(pa.Table.from_pandas(frame, schema=SCHEMA, preserve_index=False))
+
+def read_part(path):
+    # Columns stay views into the mapped file
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+# CSV rows in chunks, without reading the whole file
+def read_csv_chunks(path, chunk_size=CHUNK_SIZE):
+    dtype = {'user_id': np.int64, 'tconst': str, 'rating': np.float64, 'timestamp': np.int64}
+    yield from pd.read_csv(path, usecols=COLUMNS, dtype=dtype, chunksize=chunk_size)
+
+# Build a fresh store from a CSV, replacing the one at root atomically
+def ingest_csv(csv_path, root, chunk_size=CHUNK_SIZE):
+    """Write a new build of the store and publish it as root; call with <root>.lock held
+
+    Every build gets its own directory and build id, so a view opened on the
+    previous build keeps reading its own parts and dictionaries.
+    """
+    root = root.rstrip(os.sep)
+    build = f"{time.time_ns()}"
+    staging = f"{root}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    store = InteractionStore.open(staging)
+    if os.path.exists(csv_path):
+        store = store.append_chunks(read_csv_chunks(csv_path, chunk_size), 'base')
+    manifest = dict(store.manifest, source=csv_signature(csv_path), build=build)
+    os.makedirs(staging, exist_ok=True)
+    write_atomic(os.path.join(staging, 'manifest.json'), lambda f: json.dump(manifest, f), 'w')
+    publish_version(staging, root, build)
+    return InteractionStore.open(root)
+
+# Open the store for data_dir, (re)building it when user_interactions.csv changed
+def open_interactions(data_dir, root=None):
+    root = root or store_dir(data_dir)
+    csv_path = os.path.join(data_dir, CSV_NAME)
+    store = InteractionStore.open(root)
+    if store.manifest['generation'] and store.manifest['source'] == csv_signature(csv_path):
+        return store
+    os.makedirs(os.path.dirname(os.path.abspath(root)), exist_ok=True)
+    with file_lock(f"{root.rstrip(os.sep)}.lock"):
+        store = InteractionStore.open(root)
+        if store.manifest['generation'] and store.manifest['source'] == csv_signature(csv_path):
+            return store
+        return ingest_csv(csv_path, root)
+
+def main():
+    parser = argparse.ArgumentParser(description="CineMatch interaction store")
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--store', help="store directory (default <data-dir>/interactions)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    ingest = sub.add_parser('ingest', help=f"rebuild the store from {CSV_NAME}")
+    ingest.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    append = sub.add_parser('append', help="append a CSV of interactions as one batch")
+    append.add_argument('csv')
+    append.add_argument('--batch', help="batch name; a batch is only ever appended once")
+    sub.add_parser('stats', help="print row, user, item and day counts")
+    args = parser.parse_args()
+
+    root = args.store or store_dir(args.data_dir)
+    started = time.perf_counter()
+    if args.command == 'ingest':
+        os.makedirs(os.path.dirname(os.path.abspath(root)), exist_ok=True)
+        with file_lock(f"{root.rstrip(os.sep)}.lock"):
+            store = ingest_csv(os.path.join(args.data_dir, CSV_NAME), root, args.chunk_size)
+    elif args.command == 'append':
+        store = open_interactions(args.data_dir, root)
+        store = store.append_chunks(read_csv_chunks(args.csv), args.batch or os.path.basename(args.csv))
+    else:
+        store = open_interactions(args.data_dir, root)
+    print(f"{len(store):,} interactions, {store.user_count:,} users, {len(store.items):,} titles, "
+          f"{len(store.days()):,} days in {len(store.parts):,} parts ({time.perf_counter() - started:.2f}s)")
+    if args.command == 'stats':
+        print(store.item_counts().head(10).to_string())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+"""
+🧪 Mock Upstream - local stand-in for TMDB, OMDB and image.tmdb.org
+Replays recorded JSON/image fixtures and synthesizes deterministic responses for
+everything else, with configurable latency, 5xx and 429 injection.
+
+    python mock_upstream.py --port 8765 --latency 80 --jitter 40 --error-rate 0.01 --throttle-rate 0.02
+    CINEMATCH_UPSTREAM=http://127.0.0.1:8765 streamlit run streamlit_app.py
+
+With --record, requests without a fixture are forwarded to the real services
+(TMDB_TOKEN / OMDB_KEY from the environment) and saved as new fixtures: JSON
+responses under tmdb/ and omdb/, images as files under images/. Responses that
+are neither (error pages) are passed on and logged, not saved.
+"""
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'upstream')
+REAL_UPSTREAMS = {
+    'tmdb': 'https://api.themoviedb.org',
+    'omdb': 'http://www.omdbapi.com',
+    'images': 'https://image.tmdb.org',
+}
+# Query parameters that never affect the response
+IGNORED_PARAMS = {'apikey', 'api_key'}
+PROVIDERS = ['Netflix', 'Amazon Prime Video', 'Disney Plus', 'Hulu', 'Max', 'Apple TV Plus', 'JioCinema', 'Zee5', 'SonyLIV']
+REGIONS = ['US', 'IN', 'GB', 'CA', 'AU']
+NAMES = ['Aarav Shah', 'Maya Chen', 'Leo Martins', 'Priya Nair', 'Sam Okafor', 'Ines Duarte', 'Kenji Ito', 'Zara Malik', 'Noah Berg', 'Ana Lima']
+
+# Stable pseudo-random numbers per request key
+def seeded(*parts):
+    return random.Random(hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest())
+
+def stable_id(text, modulo=900000):
+    return 100000 + int(hashlib.sha1(text.encode()).hexdigest()[:8], 16) % modulo
+
+# Normalized request key and its fixture file name
+def request_key(service, path, query):
+    params = sorted((k, v) for k, v in parse_qsl(query) if k not in IGNORED_PARAMS and v != '')
+    return f"{service}:{path}?{urlencode(params)}"
+
+def fixture_path(key):
+    service, rest = key.split(':', 1)
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', rest.split('?')[0]).strip('-')[:60]
+    return os.path.join(FIXTURE_DIR, service, f"{slug}-{hashlib.sha1(key.encode()).hexdigest()[:10]}.json")
+
+# Synthetic TMDB payloads, shaped like the real API
+def movie_stub(rng, movie_id, title=None, year=None):
+    year = year or rng.randint(1970, 2024)
+    return {
+        'id': movie_id,
+        'title': title or f"Mock Movie {movie_id}",
+        'overview': f"A synthetic overview for {title or movie_id}, served by the local mock upstream for offline testing.",
+        'poster_path': f"/poster-{movie_id}.jpg",
+        'backdrop_path': f"/backdrop-{movie_id}.jpg",
+        'release_date': f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        'vote_average': round(rng.uniform(5, 9), 1),
+        'vote_count': rng.randint(100, 50000),
+        'popularity': round(rng.uniform(1, 500), 2),
+        'media_type': 'movie',
+    }
+
+def tv_stub(rng, series_id, name=None, year=None):
+    year = year or rng.randint(1990, 2024)
+    return {
+        'id': series_id,
+        'name': name or f"Mock Series {series_id}",
+        'overview': f"A synthetic overview for {name or series_id}, served by the local mock upstream for offline testing.",
+        'poster_path': f"/poster-{series_id}.jpg",
+        'backdrop_path': f"/backdrop-{series_id}.jpg",
+        'first_air_date': f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        'vote_average': round(rng.uniform(5, 9), 1),
+        'vote_count': rng.randint(100, 50000),
+        'popularity': round(rng.uniform(1, 500), 2),
+        'media_type': 'tv',
+    }
+
+def synthesize_tmdb(path, params):
+    rng = seeded(path, sorted(params.items()))
+    parts = path.strip('/').split('/')[1:]  # drop the "3" version prefix
+    query = params.get('query', '')
+
+    if parts == ['authentication']:
+        return {'success': True, 'status_code': 1, 'status_message': 'Success.'}
+    if parts[:1] == ['search'] and len(parts) == 2:
+        kind = parts[1]
+        if kind == 'movie':
+            results = [movie_stub(rng, stable_id(f"movie:{query}"), query, int(params['year']) if params.get('year') else None)]
+        elif kind == 'tv':
+            results = [tv_stub(rng, stable_id(f"tv:{query}"), query)]
+        else:
+            results = [{'id': stable_id(f"collection:{query}:{i}"), 'name': f"{query.title()} Collection {i + 1}",
+                        'overview': f"Every film in the {query} saga.", 'poster_path': f"/collection-{i}.jpg"} for i in range(3)]
+        return {'page': 1, 'results': results, 'total_pages': 1, 'total_results': len(results)}
+    if parts[:1] == ['find'] and len(parts) == 2:
+        return {'movie_results': [movie_stub(rng, stable_id(f"find:movie:{parts[1]}"))], 'person_results': [],
+                'tv_results': [tv_stub(rng, stable_id(f"find:tv:{parts[1]}"))], 'tv_episode_results': [], 'tv_season_results': []}
+    if parts[:1] in (['discover'], ['trending']):
+        stub = tv_stub if 'tv' in parts else movie_stub
+        return {'page': 1, 'results': [stub(rng, stable_id(f"{path}:{i}")) for i in range(20)], 'total_pages': 1, 'total_results': 20}
+    if len(parts) >= 2 and parts[0] in ('movie', 'tv', 'collection'):
+        kind, item_id, rest = parts[0], int(parts[1]), parts[2:]
+        if rest == ['credits']:
+            return {
+                'id': item_id,
+                'cast': [{'name': name, 'character': f"Role {i + 1}"} for i, name in enumerate(rng.sample(NAMES, 6))],
+                'crew': [{'name': rng.choice(NAMES), 'job': 'Director'}, {'name': rng.choice(NAMES), 'job': 'Writer'}],
+            }
+        if rest == ['watch', 'providers']:
+            return {'id': item_id, 'results': {
+                region: {'link': f"https://www.themoviedb.org/{kind}/{item_id}/watch?locale={region}",
+                         'flatrate': [{'provider_id': PROVIDERS.index(p) + 1, 'provider_name': p} for p in rng.sample(PROVIDERS, rng.randint(1, 3))]}
+                for region in rng.sample(REGIONS, rng.randint(2, len(REGIONS)))
+            }}
+        if rest == ['images']:
+            return {'id': item_id, 'posters': [{'file_path': f"/poster-{item_id}-{i}.jpg"} for i in range(3)],
+                    'backdrops': [{'file_path': f"/backdrop-{item_id}-{i}.jpg"} for i in range(3)]}
+        if kind == 'tv' and len(rest) == 2 and rest[0] == 'season':
+            number = int(rest[1])
+            return {'id': stable_id(f"season:{item_id}:{number}"), 'season_number': number, 'name': f"Season {number}",
+                    'episodes': [{'episode_number': e + 1, 'name': f"Episode {e + 1}", 'runtime': rng.randint(22, 60),
+                                  'air_date': f"{2000 + number}-01-{e + 1:02d}", 'vote_average': round(rng.uniform(6, 9.5), 1)}
+                                 for e in range(rng.randint(6, 12))]}
+        if not rest and kind == 'movie':
+            return dict(movie_stub(rng, item_id), runtime=rng.randint(85, 180),
+                        belongs_to_collection={'id': stable_id(f"franchise:{item_id % 50}"), 'name': f"Mock Franchise {item_id % 50}"})
+        if not rest and kind == 'tv':
+            seasons = rng.randint(1, 8)
+            return dict(tv_stub(rng, item_id), number_of_seasons=seasons, status=rng.choice(['Ended', 'Returning Series']),
+                        last_air_date=f"{2000 + seasons}-06-01", networks=[{'name': rng.choice(['HBO', 'BBC', 'Netflix', 'AMC'])}],
+                        genres=[{'name': g} for g in rng.sample(['Drama', 'Crime', 'Comedy', 'Sci-Fi & Fantasy', 'Mystery'], 2)],
+                        production_companies=[{'name': 'Mock Studios'}],
+                        seasons=[{'season_number': n, 'name': f"Season {n}", 'episode_count': rng.randint(6, 12)} for n in range(1, seasons + 1)])
+        if not rest and kind == 'collection':
+            parts_list = [movie_stub(seeded(item_id, i), stable_id(f"part:{item_id}:{i}"), f"Mock Franchise Part {i + 1}", 1990 + 3 * i)
+                          for i in range(rng.randint(3, 8))]
+            return {'id': item_id, 'name': f"Mock Collection {item_id}", 'overview': "A synthetic franchise.",
+                    'poster_path': f"/collection-{item_id}.jpg", 'parts': parts_list}
+    return None
+
+def synthesize_omdb(params):
+    rng = seeded('omdb', sorted(params.items()))
+    title = params.get('t') or f"Mock Title {params.get('i', '')}"
+    return {
+        'Response': 'True', 'Title': title, 'Year': params.get('y', '2000'),
+        'Plot': f"A synthetic OMDB plot for {title}, long enough to be used as the summary.",
+        'Director': rng.choice(NAMES), 'Actors': ', '.join(rng.sample(NAMES, 4)), 'Writer': rng.choice(NAMES),
+        'Runtime': f"{rng.randint(85, 180)} min", 'Poster': f"{MockUpstreamHandler.base_url}/t/p/w500/omdb-{stable_id(title)}.jpg",
+    }
+
+class MockUpstreamHandler(BaseHTTPRequestHandler):
+    """Routes /3/* to TMDB, /omdb/ to OMDB and /t/p/* to images"""
+
+    base_url = ''
+    options = {}
+    stats = {'requests': 0, 'errors': 0, 'throttled': 0, 'fixtures': 0, 'synthesized': 0, 'recorded': 0}
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        if self.options.get('verbose'):
+            super().log_message(format, *args)
+
+    def log_error(self, format, *args):
+        # Errors, and responses --record could not save, are shown without --verbose
+        super().log_message(format, *args)
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def send_payload(self, status, body, content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/__stats':
+            return self.send_payload(200, json.dumps(self.stats).encode())
+        self.count('requests')
+
+        options = self.options
+        rng = random.Random()
+        delay = max(0.0, options.get('latency', 0) + rng.uniform(-1, 1) * options.get('jitter', 0)) / 1000
+        if delay:
+            time.sleep(delay)
+        if rng.random() < options.get('throttle_rate', 0):
+            self.count('throttled')
+            return self.send_payload(429, b'{"status_code": 25, "status_message": "Rate limit exceeded"}',
+                                     headers={'Retry-After': str(options.get('retry_after', 1))})
+        if rng.random() < options.get('error_rate', 0):
+            self.count('errors')
+            return self.send_payload(500, b'{"status_message": "Injected failure"}')
+
+        if url.path.startswith('/t/p/'):
+            return self.serve_image(url.path, options.get('record'))
+        service = 'tmdb' if url.path.startswith('/3/') else 'omdb' if url.path.startswith('/omdb') else None
+        if service is None:
+            return self.send_payload(404, b'{"status_message": "Unknown route"}')
+
+        key = request_key(service, url.path, url.query)
+        path = fixture_path(key)
+        if os.path.exists(path):
+            with open(path) as f:
+                fixture = json.load(f)
+            self.count('fixtures')
+            return self.send_payload(fixture.get('status', 200), json.dumps(fixture['body']).encode())
+
+        if options.get('record'):
+            return self.record(service, url, key, path)
+
+        params = dict(parse_qsl(url.query))
+        body = synthesize_tmdb(url.path, params) if service == 'tmdb' else synthesize_omdb(params)
+        if body is None:
+            return self.send_payload(404, b'{"status_code": 34, "status_message": "The resource you requested could not be found."}')
+        self.count('synthesized')
+        self.send_payload(200, json.dumps(body).encode())
+
+    def serve_image(self, path, record=False):
+        name = os.path.basename(path)
+        image = os.path.join(FIXTURE_DIR, 'images', name)
+        if not os.path.exists(image) and record:
+            return self.record_image(path, image)
+        if not os.path.exists(image):
+            image = os.path.join(FIXTURE_DIR, 'images', 'default.jpg')
+        with open(image, 'rb') as f:
+            self.send_payload(200, f.read(), 'image/jpeg')
+
+    def forward(self, url, **kwargs):
+        """GET a real upstream URL; None (with a 502 sent and the reason logged) if it fails"""
+        import requests
+        try:
+            return requests.get(url, timeout=10, **kwargs)
+        except requests.RequestException as error:
+            self.log_error("Not recorded, %s failed: %s", url, error)
+            self.send_payload(502, b'{"status_message": "Upstream request failed"}')
+            return None
+
+    def record(self, service, url, key, path):
+        if service == 'tmdb':
+            response = self.forward(f"{REAL_UPSTREAMS['tmdb']}{url.path}", params=url.query,
+                                    headers={'accept': 'application/json', 'Authorization': f"Bearer {os.environ['TMDB_TOKEN']}"})
+        else:
+            params = dict(parse_qsl(url.query), apikey=os.environ['OMDB_KEY'])
+            response = self.forward(f"{REAL_UPSTREAMS['omdb']}/", params=params)
+        if response is None:
+            return
+        content_type = response.headers.get('Content-Type', 'application/json')
+        try:
+            body = response.json()
+        except ValueError:
+            # Error pages (HTML from a proxy, an empty 5xx) are passed on but not saved
+            self.log_error("Not recorded, %s answered %s with a non-JSON body (%s)", service, response.status_code, content_type)
+            return self.send_payload(response.status_code, response.content, content_type)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'request': key, 'status': response.status_code, 'body': body}, f, indent=1)
+        self.count('recorded')
+        self.send_payload(response.status_code, response.content, content_type)
+
+    def record_image(self, path, image):
+        response = self.forward(f"{REAL_UPSTREAMS['images']}{path}")
+        if response is None:
+            return
+        content_type = response.headers.get('Content-Type', '')
+        if response.status_code == 200 and content_type.startswith('image/'):
+            # Saved under its file name, like the fixtures that are replayed for every size
+            os.makedirs(os.path.dirname(image), exist_ok=True)
+            staging = f"{image}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(staging, 'wb') as f:
+                f.write(response.content)
+            os.replace(staging, image)
+            self.count('recorded')
+        else:
+            self.log_error("Not recorded, image %s answered %s (%s)", path, response.status_code, content_type or 'no content type')
+        self.send_payload(response.status_code, response.content, content_type or 'application/octet-stream')
+
+# Start the server on a background thread (port 0 picks a free port)
+def start_mock_upstream(port=0, host='127.0.0.1', **options):
+    """Return (server, base_url); call server.shutdown() when done"""
+    server = ThreadingHTTPServer((host, port), MockUpstreamHandler)
+    server.daemon_threads = True
+    MockUpstreamHandler.base_url = f"http://{host}:{server.server_address[1]}"
+    MockUpstreamHandler.options = options
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, MockUpstreamHandler.base_url
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local TMDB/OMDB stand-in")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0, help="mean added latency in ms")
+    parser.add_argument('--jitter', type=float, default=0, help="uniform +/- jitter in ms")
+    parser.add_argument('--error-rate', type=float, default=0, help="fraction of requests answered with 500")
+    parser.add_argument('--throttle-rate', type=float, default=0, help="fraction of requests answered with 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument('--record', action='store_true', help="forward fixture misses to the real services and save them")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    server, base_url = start_mock_upstream(
+        args.port, args.host, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate, retry_after=args.retry_after, record=args.record, verbose=args.verbose,
+    )
+    print(f"Mock upstream on {base_url} (export CINEMATCH_UPSTREAM={base_url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,117 @@
+"""
+🔮 Prefetch - background warming of the enrichment caches for likely-next views
+After a page renders, the default result sets of the other pages and every
+mood button are queued here. A couple of low-priority worker threads call the
+same cached TMDB/OMDB/poster fetchers the cards use, so the first click on a
+tab or mood is a cache hit.
+
+    CINEMATCH_PREFETCH=0            disable
+    CINEMATCH_PREFETCH_BUDGET=300   most new titles queued per page view
+"""
+import os
+import time
+import threading
+from collections import deque, Counter
+from contextlib import contextmanager
+from streamlit.runtime.scriptrunner import add_script_run_ctx
+from queries import default_result_sets
+from upstream import fetch_card_enrichment, background_thread
+
+PREFETCH_ENABLED = os.environ.get('CINEMATCH_PREFETCH', '1') not in ('', '0')
+PREFETCH_WORKERS = 2
+PREFETCH_BUDGET = int(os.environ.get('CINEMATCH_PREFETCH_BUDGET', '300'))
+# A title is not queued again for this long (shorter than the enrichment cache TTLs)
+PREFETCH_TTL = 50 * 60
+# Breather between background fetches so they never saturate the upstream
+PREFETCH_PAUSE = 0.02
+
+# Titles worth warming after `page` rendered: other pages' defaults first, then the mood rows
+def prefetch_plan(catalog, page):
+    sets = default_result_sets(catalog)
+    ordered = [frame for (owner, view), frame in sets.items() if owner != page and not view.startswith('mood_')]
+    ordered += [frame for (owner, view), frame in sets.items() if view.startswith('mood_')]
+    return [movie for frame in ordered for _, movie in frame.iterrows()]
+
+class Prefetcher:
+    """Process-wide, low-priority queue of card enrichments to warm"""
+
+    def __init__(self, fetch=fetch_card_enrichment, workers=PREFETCH_WORKERS, budget=PREFETCH_BUDGET, ttl=PREFETCH_TTL, pause=PREFETCH_PAUSE):
+        self.fetch = fetch
+        self.workers = workers
+        self.budget = budget
+        self.ttl = ttl
+        self.pause = pause
+        self.queue = deque()
+        self.queued = {}
+        self.stats = Counter()
+        self._foreground = 0
+        self._plans = {}
+        self._threads = []
+        self._cond = threading.Condition()
+
+    def schedule(self, titles, ctx=None):
+        """Queue up to `budget` titles that were not warmed recently; returns how many"""
+        now = time.monotonic()
+        added = 0
+        with self._cond:
+            for movie in titles:
+                if added >= self.budget:
+                    break
+                key = movie.get('tconst')
+                if now - self.queued.get(key, -self.ttl) < self.ttl:
+                    continue
+                self.queued[key] = now
+                self.queue.append((movie, ctx))
+                added += 1
+            self.stats['queued'] += added
+            if added and not self._threads:
+                self._threads = [
+                    threading.Thread(target=self._work, name=f'cinematch-prefetch-{i}', daemon=True)
+                    for i in range(self.workers)
+                ]
+                for thread in self._threads:
+                    thread.start()
+            self._cond.notify_all()
+        return added
+
+    def schedule_page(self, catalog, page, ctx=None):
+        """Queue what a visitor of `page` is likely to open next (planned once per snapshot)"""
+        plan = self._plans.get(page)
+        if plan is None or plan[0] is not catalog:
+            plan = self._plans[page] = (catalog, prefetch_plan(catalog, page))
+        return self.schedule(plan[1], ctx)
+
+    @contextmanager
+    def foreground(self):
+        """Pause background fetches while a page is fetching its own cards"""
+        with self._cond:
+            self._foreground += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._foreground -= 1
+                self._cond.notify_all()
+
+    def pending(self):
+        with self._cond:
+            return len(self.queue)
+
+    def _work(self):
+        background_thread()
+        while True:
+            with self._cond:
+                while not self.queue or self._foreground:
+                    self._cond.wait()
+                movie, ctx = self.queue.popleft()
+            # The session's context lets st.secrets work on this thread
+            if ctx is not None:
+                add_script_run_ctx(threading.current_thread(), ctx)
+            try:
+                self.fetch(movie)
+                self.stats['fetched'] += 1
+            except Exception:
+                self.stats['failed'] += 1
+                with self._cond:
+                    self.queued.pop(movie.get('tconst'), None)
+            time.sleep(self.pause)
@@ -0,0 +1,211 @@
+"""
+⏱ Profiler - opt-in stack sampling of Streamlit reruns
+Samples the script thread and its enrichment workers while one rerun of
+streamlit_app.py executes, then writes collapsed stacks (for flamegraph.pl,
+speedscope or inferno) and a JSON report with the hottest functions, tagged
+with the page and widget state that produced them.
+
+    streamlit run streamlit_app.py                      # then open /?profile=1
+    CINEMATCH_PROFILE=1 streamlit run streamlit_app.py  # profile every rerun
+    flamegraph.pl profiles/<run>.collapsed > run.svg
+    python profiler.py profiles/<run>.json              # print the top table again
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import Counter
+from streamlit.runtime.scriptrunner_utils.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
+
+PROFILE_DIR = os.environ.get('CINEMATCH_PROFILE_DIR', 'profiles')
+SAMPLE_INTERVAL = float(os.environ.get('CINEMATCH_PROFILE_INTERVAL', '0.005'))
+# A rerun that never reaches finish() (exception, st.rerun) stops sampling here
+MAX_SECONDS = 120
+TOP_N = 25
+# Leading frames that belong to the thread/rerun machinery rather than the app;
+# a worker whose whole stack is machinery is idle and is not sampled
+RUNNER_FILES = re.compile(r'(threading\.py|queue\.py|concurrent[/\\]futures[/\\]|[/\\]streamlit[/\\])')
+# Where self time is attributed in the per-module summary (first match wins)
+MODULE_GROUPS = [
+    ('upstream', re.compile(r'upstream\.py$')),
+    ('catalog', re.compile(r'catalog\.py$')),
+    ('app', re.compile(r'streamlit_app\.py$')),
+    ('streamlit', re.compile(r'[/\\](streamlit|tornado)[/\\]')),
+    ('pandas/numpy', re.compile(r'[/\\](pandas|numpy|pyarrow)[/\\]')),
+    ('network', re.compile(r'[/\\](requests|urllib3|http|ssl|socket)|socket\.py$|ssl\.py$')),
+    ('images', re.compile(r'[/\\]PIL[/\\]')),
+]
+# Samplers still running per session, so an interrupted rerun is closed by the next one
+ACTIVE = {}
+
+# True when this rerun should be profiled
+def profiling_requested(query_params):
+    return os.environ.get('CINEMATCH_PROFILE', '') not in ('', '0') or query_params.get('profile', '0') not in ('', '0')
+
+# "function (file.py:line)" for one frame
+def frame_label(frame):
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+# Root-to-leaf frames of a thread, skipping the runner frames at the root
+def walk_stack(frame):
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    start = 0
+    while start < len(frames) and RUNNER_FILES.search(frames[start].f_code.co_filename):
+        start += 1
+    return frames[start:]
+
+# Summary bucket for the file a leaf frame is executing in
+def module_group(filename):
+    for group, pattern in MODULE_GROUPS:
+        if pattern.search(filename):
+            return group
+    return 'other'
+
+# Session and widget values that are worth recording with a profile
+def widget_state(session_state):
+    state = {}
+    for key in sorted(session_state.keys(), key=str):
+        value = session_state[key]
+        if isinstance(value, (str, int, float, bool, type(None))):
+            state[str(key)] = value
+        elif isinstance(value, (list, tuple)) and all(isinstance(v, (str, int, float, bool)) for v in value):
+            state[str(key)] = list(value)
+    return state
+
+class StackSampler:
+    """Samples every thread that carries one session's ScriptRunContext"""
+
+    def __init__(self, ctx, interval=SAMPLE_INTERVAL, max_seconds=MAX_SECONDS):
+        self.ctx = ctx
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks = Counter()
+        self.groups = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='cinematch-profiler', daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._script_thread = threading.current_thread()
+        self._thread.start()
+        return self
+
+    def _run(self):
+        deadline = self.started + self.max_seconds
+        while not self._stop.wait(self.interval) and time.perf_counter() < deadline:
+            self.sample()
+
+    def sample(self):
+        frames = sys._current_frames()
+        for thread in threading.enumerate():
+            if thread is self._thread or getattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, None) is not self.ctx:
+                continue
+            frame = frames.get(thread.ident)
+            if frame is None:
+                continue
+            stack = walk_stack(frame)
+            if not stack:
+                continue
+            role = 'script' if thread is self._script_thread else 'prefetch' if thread.name.startswith('cinematch-prefetch') else 'worker'
+            self.stacks[(role,) + tuple(frame_label(f) for f in stack)] += 1
+            self.groups[f"{role}:{module_group(frame.f_code.co_filename)}"] += 1
+        self.samples += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def collapsed(self):
+        """Stacks in the folded "a;b;c count" format"""
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def report(self, tags, top=TOP_N):
+        """Hot-function table and self time per module; times are summed over sampled threads"""
+        tick_ms = self.elapsed * 1000 / max(self.samples, 1)
+        thread_samples = max(sum(self.stacks.values()), 1)
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack[1:]):
+                total[label] += count
+        by_role = Counter()
+        for stack, count in self.stacks.items():
+            by_role[stack[0]] += count
+        return {
+            'tags': tags,
+            'elapsed_s': self.elapsed,
+            'samples': self.samples,
+            'interval_ms': self.interval * 1000,
+            'script_samples': by_role['script'],
+            'worker_samples': by_role['worker'],
+            'prefetch_samples': by_role['prefetch'],
+            'top': [
+                {'function': label, 'self_ms': own[label] * tick_ms, 'total_ms': count * tick_ms,
+                 'total_pct': 100 * count / thread_samples}
+                for label, count in total.most_common(top)
+            ],
+            'self_by_module': {group: count * tick_ms for group, count in self.groups.most_common()},
+        }
+
+    def write(self, tags, directory=PROFILE_DIR):
+        """Write <stamp>-<page>.collapsed and .json; returns the report"""
+        os.makedirs(directory, exist_ok=True)
+        page = re.sub(r'[^a-z0-9]+', '-', str(tags.get('page', '')).lower()).strip('-') or 'page'
+        base = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{page}")
+        report = self.report(tags)
+        report['collapsed'] = base + '.collapsed'
+        with open(base + '.collapsed', 'w') as f:
+            f.write(self.collapsed())
+        with open(base + '.json', 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        return report
+
+# Start sampling this rerun (closing any sampler an interrupted rerun left behind)
+def start_profiling(ctx, session_state):
+    leftover = ACTIVE.pop(ctx.session_id, None)
+    if leftover is not None:
+        leftover.stop().write({**leftover.tags, 'interrupted': True})
+    sampler = StackSampler(ctx)
+    # Provisional tags, used if this rerun never reaches finish_profiling
+    sampler.tags = {'page': session_state.get('page'), 'widgets': widget_state(session_state)}
+    ACTIVE[ctx.session_id] = sampler
+    return sampler.start()
+
+# Stop sampling and write the profile, tagged with page and widget state
+def finish_profiling(sampler, page, session_state):
+    ACTIVE.pop(sampler.ctx.session_id, None)
+    return sampler.stop().write({'page': page, 'widgets': widget_state(session_state), 'interrupted': False})
+
+def print_report(report):
+    tags = report['tags']
+    print(f"page {tags.get('page')}  widgets {json.dumps(tags.get('widgets', {}), ensure_ascii=False)}")
+    print(f"{report['elapsed_s'] * 1000:.0f} ms, {report['samples']} samples "
+          f"({report['script_samples']} script, {report['worker_samples']} worker, "
+          f"{report.get('prefetch_samples', 0)} prefetch stack samples)\n")
+    print(f"{'self ms':>9} {'total ms':>9} {'total %':>8}  function")
+    for row in report['top']:
+        print(f"{row['self_ms']:>9.1f} {row['total_ms']:>9.1f} {row['total_pct']:>7.1f}%  {row['function']}")
+    print("\nself time by thread:module")
+    for group, ms in report['self_by_module'].items():
+        print(f"{ms:>9.1f}  {group}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Print a CineMatch rerun profile")
+    parser.add_argument('report', help="profile JSON written by the app")
+    args = parser.parse_args()
+    with open(args.report) as f:
+        print_report(json.load(f))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+"""
+📺 Providers - where every title streams, in every region, from a local store
+TMDB's watch/providers payload lists providers per region. The store keeps all
+of it as bitsets: per region, the sorted titles available there and one row of
+uint64 words per title with a bit for each provider seen in that region. List
+pages filter by region with one vectorized pass instead of an HTTP call per card.
+
+The store is refreshed in bulk, oldest entries first, via TMDB's find-by-IMDb-id
+(cached per title) and watch/providers, through the shared upstream rate limiter:
+
+    python providers.py refresh --limit 2000 --max-age-days 7     # e.g. nightly from cron
+    python providers.py show tt0111161 --region IN
+    CINEMATCH_PROVIDER_REFRESH_HOURS=24 streamlit run streamlit_app.py   # or inside the server
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from interactions import write_atomic
+from upstream import tmdb_get, streaming_providers, background_thread
+
+PROVIDER_DIR = os.environ.get('CINEMATCH_PROVIDER_DIR', os.path.join('data', 'providers'))
+DEFAULT_REGION = os.environ.get('CINEMATCH_REGION', 'US')
+REFRESH_HOURS = float(os.environ.get('CINEMATCH_PROVIDER_REFRESH_HOURS', '0'))
+REFRESH_BATCH = int(os.environ.get('CINEMATCH_PROVIDER_REFRESH_BATCH', '1000'))
+REFRESH_WORKERS = 8
+MAX_AGE = 7 * 86_400
+TV_TYPES = ('tvSeries', 'tvMiniSeries', 'tvEpisode', 'tvSpecial')
+EMPTY_WORDS = np.zeros((0, 1), dtype=np.uint64)
+# Open stores by directory, with the mtime they were read at
+STORES = {}
+STORES_LOCK = threading.Lock()
+
+class ProviderStore:
+    """Region x provider bitsets per title, persisted under PROVIDER_DIR"""
+
+    def __init__(self, root=PROVIDER_DIR):
+        self.root = root
+        self.tconst = np.empty(0, dtype=object)
+        self.fetched = np.empty(0, dtype=np.int64)
+        self.tmdb = {}
+        self.providers = {}
+        self.titles = {}
+        self.words = {}
+        self.version = 0
+        self._masks = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, root=PROVIDER_DIR):
+        store = cls(root)
+        try:
+            with open(os.path.join(root, 'providers.json')) as f:
+                meta = json.load(f)
+            arrays = np.load(os.path.join(root, 'providers.npz'))
+        except (FileNotFoundError, ValueError):
+            return store
+        store.tconst = np.array(meta['tconst'], dtype=object)
+        store.tmdb = meta['tmdb']
+        store.providers = meta['providers']
+        store.fetched = arrays['fetched']
+        for i, region in enumerate(store.providers):
+            store.titles[region] = arrays[f'titles_{i}']
+            store.words[region] = arrays[f'words_{i}']
+        store.version = meta.get('version', 0)
+        return store
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock:
+            arrays = {'fetched': self.fetched}
+            for i, region in enumerate(self.providers):
+                arrays[f'titles_{i}'] = self.titles[region]
+                arrays[f'words_{i}'] = self.words[region]
+            meta = {'tconst': self.tconst.tolist(), 'tmdb': self.tmdb, 'providers': self.providers, 'version': self.version}
+        write_atomic(os.path.join(self.root, 'providers.npz'), lambda f: np.savez(f, **arrays))
+        write_atomic(os.path.join(self.root, 'providers.json'), lambda f: json.dump(meta, f), 'w')
+
+    def __len__(self):
+        return len(self.tconst)
+
+    def regions(self):
+        return sorted(self.providers)
+
+    def region_providers(self, region):
+        return list(self.providers.get(region, []))
+
+    def title_index(self, tconsts):
+        return pd.Index(self.tconst).get_indexer(tconsts) if len(self.tconst) else np.full(len(tconsts), -1)
+
+    def update(self, payloads, tmdb_ids=None, fetched_at=None):
+        """Replace the availability of the titles in payloads ({tconst: watch/providers results})"""
+        fetched_at = int(fetched_at or time.time())
+        with self._lock:
+            tconsts = list(payloads)
+            index = self.title_index(tconsts)
+            new = [t for t, i in zip(tconsts, index) if i < 0]
+            if new:
+                self.tconst = np.concatenate([self.tconst, np.array(new, dtype=object)])
+                self.fetched = np.concatenate([self.fetched, np.zeros(len(new), dtype=np.int64)])
+                index = self.title_index(tconsts)
+            self.fetched[index] = fetched_at
+            self.tmdb.update(tmdb_ids or {})
+
+            # Per region: drop the updated titles, then merge their new bitsets
+            updated = np.sort(index)
+            entries = {}
+            for tconst, title in zip(tconsts, index):
+                for region, names in streaming_providers(payloads[tconst]).items():
+                    known = self.providers.setdefault(region, [])
+                    bits = 0
+                    for name in names:
+                        if name not in known:
+                            known.append(name)
+                        bits |= 1 << known.index(name)
+                    entries.setdefault(region, []).append((title, bits))
+            for region in set(self.titles) | set(entries):
+                width = max((len(self.providers[region]) + 63) // 64, 1)
+                titles = self.titles.get(region, np.empty(0, dtype=np.int32))
+                words = self.words.get(region, EMPTY_WORDS)
+                keep = ~np.isin(titles, updated)
+                titles, words = titles[keep], words[keep]
+                if words.shape[1] < width:
+                    words = np.pad(words, ((0, 0), (0, width - words.shape[1])))
+                added = entries.get(region, [])
+                added_titles = np.array([title for title, _ in added], dtype=np.int32)
+                added_words = np.array([[(bits >> (64 * w)) & (2 ** 64 - 1) for w in range(width)] for _, bits in added], dtype=np.uint64).reshape(len(added), width)
+                titles = np.concatenate([titles, added_titles])
+                order = np.argsort(titles, kind='stable')
+                self.titles[region] = titles[order]
+                self.words[region] = np.concatenate([words, added_words])[order]
+            self.version += 1
+
+    def providers_of(self, tconst, region):
+        """Provider names for one title in one region"""
+        title = self.title_index([tconst])[0]
+        titles = self.titles.get(region)
+        if title < 0 or titles is None:
+            return []
+        at = np.searchsorted(titles, title)
+        if at >= len(titles) or titles[at] != title:
+            return []
+        words = self.words[region][at]
+        return [name for bit, name in enumerate(self.providers[region]) if int(words[bit // 64]) >> (bit % 64) & 1]
+
+    def provider_words(self, region, names):
+        """uint64 words with the bits of the named providers set"""
+        known = self.providers.get(region, [])
+        words = np.zeros(max((len(known) + 63) // 64, 1), dtype=np.uint64)
+        for name in names:
+            if name in known:
+                bit = known.index(name)
+                words[bit // 64] |= np.uint64(1 << (bit % 64))
+        return words
+
+    def available(self, snapshot, region, providers=None, frame='movies'):
+        """Boolean mask over snapshot.<frame> rows streaming in region (on any of providers)"""
+        key = (frame, region, tuple(providers or ()), self.version)
+        masks = self._masks.setdefault(snapshot, {})
+        mask = masks.get(key)
+        if mask is not None:
+            return mask
+        with self._lock:
+            titles = self.titles.get(region, np.empty(0, dtype=np.int32))
+            words = self.words.get(region, EMPTY_WORDS)
+            if providers:
+                hit = (words & self.provider_words(region, providers)).any(axis=1)
+                titles = titles[hit]
+            present = np.zeros(len(self.tconst), dtype=bool)
+            present[titles] = True
+            rows = self.title_index(getattr(snapshot, frame)['tconst'].to_numpy())
+        mask = np.zeros(len(rows), dtype=bool)
+        mask[rows >= 0] = present[rows[rows >= 0]]
+        if len(masks) > 16:
+            masks.clear()
+        masks[key] = mask
+        return mask
+
+    def stale(self, snapshot, max_age=MAX_AGE, limit=None):
+        """Catalog titles never fetched or older than max_age, never-fetched most voted first"""
+        movies = snapshot.movies
+        index = self.title_index(movies['tconst'].to_numpy())
+        age = np.where(index >= 0, self.fetched[index] if len(self.fetched) else 0, 0)
+        due = np.flatnonzero(age <= time.time() - max_age)
+        order = np.lexsort((-movies['numVotes'].to_numpy()[due], age[due]))
+        return movies.iloc[due[order][:limit]]
+
+# The store at root, re-opened whenever a refresh (this or another process) saved it
+def current_store(root=PROVIDER_DIR):
+    try:
+        mtime = os.stat(os.path.join(root, 'providers.json')).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    with STORES_LOCK:
+        cached = STORES.get(root)
+        if cached is None or cached[0] != mtime:
+            cached = STORES[root] = (mtime, ProviderStore.open(root))
+    return cached[1]
+
+# TMDB [kind, id] for a catalog title, via find-by-IMDb-id
+def resolve_tmdb_id(movie):
+    data = tmdb_get(f"find/{movie['tconst']}", {"external_source": "imdb_id"}) or {}
+    preferred = 'tv' if movie.get('titleType') in TV_TYPES else 'movie'
+    for kind in (preferred, 'movie' if preferred == 'tv' else 'tv'):
+        results = data.get(f"{kind}_results")
+        if results:
+            return [kind, results[0]['id']]
+    return None
+
+# Watch/providers payload for one title; None when TMDB does not know it or the request failed
+def fetch_title_providers(movie, tmdb_id=None):
+    tmdb_id = tmdb_id or resolve_tmdb_id(movie)
+    if not tmdb_id:
+        return None, None
+    data = tmdb_get(f"{tmdb_id[0]}/{tmdb_id[1]}/watch/providers")
+    if data is None:
+        return tmdb_id, None
+    return tmdb_id, data.get('results', {})
+
+# Refresh the stalest titles in bulk and save; returns (refreshed, failed)
+def refresh_providers(store, snapshot, limit=REFRESH_BATCH, max_age=MAX_AGE, workers=REFRESH_WORKERS, ctx=None, progress=None, background=False):
+    titles = store.stale(snapshot, max_age, limit)
+
+    def initializer():
+        if ctx is not None:
+            from streamlit.runtime.scriptrunner import add_script_run_ctx
+            add_script_run_ctx(threading.current_thread(), ctx)
+        if background:
+            background_thread()
+
+    def fetch(movie):
+        try:
+            return movie['tconst'], fetch_title_providers(movie, store.tmdb.get(movie['tconst']))
+        except Exception:
+            return movie['tconst'], (None, None)
+
+    payloads, tmdb_ids, failed = {}, {}, 0
+    with ThreadPoolExecutor(max_workers=workers, initializer=initializer) as pool:
+        for done, (tconst, (tmdb_id, results)) in enumerate(pool.map(fetch, (movie for _, movie in titles.iterrows())), 1):
+            if results is None:
+                failed += 1
+            else:
+                payloads[tconst] = results
+                tmdb_ids[tconst] = tmdb_id
+            if progress and done % 200 == 0:
+                progress(f"{done}/{len(titles)} titles")
+    if payloads:
+        store.update(payloads, tmdb_ids)
+        store.save()
+    return len(payloads), failed
+
+# Background refresh every `hours` inside the server
+def start_refresh_schedule(get_snapshot, hours=REFRESH_HOURS, ctx=None, root=PROVIDER_DIR):
+    def loop():
+        while True:
+            try:
+                refresh_providers(current_store(root), get_snapshot(), ctx=ctx, background=True)
+            except Exception:
+                pass
+            time.sleep(hours * 3600)
+    thread = threading.Thread(target=loop, name='cinematch-providers', daemon=True)
+    thread.start()
+    return thread
+
+def main():
+    parser = argparse.ArgumentParser(description="CineMatch watch-provider store")
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--store', default=PROVIDER_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    refresh = sub.add_parser('refresh', help="re-fetch the stalest titles from TMDB")
+    refresh.add_argument('--limit', type=int, default=REFRESH_BATCH)
+    refresh.add_argument('--max-age-days', type=float, default=MAX_AGE / 86_400)
+    refresh.add_argument('--workers', type=int, default=REFRESH_WORKERS)
+    show = sub.add_parser('show', help="print where a title streams")
+    show.add_argument('tconst')
+    show.add_argument('--region')
+    args = parser.parse_args()
+
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    store = ProviderStore.open(args.store)
+    if args.command == 'refresh':
+        from catalog import load_data
+        started = time.perf_counter()
+        snapshot = load_data(args.data_dir, os.environ.get('CINEMATCH_SHARED_CATALOG'))
+        refreshed, failed = refresh_providers(store, snapshot, args.limit, args.max_age_days * 86_400, args.workers, progress=print)
+        print(f"Refreshed {refreshed:,} titles ({failed:,} not found or failed) in {time.perf_counter() - started:.1f}s; "
+              f"{len(store):,} titles across {len(store.regions())} regions in {args.store}")
+    else:
+        for region in [args.region] if args.region else store.regions():
+            print(f"{region}: {', '.join(store.providers_of(args.tconst, region)) or '-'}")
+
+if __name__ == '__main__':
+    main()
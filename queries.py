@@ -0,0 +1,173 @@
+"""
+🧭 Page Queries - mood buttons, widget defaults and the titles each page shows
+Shared by the app and by anything that needs to know what a page will show
+without rendering it (prefetching, cache warm-up).
+
+List pages and mood rows are cut from their best few hundred titles by a
+diversity re-rank (see diversity.py), so no one franchise, director or
+language fills a row.
+
+List queries are memoized across sessions as row-id arrays, keyed by the
+canonical filter values and a `scope` naming the rows they ran within (see
+list_scope). The cache is LRU-bounded by CINEMATCH_QUERY_CACHE_MB (default 64)
+and emptied when a newer catalog snapshot is queried.
+"""
+import os
+import threading
+import numpy as np
+from caches import BoundedCache
+from catalog import filter_rows
+from diversity import diverse_top_k
+from trending import trending_engine
+
+QUERY_CACHE_MB = float(os.environ.get('CINEMATCH_QUERY_CACHE_MB', '64'))
+
+MOODS = [
+    ("😊 Happy", ["Comedy", "Animation"]),
+    ("😢 Sad", ["Drama"]),
+    ("🎢 Thrilled", ["Action", "Thriller"]),
+    ("🤔 Thoughtful", ["Mystery", "Drama"]),
+    ("💪 Motivated", ["Biography", "Sport"]),
+    ("😌 Relaxed", ["Romance"]),
+    ("🤩 Excited", ["Adventure", "Fantasy"]),
+    ("🌟 Inspired", ["Documentary"]),
+]
+PAGES = ["🏠 Home", "🎬 Movies", "📺 TV Series", "🇮🇳 Indian", "📊 Analytics"]
+MOVIE_TYPES = ('movie', 'tvMovie')
+TV_TYPES = ('tvSeries', 'tvMiniSeries')
+TRENDING_TV_TYPES = ('tvSeries', 'tvMovie')
+# Initial widget values of the filter tabs
+MOVIE_DEFAULTS = {'rating': (7.0, 10.0), 'years': (2010, 2024), 'languages': ['English', 'Hindi']}
+TV_DEFAULTS = {'rating': (7.5, 10.0), 'years': (2010, 2024), 'languages': ['English']}
+INDIAN_DEFAULTS = {'rating': (6.0, 10.0), 'languages': ['Hindi']}
+
+class QueryCache:
+    """Cross-session cache of query results (row-id arrays) for the newest snapshot"""
+
+    def __init__(self, max_bytes=QUERY_CACHE_MB * 2 ** 20):
+        self.cache = BoundedCache('queries', max_bytes)
+        self.snapshot = None
+        self.lock = threading.Lock()
+
+    def get(self, catalog, key, compute):
+        """Cached result of compute() for key; older snapshots are computed but not cached"""
+        with self.lock:
+            if catalog is not self.snapshot:
+                if self.snapshot is not None and catalog.version < self.snapshot.version:
+                    return compute()
+                self.snapshot = catalog
+                self.cache.clear()
+        key = (catalog.version,) + key
+        result = self.cache.get(key)
+        if result is None:
+            result = compute()
+            self.cache.put(key, result, size=result.nbytes)
+        return result
+
+    def clear(self):
+        self.cache.clear()
+
+QUERY_CACHE = QueryCache()
+
+# Hashable, order-free form of a filter value: string lists become sorted tuples, ranges rounded tuples
+def canonical(value):
+    if isinstance(value, (list, tuple, set, np.ndarray)):
+        values = list(value)
+        if all(isinstance(v, str) for v in values):
+            return tuple(sorted(set(values)))
+        return tuple(round(float(v), 3) for v in values)
+    return value
+
+# Cache key of the rows a list page queries within: its title types (or frame), platforms and region filter
+def list_scope(types, platforms=(), region=None):
+    return (canonical(types), canonical(platforms or ()), region)
+
+# Row ids from the shared cache when the caller named its scope, else computed directly
+def cached_rows(catalog, scope, key, compute):
+    return compute() if scope is None else QUERY_CACHE.get(catalog, (scope,) + key, compute)
+
+# Top rated titles in any of a mood's genres
+def mood_titles(catalog, genres, k=20):
+    return catalog.rows(QUERY_CACHE.get(catalog, ('mood_titles', canonical(genres), k), lambda: diverse_top_k(catalog.movies, catalog.rows_with_genres(genres), k)))
+
+# Wider pool of a mood's titles that a session re-ranks for itself
+def mood_candidates(catalog, genres, k=300, platforms=None):
+    def compute():
+        rows = catalog.rows_with_genres(genres)
+        if platforms:
+            rows = catalog.on_platforms(rows, platforms)
+        return catalog.top_k(rows, k=k)
+    return QUERY_CACHE.get(catalog, ('mood', canonical(genres), k, canonical(platforms or ())), compute)
+
+# Home trending rows: decayed recent interactions (optionally blended with TMDB's
+# daily list), topped up with the most voted titles while the log is thin
+def trending_rows(catalog, types=None, boost=None, k=5):
+    rows = trending_engine(catalog).top(k, types=types, boost=boost)
+    if len(rows) < k:
+        within = catalog.rows_of_type(*types) if types else None
+        voted = catalog.top_k(within, k=2 * k, by='numVotes')
+        rows = np.concatenate([rows, voted[~np.isin(voted, rows)][:k - len(rows)]])
+    return rows
+
+def trending_titles(catalog, boost=None):
+    return catalog.rows(trending_rows(catalog, boost=boost))
+
+def trending_tv_titles(catalog, boost=None):
+    return catalog.rows(trending_rows(catalog, TRENDING_TV_TYPES, boost))
+
+# Top Rated tab: rating, year and language filters within a type
+def top_rated_rows(catalog, rows, rating, years, languages, k=20, scope=None):
+    key = ('top_rated', canonical(rating), canonical(years), canonical(languages), k)
+    return cached_rows(catalog, scope, key, lambda: diverse_top_k(catalog.movies, catalog.filter_rows(rows, rating=rating, years=years, languages=languages), k))
+
+def top_rated_titles(catalog, rows, rating, years, languages, k=20, scope=None):
+    return catalog.rows(top_rated_rows(catalog, rows, rating, years, languages, k, scope))
+
+# By Genre / By Language tabs
+def genre_rows(catalog, rows, genre, k=20, scope=None):
+    return cached_rows(catalog, scope, ('genre', genre, k), lambda: diverse_top_k(catalog.movies, catalog.rows_with_genres([genre], within=rows), k))
+
+def genre_titles(catalog, rows, genre, k=20, scope=None):
+    return catalog.rows(genre_rows(catalog, rows, genre, k, scope))
+
+def language_rows(catalog, rows, language, k=20, scope=None):
+    return cached_rows(catalog, scope, ('language', language, k), lambda: diverse_top_k(catalog.movies, catalog.rows_in_language(language, within=rows), k))
+
+def language_titles(catalog, rows, language, k=20, scope=None):
+    return catalog.rows(language_rows(catalog, rows, language, k, scope))
+
+# Indian page, queried on its own catalog (rows are positions in indian_movies)
+def indian_titles(catalog, rating, languages, rows=None, scope=None):
+    indian = catalog.indian_movies
+    key = ('indian', canonical(rating), canonical(languages))
+    return indian.iloc[cached_rows(catalog, scope, key, lambda: diverse_top_k(indian, filter_rows(indian, rows, rating=rating, languages=languages)))]
+
+# Options of the genre/language select boxes; the first one is the default
+def genre_options(catalog, rows, scope=None):
+    return list(cached_rows(catalog, scope, ('genre_options',), lambda: np.array(catalog.genres_within(rows), dtype=object)))
+
+def language_options(catalog, rows, scope=None):
+    return list(cached_rows(catalog, scope, ('language_options',), lambda: np.array(sorted(catalog.rows(rows)['language'].unique()), dtype=object)))
+
+# Every result set a page shows before any widget is touched, keyed by (page, view)
+def default_result_sets(catalog):
+    movie_rows = catalog.rows_of_type(*MOVIE_TYPES)
+    tv_rows = catalog.rows_of_type(*TV_TYPES)
+    # Same scopes as the unfiltered pages, so warming also fills the query cache
+    sets = {
+        ("🏠 Home", 'trending'): trending_titles(catalog),
+        ("🏠 Home", 'trending_tv'): trending_tv_titles(catalog),
+    }
+    for i, (_, genres) in enumerate(MOODS):
+        sets[("🏠 Home", f"mood_{i}")] = mood_titles(catalog, genres)
+    for page, types, rows, defaults in (("🎬 Movies", MOVIE_TYPES, movie_rows, MOVIE_DEFAULTS), ("📺 TV Series", TV_TYPES, tv_rows, TV_DEFAULTS)):
+        scope = list_scope(types)
+        sets[(page, 'top_rated')] = top_rated_titles(catalog, rows, **defaults, scope=scope)
+        genres = genre_options(catalog, rows, scope)
+        if len(genres):
+            sets[(page, 'by_genre')] = genre_titles(catalog, rows, genres[0], scope=scope)
+        languages = language_options(catalog, rows, scope)
+        if languages:
+            sets[(page, 'by_language')] = language_titles(catalog, rows, languages[0], scope=scope)
+    sets[("🇮🇳 Indian", 'top_rated')] = indian_titles(catalog, **INDIAN_DEFAULTS, scope=list_scope(('indian_movies',)))
+    return sets
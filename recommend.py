@@ -0,0 +1,233 @@
+"""
+🧠 Recommend - per-session recommendation state and the interaction event log
+Each session keeps the titles it has seen, the ones it clicked and a running
+profile over genre/language/type features. A click is a cheap vector update;
+re-ranking scores only the current candidate list (a few hundred titles) and
+takes the top k, so nothing is recomputed from scratch.
+
+Impressions and clicks are appended to data/events/YYYY-MM-DD.csv; export
+them as user_interactions.csv rows for training or as a catalog delta:
+
+    python recommend.py export-events --output data/deltas/$(date +%s).interactions.csv
+"""
+import os
+import csv
+import glob
+import time
+import hashlib
+import random
+import argparse
+import threading
+import weakref
+import numpy as np
+import pandas as pd
+from catalog import union_rows
+
+EVENTS_DIR = os.path.join('data', 'events')
+EVENT_FIELDS = ['user_id', 'tconst', 'event', 'timestamp']
+# Implicit rating given to a click when events are exported as interactions
+CLICK_RATING = 8
+# Candidates re-ranked per list, and how many are shown
+CANDIDATES = 300
+SHOWN = 20
+# Old clicks fade by this factor on every new click
+PROFILE_DECAY = 0.8
+# Score = rating/10 + PROFILE_WEIGHT * similarity - SEEN_PENALTY for titles seen but never clicked
+PROFILE_WEIGHT = 0.6
+SEEN_PENALTY = 0.15
+# Anonymous sessions get ids above every id in user_interactions.csv
+SESSION_USER_BASE = 1_000_000_000
+# Feature spaces per snapshot, dropped with the snapshot
+FEATURES = weakref.WeakKeyDictionary()
+
+class ItemFeatures:
+    """Compact per-title genre bits and language/type codes for one snapshot"""
+
+    def __init__(self, snapshot):
+        n = len(snapshot.movies)
+        self.genres = sorted(snapshot.genre_index)[:64]
+        self.languages = sorted(snapshot.language_index)
+        self.types = sorted(snapshot.type_index)
+        self.names = [f"genre:{g}" for g in self.genres] + [f"language:{l}" for l in self.languages] + [f"type:{t}" for t in self.types]
+        self.genre_bits = np.zeros(n, dtype=np.uint64)
+        for bit, genre in enumerate(self.genres):
+            self.genre_bits[snapshot.genre_index[genre]] |= np.uint64(1 << bit)
+        self.language_codes = np.full(n, -1, dtype=np.int32)
+        for code, language in enumerate(self.languages):
+            self.language_codes[snapshot.language_index[language]] = code
+        self.type_codes = np.full(n, -1, dtype=np.int32)
+        for code, title_type in enumerate(self.types):
+            self.type_codes[snapshot.type_index[title_type]] = code
+        self.rating = snapshot.movies['averageRating'].to_numpy(dtype=np.float32, na_value=0) / 10
+        self.tconst = snapshot.movies['tconst'].to_numpy()
+
+    def vectors(self, rows):
+        """Unit-length feature vectors for the given positions, one row each"""
+        rows = np.asarray(rows, dtype=np.int64)
+        genres = ((self.genre_bits[rows, None] >> np.arange(len(self.genres), dtype=np.uint64)) & np.uint64(1)).astype(np.float32)
+        languages = np.zeros((len(rows), len(self.languages)), dtype=np.float32)
+        types = np.zeros((len(rows), len(self.types)), dtype=np.float32)
+        known = self.language_codes[rows] >= 0
+        languages[np.flatnonzero(known), self.language_codes[rows][known]] = 1
+        known = self.type_codes[rows] >= 0
+        types[np.flatnonzero(known), self.type_codes[rows][known]] = 1
+        matrix = np.hstack([genres, languages, types])
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def weights(self, profile):
+        """A {feature name: weight} profile as a vector in this feature space"""
+        vector = np.array([profile.get(name, 0.0) for name in self.names], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def item_profile(self, row):
+        """Feature names of one title, for profile updates"""
+        return [name for name, value in zip(self.names, self.vectors([row])[0]) if value]
+
+# Feature space for a snapshot, built on first use
+def item_features(snapshot):
+    features = FEATURES.get(snapshot)
+    if features is None:
+        features = FEATURES[snapshot] = ItemFeatures(snapshot)
+    return features
+
+class EventLog:
+    """Append-only CSV of impressions and clicks, one file per UTC day"""
+
+    def __init__(self, directory=EVENTS_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+
+    def append(self, user_id, tconsts, event):
+        now = int(time.time())
+        path = os.path.join(self.directory, time.strftime('%Y-%m-%d', time.gmtime(now)) + '.csv')
+        try:
+            with self.lock:
+                os.makedirs(self.directory, exist_ok=True)
+                new = not os.path.exists(path)
+                with open(path, 'a', newline='') as f:
+                    writer = csv.writer(f)
+                    if new:
+                        writer.writerow(EVENT_FIELDS)
+                    writer.writerows((user_id, tconst, event, now) for tconst in tconsts)
+        except OSError:
+            pass
+
+class SessionRecommender:
+    """Seen set, clicks and profile for one session, with cached rankings per list"""
+
+    def __init__(self, user_id=None):
+        self.user_id = user_id or SESSION_USER_BASE + random.randrange(1_000_000_000)
+        self.seen = set()
+        self.clicked = []
+        self.profile = {}
+        self.version = 0
+        self.rankings = {}
+
+    def seed(self, snapshot, min_rating=7, history=None):
+        """Start the profile from a known user's well-rated titles in the interaction log"""
+        if history is None:
+            history = snapshot.interactions.user_history(self.user_id, min_rating)
+        else:
+            history = history[history['rating'] >= min_rating]
+        rows = pd.Index(snapshot.movies['tconst']).get_indexer(history['tconst'].unique())
+        features = item_features(snapshot)
+        for row in rows[rows >= 0][-50:]:
+            self.update_profile(features.item_profile(row))
+        return self
+
+    def update_profile(self, names):
+        self.profile = {name: weight * PROFILE_DECAY for name, weight in self.profile.items()}
+        for name in names:
+            self.profile[name] = self.profile.get(name, 0.0) + 1.0
+
+    def observe(self, tconsts, log=None):
+        """Mark titles as seen; only first impressions are logged"""
+        new = [t for t in tconsts if t not in self.seen]
+        self.seen.update(new)
+        if log and new:
+            log.append(self.user_id, new, 'impression')
+
+    def click(self, snapshot, tconst, log=None):
+        """Fold a clicked title into the profile; rankings are refreshed lazily"""
+        row = pd.Index(snapshot.movies['tconst']).get_indexer([tconst])[0]
+        if row < 0:
+            return
+        self.clicked.append(tconst)
+        self.update_profile(item_features(snapshot).item_profile(row))
+        self.version += 1
+        if log:
+            log.append(self.user_id, [tconst], 'click')
+
+    def rank(self, snapshot, context, candidates, k=SHOWN):
+        """Top k of `candidates` (positions) for this session, re-ranked only after new clicks"""
+        candidates = np.asarray(candidates, dtype=np.int64)
+        # The same list can get other candidates (a new mood or platform filter)
+        key = (id(snapshot), snapshot.version, hashlib.blake2b(candidates.tobytes(), digest_size=16).digest(), k)
+        cached = self.rankings.get(context)
+        if cached and cached[0] == key and cached[1] == self.version:
+            return cached[2]
+        features = item_features(snapshot)
+        scores = features.rating[candidates].copy()
+        if self.profile:
+            scores += PROFILE_WEIGHT * (features.vectors(candidates) @ features.weights(self.profile))
+        if self.seen:
+            clicked = set(self.clicked)
+            stale = np.array([t in self.seen and t not in clicked for t in features.tconst[candidates]], dtype=bool)
+            scores -= SEEN_PENALTY * stale
+        k = min(k, len(candidates))
+        best = np.argpartition(-scores, k - 1)[:k] if k else np.empty(0, dtype=np.int64)
+        ranked = candidates[best[np.argsort(-scores[best], kind='stable')]]
+        self.rankings[context] = (key, self.version, ranked)
+        return ranked
+
+# Candidate pool for a profile: the best rated titles sharing any of its strongest genres
+def profile_candidates(snapshot, profile, genres=3, k=CANDIDATES):
+    strongest = sorted((name for name in profile if name.startswith('genre:')), key=profile.get, reverse=True)[:genres]
+    return snapshot.top_k(union_rows(snapshot.genre_index, [name[len('genre:'):] for name in strongest]), k=k)
+
+# "More like this" for one title outside any session; None for an unknown tconst
+def similar_titles(snapshot, tconst, k=SHOWN):
+    row = pd.Index(snapshot.movies['tconst']).get_indexer([tconst])[0]
+    if row < 0:
+        return None
+    recommender = SessionRecommender()
+    recommender.update_profile(item_features(snapshot).item_profile(row))
+    candidates = profile_candidates(snapshot, recommender.profile, genres=len(recommender.profile))
+    return recommender.rank(snapshot, 'similar', candidates[candidates != row], k)
+
+# Recommendations for a user in the interaction log (or with the given history), excluding titles they already rated; None for an unknown user
+def user_recommendations(snapshot, user_id, k=SHOWN, history=None):
+    if history is None:
+        history = snapshot.interactions.user_history(user_id)
+    if history.empty:
+        return None
+    recommender = SessionRecommender(user_id).seed(snapshot, history=history)
+    candidates = profile_candidates(snapshot, recommender.profile)
+    rated = pd.Index(snapshot.movies['tconst']).get_indexer(history['tconst'].unique())
+    return recommender.rank(snapshot, 'user', candidates[~np.isin(candidates, rated)], k)
+
+# Event files as user_interactions.csv rows (clicks only, implicit rating)
+def events_to_interactions(directory=EVENTS_DIR):
+    files = sorted(glob.glob(os.path.join(directory, '*.csv')))
+    if not files:
+        return pd.DataFrame(columns=['user_id', 'tconst', 'rating', 'timestamp'])
+    events = pd.concat([pd.read_csv(path) for path in files], ignore_index=True)
+    clicks = events[events['event'] == 'click'].drop_duplicates(['user_id', 'tconst'], keep='last')
+    return clicks.assign(rating=CLICK_RATING)[['user_id', 'tconst', 'rating', 'timestamp']].reset_index(drop=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="CineMatch session events")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export-events', help="write clicks as user_interactions.csv rows")
+    export.add_argument('--events-dir', default=EVENTS_DIR)
+    export.add_argument('--output', required=True)
+    args = parser.parse_args()
+
+    interactions = events_to_interactions(args.events_dir)
+    interactions.to_csv(args.output, index=False)
+    print(f"Wrote {len(interactions):,} interactions from {interactions['user_id'].nunique():,} users to {args.output}")
+
+if __name__ == '__main__':
+    main()
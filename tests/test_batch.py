@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+import batch
+from batch import PROFILE_WEIGHT, merge_above, merge_top_k, score_shard
+
+# Unit rows of non-negative random features, like ItemFeatures.vectors
+def unit_rows(rng, count, dims):
+    rows = rng.random((count, dims)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+# Inputs of an export with titles in rating order, loaded where score_shard looks for them
+@pytest.fixture
+def worker(monkeypatch):
+    def build(titles=300, users=40, dims=12, k=10, seed=0):
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(titles).astype(np.int32)
+        positions = np.empty_like(order)
+        positions[order] = np.arange(titles, dtype=np.int32)
+        rated = [np.sort(rng.choice(titles, size=rng.integers(0, min(30, titles)), replace=False)) for _ in range(users)]
+        inputs = {
+            'items': unit_rows(rng, titles, dims),
+            'ratings': np.sort(rng.random(titles).astype(np.float32))[::-1].copy(),
+            'order': order,
+            'positions': positions,
+            'profiles': unit_rows(rng, users, dims),
+            'rated_indptr': np.r_[0, np.cumsum([len(r) for r in rated])].astype(np.int64),
+            'rated_rows': np.concatenate(rated).astype(np.int32),
+            'user_ids': np.full((users, k), -1, dtype=np.int32),
+            'user_scores': np.full((users, k), np.nan, dtype=np.float16),
+            'similar_ids': np.full((titles, k), -1, dtype=np.int32),
+            'similar_scores': np.full((titles, k), np.nan, dtype=np.float16),
+        }
+        monkeypatch.setattr(batch, 'WORKER', inputs)
+        return inputs
+    return build
+
+# Full score matrix in rating-order slots, excluded pairs at -inf
+def brute_force(inputs, kind):
+    items, ratings = inputs['items'], inputs['ratings']
+    if kind == 'users':
+        scores = ratings + PROFILE_WEIGHT * (inputs['profiles'] @ items.T)
+        indptr = inputs['rated_indptr']
+        for user in range(len(scores)):
+            scores[user, inputs['rated_rows'][indptr[user]:indptr[user + 1]]] = -np.inf
+    else:
+        own = inputs['positions']
+        scores = ratings + PROFILE_WEIGHT * (items[own] @ items.T)
+        scores[np.arange(len(own)), own] = -np.inf
+    return scores
+
+# Catalog positions of each row's k best scores, -1 where fewer than k are finite
+def expected_ids(inputs, scores, k):
+    best = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+    ids = inputs['order'][best]
+    return np.where(np.isfinite(np.take_along_axis(scores, best, axis=1)), ids, -1)
+
+@pytest.mark.parametrize('kind', ['users', 'similar'])
+@pytest.mark.parametrize('block', [7, 64, 1000])
+def test_score_shard_matches_brute_force(worker, kind, block):
+    inputs = worker(k=10)
+    rows = len(inputs['profiles'] if kind == 'users' else inputs['items'])
+    scores = brute_force(inputs, kind)
+    for start in range(0, rows, 16):
+        assert score_shard(kind, start, min(start + 16, rows), 10, block) == min(start + 16, rows) - start
+    prefix = 'user' if kind == 'users' else 'similar'
+    np.testing.assert_array_equal(inputs[f'{prefix}_ids'], expected_ids(inputs, scores, 10))
+    best = np.sort(scores, axis=1)[:, ::-1][:, :10]
+    np.testing.assert_allclose(inputs[f'{prefix}_scores'].astype(np.float32), best.astype(np.float16).astype(np.float32), rtol=1e-3)
+
+def test_score_shard_stops_before_titles_that_cannot_enter(worker):
+    inputs = worker(titles=200, k=5)
+    inputs['ratings'][100:] = -10.0
+    expected = expected_ids(inputs, brute_force(inputs, 'users'), 5)
+    # No title of the second block can enter a list; if it were scored anyway,
+    # its oversized vectors would beat every title and change the lists
+    inputs['items'][100:] *= 1e4
+    score_shard('users', 0, len(inputs['profiles']), 5, block=100)
+    np.testing.assert_array_equal(inputs['user_ids'], expected)
+
+def test_short_lists_are_padded(worker):
+    inputs = worker(titles=6, users=4, k=10)
+    score_shard('users', 0, 4, 10, block=4)
+    score_shard('similar', 0, 6, 10, block=4)
+    indptr = inputs['rated_indptr']
+    for user in range(4):
+        unrated = 6 - (indptr[user + 1] - indptr[user])
+        assert (inputs['user_ids'][user] >= 0).sum() == unrated
+        assert np.isnan(inputs['user_scores'][user, unrated:].astype(np.float32)).all()
+    assert ((inputs['similar_ids'] >= 0).sum(axis=1) == 5).all()
+    assert all(position not in row for position, row in enumerate(inputs['similar_ids']))
+
+def test_merge_above_matches_full_merge():
+    rng = np.random.default_rng(1)
+    k, count, width, first = 8, 30, 50, 1000
+    best_scores = -np.sort(-rng.random((count, k)).astype(np.float32), axis=1)
+    best_ids = rng.integers(0, first, (count, k)).astype(np.int32)
+    scores = rng.random((count, width)).astype(np.float32)
+    scores[rng.random((count, width)) < 0.2] = -np.inf
+    merged_scores, merged_ids = merge_above(best_scores, best_ids, scores, first, k)
+    ids = np.broadcast_to(np.arange(first, first + width, dtype=np.int32), scores.shape)
+    expected_scores, expected_ids = merge_top_k(best_scores, best_ids, scores, ids, k)
+    np.testing.assert_array_equal(merged_scores, expected_scores)
+    np.testing.assert_array_equal(merged_ids, expected_ids)
+
+def test_merge_above_without_better_scores_is_unchanged():
+    best_scores = np.array([[0.9, 0.8], [0.7, 0.6]], dtype=np.float32)
+    best_ids = np.array([[1, 2], [3, 4]], dtype=np.int32)
+    scores = np.array([[0.5, -np.inf], [0.6, 0.1]], dtype=np.float32)
+    merged_scores, merged_ids = merge_above(best_scores, best_ids, scores, 10, 2)
+    np.testing.assert_array_equal(merged_scores, best_scores)
+    np.testing.assert_array_equal(merged_ids, best_ids)
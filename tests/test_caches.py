@@ -0,0 +1,65 @@
+import random
+
+from caches import ENTRY_OVERHEAD, BoundedCache
+
+# Plain LFU: evict the fewest hits, the longest untouched first among equals
+class ReferenceLFU:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = {}
+        self.clock = 0
+        self.evictions = 0
+
+    def get(self, key):
+        if key in self.entries:
+            self.clock += 1
+            size, hits, _ = self.entries[key]
+            self.entries[key] = (size, hits + 1, self.clock)
+
+    def put(self, key, size):
+        self.entries.pop(key, None)
+        size += ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        while sum(entry[0] for entry in self.entries.values()) + size > self.max_bytes:
+            victim = min(self.entries, key=lambda k: self.entries[k][1:])
+            del self.entries[victim]
+            self.evictions += 1
+        self.clock += 1
+        self.entries[key] = (size, 0, self.clock)
+
+def test_lfu_new_entries_evict_the_least_used_one():
+    cache = BoundedCache('test-lfu-new', 2 * (100 + ENTRY_OVERHEAD), 'lfu')
+    for key in 'ab':
+        cache.put(key, None, size=100)
+        cache.get(key)
+    for key in 'cdef':
+        cache.put(key, None, size=100)
+    # c evicts a (read once, before b); each later key replaces the previous, unread one
+    assert sorted(cache.entries) == ['b', 'f']
+    assert cache.stats['evictions'] == 4
+
+def test_lfu_matches_reference_model():
+    rng = random.Random(0)
+    cache = BoundedCache('test-lfu-model', 20_000, 'lfu')
+    model = ReferenceLFU(20_000)
+    for step in range(5000):
+        key = rng.randrange(60)
+        if rng.random() < 0.6:
+            cache.get(key)
+            model.get(key)
+        else:
+            size = rng.randrange(100, 3000)
+            cache.put(key, None, size=size)
+            model.put(key, size)
+        assert sorted(cache.entries) == sorted(model.entries), step
+    assert cache.stats['evictions'] == model.evictions
+    assert cache.bytes == sum(entry[0] for entry in model.entries.values()) <= cache.max_bytes
+
+def test_lru_evicts_least_recently_used():
+    cache = BoundedCache('test-lru', 3 * (100 + ENTRY_OVERHEAD), 'lru')
+    for key in 'abc':
+        cache.put(key, None, size=100)
+    cache.get('a')
+    cache.put('d', None, size=100)
+    assert sorted(cache.entries) == ['a', 'c', 'd']
@@ -0,0 +1,135 @@
+import os
+import glob
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import catalog
+from catalog import CatalogSnapshot, CatalogStore, assign_plot_templates, build_index, update_counts, update_index, upsert_rows
+from interactions import InteractionStore
+
+def movies():
+    frame = pd.DataFrame({
+        'tconst': ['tt1', 'tt2', 'tt3'],
+        'primaryTitle': ['Heat', 'Alien', 'Up'],
+        'startYear': [1995, 1979, 2009],
+        'genres': ['Action,Crime', 'Horror,Sci-Fi', 'Animation'],
+        'averageRating': [8.3, 8.5, 8.3],
+        'numVotes': [700_000, 950_000, 1_100_000],
+        'language': ['English', 'English', 'English'],
+    })
+    return frame.assign(plot_template=assign_plot_templates(frame))
+
+def test_update_index_moves_changed_rows_only():
+    index = build_index(pd.Series(['Action,Crime', 'Horror,Sci-Fi', 'Animation']), multi=True)
+    updated = update_index(index, [1, 3], ['Horror,Sci-Fi', None], ['Horror,Thriller', 'Crime'], multi=True)
+    assert {key: rows.tolist() for key, rows in updated.items()} == {
+        'Action': [0], 'Crime': [0, 3], 'Horror': [1], 'Thriller': [1], 'Animation': [2],
+    }
+    assert 'Sci-Fi' in index
+    assert updated['Action'] is index['Action']
+
+def test_update_counts_matches_recount():
+    old = pd.Series(['English', 'Hindi', 'English', 'Tamil'])
+    new = pd.Series(['English', 'Hindi', 'Hindi', 'Korean'])
+    counts = update_counts(old.value_counts(), old[2:], new[2:])
+    assert counts.to_dict() == new.value_counts().to_dict()
+    assert 'Tamil' not in counts
+
+def test_upsert_keeps_dtypes():
+    frame = movies()
+    delta = pd.DataFrame({'tconst': ['tt2', 'tt9'], 'numVotes': [960_000, 12], 'startYear': [1979, 2024], 'genres': ['Horror', 'Drama']})
+    delta = delta.assign(plot_template=assign_plot_templates(delta))
+    updated, touched, replaced = upsert_rows(frame, delta)
+    assert updated.dtypes.to_dict() == frame.dtypes.to_dict()
+    assert touched.tolist() == [1, 3]
+    assert replaced['numVotes'].tolist() == [950_000]
+    assert updated['numVotes'].tolist() == [700_000, 960_000, 1_100_000, 12]
+    assert updated['plot_template'].tolist() == ['Action', 'Horror', 'Animation', 'Drama']
+    assert frame['numVotes'].tolist() == [700_000, 950_000, 1_100_000]
+
+def test_blank_cells_keep_old_values():
+    frame = movies()
+    delta = pd.DataFrame({'tconst': ['tt1', 'tt3'], 'numVotes': [np.nan, 1_200_000.0], 'averageRating': [8.4, np.nan]})
+    updated, touched, _ = upsert_rows(frame, delta)
+    assert updated['numVotes'].dtype == np.int64
+    assert updated['numVotes'].tolist() == [700_000, 950_000, 1_200_000]
+    assert updated['averageRating'].tolist() == [8.4, 8.5, 8.3]
+    assert touched.tolist() == [0, 2]
+
+def test_new_rows_missing_integer_fields_are_dropped():
+    frame = movies()
+    delta = pd.DataFrame({'tconst': ['tt8', 'tt9', np.nan], 'numVotes': [np.nan, 40.0, 5.0], 'startYear': [2020, 2021, 2022]})
+    updated, touched, _ = upsert_rows(frame, delta)
+    assert updated['tconst'].tolist() == ['tt1', 'tt2', 'tt3', 'tt9']
+    assert updated['numVotes'].dtype == np.int64
+    assert touched.tolist() == [3]
+
+def test_categorical_columns_gain_new_values():
+    # Text columns mapped from a shared export are categorical
+    frame = movies().astype({'language': 'category', 'genres': 'category'})
+    delta = pd.DataFrame({
+        'tconst': ['tt1', 'tt9'], 'startYear': [1995, 2024], 'numVotes': [700_000, 10],
+        'language': ['Korean', 'Tamil'], 'genres': ['Crime,Western,Musical', 'Drama'],
+    })
+    updated, _, _ = upsert_rows(frame, delta)
+    assert isinstance(updated['language'].dtype, pd.CategoricalDtype)
+    assert updated['language'].tolist() == ['Korean', 'English', 'English', 'Tamil']
+    assert updated['genres'].tolist() == ['Crime,Western,Musical', 'Horror,Sci-Fi', 'Animation', 'Drama']
+    assert frame['language'].cat.categories.tolist() == ['English']
+
+# A snapshot of movies(), with Up listed on Netflix and an Indian view holding nothing yet
+@pytest.fixture
+def snapshot(tmp_path):
+    frame = movies().assign(titleType='movie')
+    streaming = pd.DataFrame({'tconst': ['tt3'], 'netflix': [1], 'prime_video': [0], 'disney_plus': [0]})
+    interactions = InteractionStore.open(str(tmp_path / 'interactions'))
+    return CatalogSnapshot.build(frame, streaming, interactions, frame.iloc[:0])
+
+def test_apply_without_genres_or_language(snapshot):
+    updated = snapshot.apply(movies=pd.DataFrame({'tconst': ['tt2'], 'averageRating': [8.6]}))
+    assert updated.movies['averageRating'].tolist() == [8.3, 8.6, 8.3]
+    assert updated.movies['plot_template'].tolist() == ['Action', 'Horror', 'Animation']
+    assert updated.stats['rating_counts'].to_dict() == {8.3: 2, 8.6: 1}
+    assert len(updated.indian_movies) == 0
+
+def test_apply_retemplates_changed_genres_only(snapshot):
+    delta = pd.DataFrame({
+        'tconst': ['tt1', 'tt2', 'tt9'], 'genres': [np.nan, 'Drama', 'Comedy'],
+        'startYear': [np.nan, np.nan, 2024], 'numVotes': [np.nan, np.nan, 10], 'language': [np.nan, np.nan, 'Hindi'],
+    })
+    updated = snapshot.apply(movies=delta)
+    # A blank genres cell keeps both the old genres and their template
+    assert updated.movies['genres'].tolist() == ['Action,Crime', 'Drama', 'Animation', 'Comedy']
+    assert updated.movies['plot_template'].tolist() == ['Action', 'Drama', 'Animation', 'Comedy']
+    assert updated.genre_index['Drama'].tolist() == [1]
+    assert updated.indian_movies['tconst'].tolist() == ['tt9']
+    assert updated.indian_movies['plot_template'].tolist() == ['Comedy']
+
+def test_failed_delta_does_not_block_later_ones(snapshot, tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog, 'load_data', lambda data_dir, shared_dir: snapshot)
+    deltas = tmp_path / 'deltas'
+    deltas.mkdir()
+    (deltas / '1.movies.csv').write_text('tconst,averageRating\ntt1,not a number\n')
+    (deltas / '2.movies.csv').write_text('tconst,averageRating\ntt2,9.0\n')
+    store = CatalogStore(str(tmp_path), delta_dir=str(deltas))
+    assert store.refresh().movies['averageRating'].tolist() == [8.3, 9.0, 8.3]
+    assert list(store.failed) == [str(deltas / '1.movies.csv')]
+    # Skipped until the file changes, then applied
+    assert store.refresh().version == 1
+    (deltas / '1.movies.csv').write_text('tconst,averageRating\ntt1,8.4\n')
+    assert store.refresh().movies['averageRating'].tolist() == [8.4, 9.0, 8.3]
+    assert store.failed == {}
+
+def test_export_shared_swaps_versions_atomically(snapshot, tmp_path):
+    shared = str(tmp_path / 'shared')
+    catalog.export_shared(snapshot, shared)
+    first = os.path.realpath(shared)
+    catalog.export_shared(snapshot.apply(movies=pd.DataFrame({'tconst': ['tt1'], 'averageRating': [9.9]})), shared)
+    catalog.export_shared(snapshot, shared)
+    # shared is a symlink to the newest version; only it and the one before remain
+    assert os.path.islink(shared)
+    assert not os.path.exists(first)
+    assert len(glob.glob(f'{shared}.v*')) == 2
+    assert catalog.open_shared(shared).movies['averageRating'].tolist() == [8.3, 8.5, 8.3]
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import diversity
+from diversity import CAPS, RELAX_ORDER, attribute_codes, diversify
+
+# Greedy scan one candidate at a time, relaxing caps in RELAX_ORDER
+def reference(frame, rows, k, collections):
+    names, codes = attribute_codes(frame, rows, collections)
+    shares = {name: max(1, int(cap * k)) if cap < 1 else int(cap) for name, cap in CAPS.items()}
+    limits = [shares.get(name, len(rows)) for name in names]
+    counts = [{} for _ in names]
+    chosen, left = [], list(range(len(rows)))
+    for relaxed in range(len(RELAX_ORDER) + 1):
+        capped = [i for i, name in enumerate(names) if name not in RELAX_ORDER[:relaxed]]
+        skipped = []
+        for position in left:
+            if len(chosen) == k:
+                break
+            values = codes[:, position]
+            if any(values[i] >= 0 and counts[i].get(values[i], 0) >= limits[i] for i in capped):
+                skipped.append(position)
+                continue
+            chosen.append(position)
+            for i, value in enumerate(values):
+                if value >= 0:
+                    counts[i][value] = counts[i].get(value, 0) + 1
+        left = skipped
+        if len(chosen) == k or not left:
+            break
+    return np.asarray(rows)[sorted(chosen)]
+
+def catalog(languages, directors=None, titles=None):
+    n = len(languages)
+    return pd.DataFrame({
+        'tconst': [f"tt{i:07d}" for i in range(n)],
+        'primaryTitle': titles or [f"Title {i}" for i in range(n)],
+        'startYear': [2000 + i for i in range(n)],
+        'director': directors or [f"nm{i:07d}" for i in range(n)],
+        'language': languages,
+    })
+
+def test_relaxed_picks_keep_rank_order():
+    frame = catalog(['A', 'A', 'A', 'B'])
+    assert diversify(frame, np.arange(4), k=4, collections={}).tolist() == [0, 1, 2, 3]
+
+def test_caps_skip_lower_ranked_repeats():
+    frame = catalog(['en', 'en', 'en', 'fr', 'hi', 'en'], directors=['d1', 'd1', 'd1', 'd2', 'd3', 'd4'])
+    # director d1 is capped at 2, English at half of 4
+    assert diversify(frame, np.arange(6), k=4, collections={}).tolist() == [0, 1, 3, 4]
+
+def test_duplicates_and_collections():
+    frame = catalog(['en', 'en', 'en', 'fr', 'de', 'ja'], titles=['Heat', 'HEAT!', 'Alien', 'Aliens', 'Alien 3', 'Ran'])
+    frame['startYear'] = [1995, 1995, 1979, 1986, 1992, 1985]
+    collections = {'tt0000002': '1', 'tt0000003': '1', 'tt0000004': '1'}
+    # "HEAT!" repeats "Heat" (1995); a third Alien film is over the collection cap
+    assert diversify(frame, np.arange(6), k=4, collections=collections).tolist() == [0, 2, 3, 5]
+
+def test_disabled_is_plain_prefix(monkeypatch):
+    monkeypatch.setattr(diversity, 'ENABLED', False)
+    frame = catalog(['A'] * 5)
+    assert diversify(frame, [4, 3, 2, 1, 0], k=3).tolist() == [4, 3, 2]
+
+@pytest.mark.parametrize('seed', range(200))
+def test_matches_per_step_reference(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(2, 80))
+    frame = pd.DataFrame({
+        'tconst': [f"tt{i:07d}" for i in range(n)],
+        'primaryTitle': rng.choice(['Heat', 'heat', 'Alien', 'Up', 'Big', 'Her', 'Ran', 'Jaws'], n),
+        'startYear': rng.choice([1995, 1996], n),
+        'director': rng.choice(['d1', 'd2', 'd3', 'd4', None], n),
+        'language': rng.choice(['en', 'fr', 'hi', ''], n, p=[0.6, 0.2, 0.15, 0.05]),
+    })
+    collections = {f"tt{i:07d}": str(rng.integers(3)) for i in range(n) if rng.random() < 0.5}
+    rows = rng.permutation(n)
+    k = int(rng.integers(2, 30))
+    expected = reference(frame, rows, k, collections)
+    assert diversify(frame, rows, k, collections=collections).tolist() == expected.tolist()
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from evaluate import ranking_metrics, run_recommender, temporal_split
+from interactions import InteractionStore
+
+TITLES = ['tt1', 'tt2', 'tt3', 'tt4', 'tt5']
+# (user_id, tconst, rating, timestamp): eight before the cutoff, five at it
+LOG = [
+    (1, 'tt1', 8, 1), (1, 'tt2', 9, 2), (2, 'tt3', 7, 3), (3, 'tt4', 8, 4),
+    (3, 'tt5', 8, 5), (3, 'tt2', 9, 6), (3, 'tt1', 8, 7), (2, 'tt4', 6, 8),
+    (1, 'tt3', 9, 100),   # new and well rated: relevant for user 1
+    (1, 'tt1', 9, 100),   # rated before the cutoff: not a new find
+    (2, 'tt1', 8, 100),   # relevant for user 2
+    (2, 'tt5', 8, 100),   # relevant for user 2
+    (2, 'tt2', 5, 100),   # rated too low to count
+]
+
+@pytest.fixture
+def split(tmp_path):
+    movies = pd.DataFrame({'tconst': TITLES, 'averageRating': [9.0, 8.5, 8.0, 7.5, 7.0]})
+    store = InteractionStore.open(str(tmp_path / 'interactions'))
+    store = store.append(pd.DataFrame(LOG, columns=['user_id', 'tconst', 'rating', 'timestamp']), batch='log')
+    return temporal_split(SimpleNamespace(movies=movies, interactions=store))
+
+# Catalog rows of a split's CSR lists, per evaluated user
+def lists(indptr, rows):
+    return [sorted(TITLES[row] for row in rows[indptr[i]:indptr[i + 1]]) for i in range(len(indptr) - 1)]
+
+def test_temporal_split(split):
+    assert split.cutoff == 100
+    # User 3 has nothing after the cutoff and is not evaluated
+    assert split.user_ids.tolist() == [1, 2]
+    assert lists(split.relevant_indptr, split.relevant_rows) == [['tt3'], ['tt1', 'tt5']]
+    assert lists(split.seen_indptr, split.seen_rows) == [['tt1', 'tt2'], ['tt3', 'tt4']]
+    assert len(split.train_rows) == 8
+    assert split.history(1)['tconst'].tolist() == ['tt3', 'tt4']
+
+def test_ranking_metrics(split):
+    # User 1 misses; user 2 finds tt5 first and tt1 third
+    positions = np.array([[3, 4, -1], [4, 3, 0]])
+    metrics = ranking_metrics(split, positions, 3)
+    ndcg = (1 + 1 / np.log2(4)) / (1 + 1 / np.log2(3))
+    assert metrics['precision'] == pytest.approx((0 + 2 / 3) / 2)
+    assert metrics['recall'] == pytest.approx((0 + 1) / 2)
+    assert metrics['ndcg'] == pytest.approx((0 + ndcg) / 2)
+    assert metrics['hit_rate'] == 0.5
+    assert metrics['coverage'] == pytest.approx(3 / 5)
+
+def test_ideal_dcg_is_capped_at_k(split):
+    # Two relevant titles but k=1: a hit at rank one is a perfect list
+    metrics = ranking_metrics(split, np.array([[2], [0]]), 1)
+    assert metrics['ndcg'] == pytest.approx(1.0)
+    assert metrics['recall'] == pytest.approx((1 + 1 / 2) / 2)
+
+def test_popular_skips_seen_titles(split):
+    positions, _, calls = run_recommender(None, split, 'popular', 2)
+    # Training counts rank tt1, tt2, tt4 (two each) ahead of tt3 and tt5
+    assert positions.tolist() == [[3, 2], [0, 1]]
+    assert calls is None
@@ -0,0 +1,27 @@
+import pandas as pd
+import pytest
+
+from catalog import CatalogSnapshot
+from interactions import InteractionStore
+from recommend import SessionRecommender
+
+@pytest.fixture
+def snapshot(tmp_path):
+    movies = pd.DataFrame({
+        'tconst': [f'tt{i}' for i in range(6)],
+        'titleType': ['movie'] * 6,
+        'startYear': [2000 + i for i in range(6)],
+        'genres': ['Drama', 'Comedy', 'Drama', 'Comedy', 'Horror', 'Horror'],
+        'averageRating': [9.0, 8.5, 8.0, 7.5, 7.0, 6.5],
+        'language': ['English'] * 6,
+    })
+    streaming = pd.DataFrame({'tconst': [], 'netflix': [], 'prime_video': [], 'disney_plus': []})
+    return CatalogSnapshot.build(movies, streaming, InteractionStore.open(str(tmp_path / 'interactions')), movies.iloc[:0])
+
+def test_rank_follows_candidate_changes(snapshot):
+    recommender = SessionRecommender()
+    assert recommender.rank(snapshot, 'mood', [0, 2, 4], k=2).tolist() == [0, 2]
+    # Same length and first candidate, other titles (e.g. another platform filter)
+    assert recommender.rank(snapshot, 'mood', [0, 3, 5], k=2).tolist() == [0, 3]
+    assert recommender.rank(snapshot, 'mood', [0, 3, 5], k=3).tolist() == [0, 3, 5]
+    assert recommender.rank(snapshot, 'mood', [0, 3, 5], k=3) is recommender.rank(snapshot, 'mood', [0, 3, 5], k=3)
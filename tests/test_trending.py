@@ -0,0 +1,63 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from catalog import build_index
+from interactions import InteractionStore, ingest_csv
+from trending import TopK, TrendingEngine
+
+# Offer growing scores for random keys; TopK must always hold the k best latest scores
+def test_topk_tracks_best_of_increasing_scores():
+    rng = np.random.default_rng(0)
+    top, latest = TopK(k=5), {}
+    for step in range(3000):
+        key = int(rng.integers(60))
+        latest[key] = latest.get(key, 0.0) + rng.random()
+        top.offer(key, latest[key])
+        expected = dict(sorted(latest.items(), key=lambda item: -item[1])[:5])
+        assert dict(top.items()) == expected, step
+    # Stale entries are compacted away instead of piling up
+    assert len(top.heap) <= 4 * top.k + 1
+
+def test_topk_rejects_scores_below_the_kth():
+    top = TopK(k=2)
+    for key, score in [('a', 3.0), ('b', 2.0), ('c', 1.0)]:
+        top.offer(key, score)
+    assert dict(top.items()) == {'a': 3.0, 'b': 2.0}
+    top.offer('c', 2.5)
+    assert dict(top.items()) == {'a': 3.0, 'c': 2.5}
+    assert len(top) == 2
+
+def test_topk_scale_keeps_order():
+    top = TopK(k=3)
+    for key, score in [('a', 4.0), ('b', 8.0), ('c', 2.0), ('d', 1.0)]:
+        top.offer(key, score)
+    top.scale(0.5)
+    assert dict(top.items()) == {'a': 2.0, 'b': 4.0, 'c': 1.0}
+    top.offer('d', 1.5)
+    assert dict(top.items()) == {'a': 2.0, 'b': 4.0, 'd': 1.5}
+
+# Rebuild the store at root from (user_id, tconst) rows, one interaction per second
+def rebuild(tmp_path, rows):
+    csv_path = tmp_path / 'user_interactions.csv'
+    frame = pd.DataFrame(rows, columns=['user_id', 'tconst'])
+    frame.assign(rating=8, timestamp=np.arange(len(frame)) + 1_700_000_000).to_csv(csv_path, index=False)
+    return ingest_csv(str(csv_path), str(tmp_path / 'interactions'))
+
+def test_rebuilt_store_replaces_trending_scores(tmp_path):
+    movies = pd.DataFrame({'tconst': ['tt1', 'tt2', 'tt3'], 'titleType': 'movie', 'language': 'English'})
+    catalog = dict(movies=movies, type_index=build_index(movies['titleType']), language_index=build_index(movies['language']))
+    old = rebuild(tmp_path, [(1, 'tt1'), (2, 'tt1'), (1, 'tt2')])
+    engine = TrendingEngine().refresh(SimpleNamespace(interactions=old, **catalog))
+    assert engine.top(2).tolist() == [0, 1]
+    # Same part names, other item codes: tt3 gets code 0, which was tt1's
+    new = rebuild(tmp_path, [(1, 'tt3'), (2, 'tt3'), (3, 'tt3'), (1, 'tt2')])
+    assert new.manifest['build'] != old.manifest['build']
+    assert os.path.islink(tmp_path / 'interactions')
+    engine.refresh(SimpleNamespace(interactions=new, **catalog))
+    assert engine.top(3).tolist() == [2, 1]
+    # A view of the previous build still reads its own files
+    assert old.item_counts().to_dict() == {'tt1': 2, 'tt2': 1}
+    assert InteractionStore.open(str(tmp_path / 'interactions')).item_counts().to_dict() == {'tt3': 3, 'tt2': 1}
@@ -0,0 +1,229 @@
+"""
+🔥 Trending - time-decayed popularity from the interaction store
+Every interaction adds exp(λ·(t - landmark)) to its title's score, with λ set
+by CINEMATCH_TRENDING_HALF_LIFE_DAYS (default 7). Letting time pass scales
+every score by the same factor, so rankings only move when new interactions
+arrive. Only part files not consumed yet are read on refresh.
+
+A top-k heap per title type and per language is updated as scores grow, so a
+trending row is served from at most a few heaps of HEAP_SIZE titles. TMDB's
+daily trending list can be blended in (CINEMATCH_TRENDING_TMDB_WEIGHT, 0 to
+disable); its titles are matched to the catalog by title and year.
+"""
+import os
+import math
+import heapq
+import threading
+import weakref
+import numpy as np
+import pandas as pd
+
+HALF_LIFE = float(os.environ.get('CINEMATCH_TRENDING_HALF_LIFE_DAYS', '7')) * 86_400
+TMDB_WEIGHT = float(os.environ.get('CINEMATCH_TRENDING_TMDB_WEIGHT', '0.3'))
+# Titles kept per type/language heap; rows ask for far fewer
+HEAP_SIZE = 50
+# Scores are re-based before exp() gets anywhere near float64 overflow
+MAX_EXPONENT = 600
+# One engine per interaction store, shared by every snapshot and session
+ENGINES = {}
+ENGINES_LOCK = threading.Lock()
+# "title|year" -> position lookups per snapshot, for matching TMDB results
+TITLE_KEYS = weakref.WeakKeyDictionary()
+
+class TopK:
+    """The k best keys under scores that only ever increase
+
+    A min-heap with lazy deletion: a raised score is pushed again and the
+    stale entry is skipped when it reaches the top.
+    """
+
+    def __init__(self, k=HEAP_SIZE):
+        self.k = k
+        self.heap = []
+        self.scores = {}
+
+    def __len__(self):
+        return len(self.scores)
+
+    def offer(self, key, score):
+        if key in self.scores:
+            self.scores[key] = score
+        elif len(self.scores) < self.k:
+            self.scores[key] = score
+        else:
+            self._drop_stale()
+            if score <= self.heap[0][0]:
+                return
+            _, evicted = heapq.heappop(self.heap)
+            del self.scores[evicted]
+            self.scores[key] = score
+        heapq.heappush(self.heap, (score, key))
+        if len(self.heap) > 4 * self.k:
+            self.heap = [(s, k) for k, s in self.scores.items()]
+            heapq.heapify(self.heap)
+
+    def _drop_stale(self):
+        while self.heap and self.scores.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+
+    def scale(self, factor):
+        self.scores = {key: score * factor for key, score in self.scores.items()}
+        self.heap = [(s, k) for k, s in self.scores.items()]
+        heapq.heapify(self.heap)
+
+    def items(self):
+        return self.scores.items()
+
+class TrendingEngine:
+    """Decayed interaction counts per title and top-k heaps per type and language"""
+
+    def __init__(self, half_life=HALF_LIFE, heap_size=HEAP_SIZE):
+        self.rate = math.log(2) / half_life
+        self.heap_size = heap_size
+        self.scores = np.zeros(0)
+        self.landmark = None
+        # (build, part path) of every part folded in; a rebuilt store reuses part names
+        self.build = None
+        self.consumed = set()
+        self.movies = None
+        self.item_rows = np.zeros(0, dtype=np.int64)
+        self.heaps = {}
+        self.lock = threading.Lock()
+
+    def refresh(self, snapshot):
+        """Fold in parts added to the store and follow catalog changes; returns self"""
+        store = snapshot.interactions
+        with self.lock:
+            build = store.manifest.get('build')
+            if build != self.build:
+                # Item codes of another build mean other titles: start over
+                self.build = build
+                self.scores = np.zeros(0)
+                self.landmark = None
+                self.consumed = set()
+                self.movies = None
+            new = [part for part in store.parts if (build, part['path']) not in self.consumed]
+            if self.landmark is None:
+                self.landmark = max((part['end'] for part in store.parts), default=0)
+            changed = []
+            if new:
+                if len(self.scores) < len(store.items):
+                    self.scores = np.pad(self.scores, (0, len(store.items) - len(self.scores)))
+                self._rebase(max(part['end'] for part in new))
+                for table in store.iter_tables(parts=new, columns=['item', 'timestamp']):
+                    items = table.column('item').to_numpy()
+                    timestamp = table.column('timestamp').to_numpy()
+                    self.scores += np.bincount(items, weights=np.exp(self.rate * (timestamp - self.landmark)), minlength=len(self.scores))
+                    changed.append(items)
+                self.consumed.update((build, part['path']) for part in new)
+            if snapshot.movies is not self.movies:
+                self._rebuild(snapshot)
+            else:
+                if len(self.item_rows) < len(store.items):
+                    added = store.items.values[len(self.item_rows):]
+                    self.item_rows = np.concatenate([self.item_rows, pd.Index(self.movies['tconst']).get_indexer(added)])
+                if changed:
+                    self._offer(np.unique(np.concatenate(changed)))
+        return self
+
+    def _rebase(self, latest):
+        if self.rate * (latest - self.landmark) <= MAX_EXPONENT:
+            return
+        factor = math.exp(-self.rate * (latest - self.landmark))
+        self.scores *= factor
+        for heap in self.heaps.values():
+            heap.scale(factor)
+        self.landmark = latest
+
+    def _rebuild(self, snapshot):
+        """Map item codes to catalog rows and refill every heap (catalog changes only)"""
+        movies = snapshot.movies
+        self.movies = movies
+        self.item_rows = pd.Index(movies['tconst']).get_indexer(snapshot.interactions.items.values)
+        self.types = movies['titleType'].to_numpy(dtype=object)
+        self.languages = movies['language'].to_numpy(dtype=object)
+        by_row = np.zeros(len(movies))
+        known = self.item_rows[:len(self.scores)] >= 0
+        by_row[self.item_rows[:len(self.scores)][known]] = self.scores[known]
+        self.heaps = {}
+        for kind, index in (('type', snapshot.type_index), ('language', snapshot.language_index)):
+            for value, rows in index.items():
+                rows = rows[by_row[rows] > 0]
+                if len(rows) > self.heap_size:
+                    rows = rows[np.argpartition(-by_row[rows], self.heap_size - 1)[:self.heap_size]]
+                heap = self.heaps[(kind, value)] = TopK(self.heap_size)
+                for row in rows:
+                    heap.offer(int(row), float(by_row[row]))
+
+    def _offer(self, items):
+        for item in items:
+            row = self.item_rows[item] if item < len(self.item_rows) else -1
+            if row < 0:
+                continue
+            score = float(self.scores[item])
+            for key in (('type', self.types[row]), ('language', self.languages[row])):
+                self.heaps.setdefault(key, TopK(self.heap_size)).offer(int(row), score)
+
+    def top(self, k=20, types=None, languages=None, boost=None, boost_weight=TMDB_WEIGHT):
+        """Best k positions by decayed score, optionally blended with boost {position: 0..1}
+
+        Candidates are the heaps of the given types (or languages, or every
+        type); with both given, type heap members are filtered by language.
+        """
+        with self.lock:
+            if types:
+                keys = [('type', t) for t in types]
+            elif languages:
+                keys = [('language', l) for l in languages]
+            else:
+                keys = [key for key in self.heaps if key[0] == 'type']
+            candidates = {}
+            for key in keys:
+                if key in self.heaps:
+                    candidates.update(self.heaps[key].items())
+        if types and languages:
+            candidates = {row: score for row, score in candidates.items() if self.languages[row] in languages}
+        if boost and boost_weight:
+            for row in boost:
+                if (not types or self.types[row] in types) and (not languages or self.languages[row] in languages):
+                    candidates.setdefault(row, 0.0)
+            best = max(candidates.values(), default=0.0) or 1.0
+            candidates = {row: (1 - boost_weight) * score / best + boost_weight * boost.get(row, 0.0) for row, score in candidates.items()}
+        ranked = sorted(candidates, key=candidates.get, reverse=True)[:k]
+        return np.asarray(ranked, dtype=np.int64)
+
+# The process-wide engine for a snapshot's interaction store, brought up to date
+def trending_engine(snapshot):
+    root = os.path.abspath(snapshot.interactions.path)
+    with ENGINES_LOCK:
+        engine = ENGINES.get(root)
+        if engine is None:
+            engine = ENGINES[root] = TrendingEngine()
+    return engine.refresh(snapshot)
+
+# Catalog position of a TMDB result (movie or TV), matched by title and year; None if unknown
+def match_tmdb_result(snapshot, result):
+    keys = TITLE_KEYS.get(snapshot)
+    if keys is None:
+        movies = snapshot.movies
+        years = pd.to_numeric(movies['startYear'], errors='coerce').fillna(0).astype(int).astype(str)
+        names = movies['primaryTitle'].astype('string').str.lower() + '|' + years
+        # Most voted title wins when several share a title and year
+        order = np.argsort(-movies['numVotes'].to_numpy(), kind='stable')
+        keys = pd.Series(order, index=names.to_numpy()[order])
+        keys = keys[~keys.index.duplicated()]
+        TITLE_KEYS[snapshot] = keys
+    title = (result.get('title') or result.get('name') or '').lower()
+    date = result.get('release_date') or result.get('first_air_date') or ''
+    year = int(date[:4]) if date[:4].isdigit() else 0
+    row = keys.get(f"{title}|{year}")
+    return None if row is None else int(row)
+
+# Catalog positions of TMDB trending results, as {position: 1.0 for the first .. near 0 for the last}
+def tmdb_trending_boost(snapshot, results):
+    boost = {}
+    for rank, result in enumerate(results or []):
+        row = match_tmdb_result(snapshot, result)
+        if row is not None:
+            boost.setdefault(row, 1 - rank / len(results))
+    return boost
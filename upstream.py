@@ -0,0 +1,563 @@
+"""
+🌐 Upstream - TMDB and OMDB fetchers
+Base URLs come from the environment so the app can run against mock_upstream.py:
+  CINEMATCH_UPSTREAM      one mock server for everything (e.g. http://127.0.0.1:8765)
+  CINEMATCH_TMDB_API      TMDB API base       (default https://api.themoviedb.org/3)
+  CINEMATCH_TMDB_IMAGES   TMDB image base     (default https://image.tmdb.org/t/p)
+  CINEMATCH_OMDB_API      OMDB API endpoint   (default http://www.omdbapi.com/)
+Requests can be capped by one process-wide rate limiter (CINEMATCH_UPSTREAM_RPS,
+off by default) and, when CINEMATCH_UPSTREAM_CACHE names a directory, answered
+from a response cache on disk that is shared by server processes, restarts and
+`python warm.py`. Threads marked with background_thread() (warm-up, prefetch,
+provider refreshes) always take a token from their own bucket
+(CINEMATCH_UPSTREAM_BACKGROUND_RPS), so page loads are not queued behind them.
+"""
+import os
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+import requests
+from caches import bounded_cache
+from io import BytesIO
+
+MOCK_UPSTREAM = os.environ.get('CINEMATCH_UPSTREAM', '').rstrip('/')
+TMDB_API = os.environ.get('CINEMATCH_TMDB_API', f"{MOCK_UPSTREAM}/3" if MOCK_UPSTREAM else "https://api.themoviedb.org/3")
+TMDB_IMAGES = os.environ.get('CINEMATCH_TMDB_IMAGES', f"{MOCK_UPSTREAM}/t/p" if MOCK_UPSTREAM else "https://image.tmdb.org/t/p")
+OMDB_API = os.environ.get('CINEMATCH_OMDB_API', f"{MOCK_UPSTREAM}/omdb/" if MOCK_UPSTREAM else "http://www.omdbapi.com/")
+
+# Longest Retry-After we are willing to wait out inside a page render
+MAX_RETRY_AFTER = 2.0
+# Sustained requests per second towards the upstreams (TMDB allows about 50); 0 (the default) disables
+UPSTREAM_RPS = float(os.environ.get('CINEMATCH_UPSTREAM_RPS', '0'))
+# Requests per second background threads may use (default a quarter of UPSTREAM_RPS, or 10 without one)
+BACKGROUND_RPS = float(os.environ.get('CINEMATCH_UPSTREAM_BACKGROUND_RPS', str(UPSTREAM_RPS / 4 if UPSTREAM_RPS else 10)))
+RESPONSE_CACHE_DIR = os.environ.get('CINEMATCH_UPSTREAM_CACHE')
+RESPONSE_CACHE_TTL = float(os.environ.get('CINEMATCH_UPSTREAM_CACHE_TTL', str(12 * 3600)))
+# Query parameters that never change a response (credentials)
+UNCACHED_PARAMS = {'apikey', 'api_key'}
+# Watch-provider offers that count as "streaming": subscription, free and with ads (not rent/buy)
+STREAM_OFFERS = ('flatrate', 'free', 'ads')
+# Seasons of ended series (and every season before the latest) no longer change
+FINISHED_SEASON_TTL = 30 * 86_400
+AIRING_SEASON_TTL = 6 * 3600
+FINISHED_STATUSES = ('Ended', 'Canceled')
+SEASON_WORKERS = 8
+# Byte budgets of the response caches (CINEMATCH_CACHE_MB_<NAME> overrides); see caches.py
+DETAILS_CACHE_MB = 64
+TMDB_CACHE_MB = 64
+SEASONS_CACHE_MB = 32
+IMAGES_CACHE_MB = 256
+
+class TokenBucket:
+    """Blocking token bucket; callers past the burst sleep for their share"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping if the bucket is empty; returns seconds waited"""
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+RATE_LIMITER = TokenBucket(UPSTREAM_RPS)
+BACKGROUND_LIMITER = TokenBucket(BACKGROUND_RPS)
+BACKGROUND = threading.local()
+
+# Count the calling thread's upstream requests against the background share from now on
+def background_thread():
+    BACKGROUND.active = True
+
+# Wait for a request slot: background threads for their share first, then everyone for the total
+def acquire_slot():
+    if getattr(BACKGROUND, 'active', False):
+        BACKGROUND_LIMITER.acquire()
+    return RATE_LIMITER.acquire()
+
+# Read an API credential; the mock server accepts anything
+def get_secret(name):
+    try:
+        return st.secrets[name]
+    except Exception:
+        if MOCK_UPSTREAM:
+            return "mock"
+        raise
+
+# Build a TMDB image URL for a poster/backdrop path
+def tmdb_image_url(path, size='w500'):
+    return f"{TMDB_IMAGES}/{size}{path}"
+
+# File in the response cache for a URL and its (credential-free) query
+def response_cache_path(url, params):
+    if not RESPONSE_CACHE_DIR:
+        return None
+    query = sorted((k, str(v)) for k, v in (params or {}).items() if k not in UNCACHED_PARAMS)
+    key = hashlib.sha1(f"{url}?{query}".encode()).hexdigest()
+    return os.path.join(RESPONSE_CACHE_DIR, key[:2], key)
+
+# A fresh cached 200 response, or None
+def read_cached_response(path, ttl=None):
+    try:
+        if time.time() - os.path.getmtime(path) > (ttl or RESPONSE_CACHE_TTL):
+            return None
+        with open(path, 'rb') as f:
+            content = f.read()
+    except (OSError, TypeError):
+        return None
+    response = requests.Response()
+    response.status_code = 200
+    response._content = content
+    return response
+
+def write_cached_response(path, response):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        staging = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        with open(staging, 'wb') as f:
+            f.write(response.content)
+        os.replace(staging, path)
+    except OSError:
+        pass
+
+# GET a URL under the rate limiter, waiting out one 429 if the server asks us to
+def http_get(url, timeout, cache_ttl=None, **kwargs):
+    cache_path = response_cache_path(url, kwargs.get('params'))
+    if cache_path:
+        cached = read_cached_response(cache_path, cache_ttl)
+        if cached is not None:
+            return cached
+    acquire_slot()
+    response = requests.get(url, timeout=timeout, **kwargs)
+    if response.status_code == 429:
+        try:
+            retry_after = float(response.headers.get('Retry-After', 1))
+        except ValueError:
+            retry_after = 1.0
+        time.sleep(min(retry_after, MAX_RETRY_AFTER))
+        acquire_slot()
+        response = requests.get(url, timeout=timeout, **kwargs)
+    if cache_path and response.status_code == 200:
+        write_cached_response(cache_path, response)
+    return response
+
+# Authenticated TMDB GET; returns parsed JSON or None (cache_ttl overrides the disk cache TTL)
+def tmdb_get(path, params=None, timeout=8, cache_ttl=None):
+    headers = {
+        "accept": "application/json",
+        "Authorization": f"Bearer {get_secret('tmdb_token')}"
+    }
+    response = http_get(f"{TMDB_API}/{path}", timeout, cache_ttl, headers=headers, params=params)
+    if response.status_code == 200:
+        return response.json()
+    return None
+
+# OMDB lookup by IMDb id, or by title and year; returns parsed JSON or None
+def omdb_get(title, year, imdb_id=None, timeout=5):
+    params = {"apikey": get_secret('omdb_key')}
+    if imdb_id:
+        params["i"] = imdb_id
+    else:
+        params["t"] = title.replace(':', '').replace('?', '').replace('"', '').strip()
+        params["y"] = int(year)
+        params["type"] = "movie"
+    response = http_get(OMDB_API, timeout, params=params)
+    if response.status_code == 200:
+        data = response.json()
+        if data.get('Response') == 'True':
+            return data
+    return None
+
+# TMDB Authentication Verification
+def verify_tmdb_authentication():
+    """Verify TMDB API authentication status"""
+    try:
+        headers = {
+            "accept": "application/json",
+            "Authorization": f"Bearer {get_secret('tmdb_token')}"
+        }
+        response = requests.get(f"{TMDB_API}/authentication", headers=headers)
+        return response.text
+    except Exception as e:
+        return f"Authentication error: {str(e)}"
+
+# {region: [provider names]} of a watch/providers `results` payload
+def streaming_providers(results):
+    regions = {}
+    for region, offers in (results or {}).items():
+        names = [p['provider_name'] for kind in STREAM_OFFERS for p in offers.get(kind, []) if p.get('provider_name')]
+        if names:
+            regions[region] = list(dict.fromkeys(names))
+    return regions
+
+# TMDB search endpoint for a catalog titleType
+def search_endpoint(content_type):
+    return "tv" if content_type and content_type.lower() in ['tv', 'tvseries', 'tvmovie'] else "movie"
+
+# Enhanced movie details fetcher - Multiple sources
+@bounded_cache('details', DETAILS_CACHE_MB, ttl=7200)
+def get_movie_details(title, year, imdb_id=None, content_type='movie'):
+    """Fetch movie details from multiple sources"""
+    details = {
+        'poster': None,
+        'plot': None,
+        'director': None,
+        'actors': None,
+        'runtime': None,
+        'writer': None,
+    }
+
+    # First, try to get ID from search result if available
+    tmdb_id = None
+    endpoint = search_endpoint(content_type)
+
+    # We need to find the TMDB ID first to get details and providers
+    try:
+        params = {
+            "query": title,
+            "year": int(year) if endpoint == "movie" else None,
+            "first_air_date_year": int(year) if endpoint == "tv" else None,
+            "language": "en-US"
+        }
+        data = tmdb_get(f"search/{endpoint}", params, timeout=5)
+        results = data.get('results', []) if data else []
+        if results:
+            tmdb_id = results[0]['id']
+            poster_path = results[0].get('poster_path')
+            if poster_path:
+                details['poster'] = tmdb_image_url(poster_path)
+            details['plot'] = results[0].get('overview') or details['plot']
+    except:
+        pass
+
+    # If we have TMDB ID, get full details (credits for Director) and Watch Providers
+    if tmdb_id:
+        try:
+            # Get Credits (Director)
+            credits_data = tmdb_get(f"{endpoint}/{tmdb_id}/credits", timeout=5)
+            if credits_data:
+                # Find director in crew
+                directors = [m['name'] for m in credits_data.get('crew', []) if m['job'] == 'Director']
+                if directors:
+                    details['director'] = ", ".join(directors[:2])
+
+                # Get actors
+                actors = [m['name'] for m in credits_data.get('cast', [])]
+                if actors:
+                    details['actors'] = ", ".join(actors[:4])
+
+            # Get Watch Providers
+            prov_data = tmdb_get(f"{endpoint}/{tmdb_id}/watch/providers", timeout=5)
+            if prov_data:
+                # Every region is kept; cards show the viewer's region
+                details['providers'] = streaming_providers(prov_data.get('results'))
+                if details['providers'].get('US'):
+                    details['streaming'] = details['providers']['US']
+        except:
+            pass
+
+    # Fallback to OMDB if still missing info
+    if not details['poster'] or not details['director']:
+        omdb_data = get_omdb_data(title, year, imdb_id)
+        if omdb_data:
+            if not details['poster']: details['poster'] = omdb_data.get('poster')
+            if not details['director']: details['director'] = omdb_data.get('director')
+            if not details['plot'] or len(details['plot']) < 20: details['plot'] = omdb_data.get('plot')
+
+    return details
+
+# Fetch from TMDB using Bearer Token (authenticated)
+def get_poster_from_tmdb_bearer(title, year, content_type='movie'):
+    """Fetch poster from TMDB API using Bearer token authentication"""
+    try:
+        # Determine endpoint based on content type
+        endpoint = search_endpoint(content_type)
+        params = {
+            "query": title,
+            "year": int(year) if endpoint == "movie" else None, # TV search uses first_air_date_year usually, or just query
+            "first_air_date_year": int(year) if endpoint == "tv" else None,
+            "language": "en-US"
+        }
+        data = tmdb_get(f"search/{endpoint}", params)
+        if data and data.get('results'):
+            poster_path = data['results'][0].get('poster_path')
+            if poster_path:
+                return tmdb_image_url(poster_path)
+    except Exception as e:
+        pass
+    return None
+
+# Get movie details by ID from TMDB
+@bounded_cache('tmdb', TMDB_CACHE_MB, ttl=3600)
+def get_tmdb_movie_details(movie_id):
+    """Fetch movie details from TMDB by ID"""
+    try:
+        return tmdb_get(f"movie/{movie_id}", {"language": "en-US"}) or {}
+    except Exception as e:
+        pass
+    return {}
+
+# Get movie images from TMDB
+@bounded_cache('tmdb', TMDB_CACHE_MB, ttl=3600)
+def get_tmdb_movie_images(movie_id):
+    """Fetch movie images (posters, backdrops) from TMDB"""
+    try:
+        return tmdb_get(f"movie/{movie_id}/images") or {}
+    except Exception as e:
+        pass
+    return {}
+
+# Get trending movies from TMDB
+@bounded_cache('tmdb', TMDB_CACHE_MB, ttl=3600)
+def get_tmdb_trending():
+    """Fetch trending movies from TMDB discover endpoint"""
+    try:
+        params = {
+            "include_adult": "false",
+            "include_video": "false",
+            "language": "en-US",
+            "page": 1,
+            "sort_by": "popularity.desc"
+        }
+        data = tmdb_get("discover/movie", params)
+        if data:
+            return data.get('results', [])
+    except Exception as e:
+        pass
+    return []
+
+# Get trending TV series from TMDB
+@bounded_cache('tmdb', TMDB_CACHE_MB, ttl=3600)
+def get_tmdb_trending_tv():
+    """Fetch trending TV series from TMDB discover endpoint"""
+    try:
+        params = {
+            "include_adult": "false",
+            "include_null_first_air_dates": "false",
+            "language": "en-US",
+            "page": 1,
+            "sort_by": "popularity.desc"
+        }
+        data = tmdb_get("discover/tv", params)
+        if data:
+            return data.get('results', [])
+    except Exception as e:
+        pass
+    return []
+
+# Get daily trending content from TMDB (movies + TV)
+@bounded_cache('tmdb', TMDB_CACHE_MB, ttl=1800)
+def get_tmdb_daily_trending():
+    """Fetch daily trending content (movies & TV) from TMDB"""
+    try:
+        data = tmdb_get("trending/all/day", {"language": "en-US"})
+        if data:
+            return data.get('results', [])
+    except Exception as e:
+        pass
+    return []
+
+# Search movie collections from TMDB
+@bounded_cache('tmdb', TMDB_CACHE_MB, ttl=3600)
+def search_tmdb_collections(query):
+    """Search for movie collections from TMDB"""
+    try:
+        params = {
+            "query": query,
+            "include_adult": "false",
+            "language": "en-US",
+            "page": 1
+        }
+        data = tmdb_get("search/collection", params)
+        if data:
+            return data.get('results', [])
+    except Exception as e:
+        pass
+    return []
+
+# Search TV series from TMDB
+@bounded_cache('tmdb', TMDB_CACHE_MB, ttl=3600)
+def search_tmdb_tv(query):
+    """Search for TV series from TMDB; None when the request fails"""
+    try:
+        data = tmdb_get("search/tv", {"query": query, "language": "en-US", "page": 1})
+        if data is not None:
+            return data.get('results', [])
+    except Exception as e:
+        pass
+    return None
+
+# Get collection details from TMDB
+@bounded_cache('tmdb', TMDB_CACHE_MB, ttl=3600)
+def get_tmdb_collection_details(collection_id):
+    """Fetch collection details from TMDB"""
+    try:
+        return tmdb_get(f"collection/{collection_id}", {"language": "en-US"}) or {}
+    except Exception as e:
+        pass
+    return {}
+
+# Get collection images from TMDB
+@bounded_cache('tmdb', TMDB_CACHE_MB, ttl=3600)
+def get_tmdb_collection_images(collection_id):
+    """Fetch collection images from TMDB"""
+    try:
+        return tmdb_get(f"collection/{collection_id}/images") or {}
+    except Exception as e:
+        pass
+    return {}
+
+# Get watch providers from TMDB
+@bounded_cache('tmdb', TMDB_CACHE_MB, ttl=3600)
+def get_tmdb_watch_providers(movie_id, region='US'):
+    """Fetch watch providers for a movie from TMDB (one region, or every region with region=None)"""
+    try:
+        data = tmdb_get(f"movie/{movie_id}/watch/providers")
+        if data:
+            results = data.get('results', {})
+            return results if region is None else results.get(region, {})
+    except Exception as e:
+        pass
+    return {}
+
+# Get watch providers for TV series from TMDB
+@bounded_cache('tmdb', TMDB_CACHE_MB, ttl=3600)
+def get_tmdb_tv_watch_providers(series_id, region='US'):
+    """Fetch watch providers for a TV series from TMDB (one region, or every region with region=None)"""
+    try:
+        data = tmdb_get(f"tv/{series_id}/watch/providers")
+        if data:
+            results = data.get('results', {})
+            return results if region is None else results.get(region, {})
+    except Exception as e:
+        pass
+    return {}
+
+# Get TV series details and images from TMDB
+@bounded_cache('tmdb', TMDB_CACHE_MB, ttl=3600)
+def get_tmdb_tv_series_images(series_id):
+    """Fetch TV series images from TMDB"""
+    try:
+        return tmdb_get(f"tv/{series_id}/images") or {}
+    except Exception as e:
+        pass
+    return {}
+
+# Get TV series details from TMDB (improved)
+@bounded_cache('tmdb', TMDB_CACHE_MB, ttl=3600)
+def get_tmdb_tv_series_details(series_id):
+    """Fetch TV series details from TMDB"""
+    try:
+        return tmdb_get(f"tv/{series_id}", {"language": "en-US"}) or {}
+    except Exception as e:
+        pass
+    return {}
+
+# One season with its episodes; finished seasons are cached for a month, the airing one for hours
+@bounded_cache('seasons', SEASONS_CACHE_MB, ttl=FINISHED_SEASON_TTL)
+def get_tmdb_tv_season(series_id, season_number):
+    """Fetch a finished TV season (episodes included) from TMDB"""
+    try:
+        return tmdb_get(f"tv/{series_id}/season/{season_number}", {"language": "en-US"}, cache_ttl=FINISHED_SEASON_TTL) or {}
+    except Exception as e:
+        pass
+    return {}
+
+@bounded_cache('seasons', SEASONS_CACHE_MB, ttl=AIRING_SEASON_TTL)
+def get_tmdb_tv_airing_season(series_id, season_number):
+    """Fetch a season that may still get episodes from TMDB"""
+    try:
+        return tmdb_get(f"tv/{series_id}/season/{season_number}", {"language": "en-US"}, cache_ttl=AIRING_SEASON_TTL) or {}
+    except Exception as e:
+        pass
+    return {}
+
+# Every season of a series (from get_tmdb_tv_series_details), fetched concurrently, in season order
+def get_tmdb_tv_seasons(series_data, ctx=None, workers=SEASON_WORKERS):
+    numbers = sorted(s['season_number'] for s in series_data.get('seasons', []) if s.get('season_number') is not None)
+    if not numbers:
+        return []
+    finished = series_data.get('status') in FINISHED_STATUSES
+    latest = max(numbers)
+
+    def fetch(number):
+        loader = get_tmdb_tv_season if finished or number < latest else get_tmdb_tv_airing_season
+        return loader(series_data['id'], number)
+
+    initializer = None
+    if ctx is not None:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx
+        initializer = lambda: add_script_run_ctx(threading.current_thread(), ctx)
+    with ThreadPoolExecutor(max_workers=min(workers, len(numbers)), initializer=initializer) as pool:
+        return [season for season in pool.map(fetch, numbers) if season]
+
+# Fetch from OMDB
+def get_poster_from_omdb(title, year, imdb_id=None):
+    """Fetch poster from OMDB"""
+    try:
+        data = omdb_get(title, year, imdb_id)
+        if data:
+            poster = data.get('Poster')
+            if poster and poster != 'N/A':
+                return poster
+    except:
+        pass
+    return None
+
+# Fetch OMDB data for plot, director, etc
+def get_omdb_data(title, year, imdb_id=None):
+    """Fetch plot, director, and other info from OMDB"""
+    try:
+        data = omdb_get(title, year, imdb_id)
+        if data:
+            return {
+                'plot': data.get('Plot') if data.get('Plot') and data.get('Plot') != 'N/A' else None,
+                'director': data.get('Director') if data.get('Director') and data.get('Director') != 'N/A' else None,
+                'actors': data.get('Actors') if data.get('Actors') and data.get('Actors') != 'N/A' else None,
+                'runtime': data.get('Runtime') if data.get('Runtime') and data.get('Runtime') != 'N/A' else None,
+                'writer': data.get('Writer') if data.get('Writer') and data.get('Writer') != 'N/A' else None,
+            }
+    except:
+        pass
+    return {}
+
+# Download image
+@bounded_cache('images', IMAGES_CACHE_MB, ttl=3600, policy='lfu')
+def get_image(url):
+    """Download image with error handling"""
+    try:
+        headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+        }
+        # st.write(f"DEBUG: Fetching {url}")
+        response = http_get(url, 10, headers=headers)
+        if response.status_code == 200:
+            from PIL import Image  # only needed once a poster actually downloads
+            img = Image.open(BytesIO(response.content))
+            # Decode now: the cached image is shared by every session's threads
+            img.load()
+            return img
+    except Exception as e:
+        # print(f"Error loading image {url}: {e}")
+        pass
+    return None
+
+# Fetch remote details and poster for one card (runs on a worker thread)
+def fetch_card_enrichment(movie):
+    """Fetch TMDB/OMDB details and the decoded poster image for a movie"""
+    details = get_movie_details(movie['primaryTitle'], movie['startYear'], movie.get('tconst'), movie.get('titleType'))
+    img = get_image(details['poster']) if details and details.get('poster') else None
+    return details, img
@@ -0,0 +1,128 @@
+"""
+🔥 Cache Warmer - pre-fetch metadata and posters for the most viewed titles
+Ranks every title the pages show by default (trending rows, mood rows, Top
+Rated/By Genre/By Language tabs, Indian) by views in the interaction store,
+then numVotes, tops the list up from the whole catalog, and fetches the
+details and poster of each through the upstream rate limiter.
+
+    CINEMATCH_UPSTREAM_CACHE=/var/cache/cinematch python warm.py --top 500   # before the deploy takes traffic
+    CINEMATCH_WARM_TOP_N=500 streamlit run streamlit_app.py                  # or warm inside the server at boot
+
+The CLI fills the on-disk response cache, which the server processes read,
+so it needs CINEMATCH_UPSTREAM_CACHE pointing at the same directory.
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+from catalog import load_data
+from streamlit.runtime.scriptrunner import add_script_run_ctx
+from queries import default_result_sets
+from upstream import fetch_card_enrichment, background_thread, RESPONSE_CACHE_DIR, UPSTREAM_RPS
+
+WARM_TOP_N = int(os.environ.get('CINEMATCH_WARM_TOP_N', '0'))
+WARM_WORKERS = 8
+RANKINGS = ('views', 'numVotes')
+
+# Views per title from the interaction store's running counts
+def title_views(catalog):
+    return catalog.interactions.item_counts()
+
+# The `top_n` titles worth warming, default page results first
+def warm_candidates(catalog, top_n, by='views'):
+    shown = pd.concat(default_result_sets(catalog).values(), ignore_index=True).drop_duplicates('tconst')
+    views = title_views(catalog) if by == 'views' else pd.Series(dtype='int64')
+
+    def ranked(frame):
+        frame = frame.assign(views=frame['tconst'].map(views).fillna(0).astype('int64'))
+        return frame.sort_values(['views', 'numVotes'], ascending=False, kind='stable')
+
+    candidates = ranked(shown).head(top_n)
+    if len(candidates) < top_n:
+        extra = catalog.movies[~catalog.movies['tconst'].isin(candidates['tconst'])]
+        candidates = pd.concat([candidates, ranked(extra).head(top_n - len(candidates))], ignore_index=True)
+    return candidates.reset_index(drop=True)
+
+class CacheWarmer:
+    """Fetches card enrichment for a list of titles with a progress counter"""
+
+    def __init__(self, titles, workers=WARM_WORKERS, progress=None):
+        self.titles = titles
+        self.workers = workers
+        self.progress = progress
+        self.done = 0
+        self.with_poster = 0
+        self.failed = 0
+        self.elapsed = 0.0
+        self.finished = False
+
+    @property
+    def total(self):
+        return len(self.titles)
+
+    def run(self, ctx=None, background=False):
+        started = time.perf_counter()
+
+        # In the server, workers need the session context for st.secrets and
+        # share the upstream budget with page loads as background threads
+        def initializer():
+            if ctx is not None:
+                add_script_run_ctx(threading.current_thread(), ctx)
+            if background:
+                background_thread()
+        rows = [movie for _, movie in self.titles.iterrows()]
+        step = max(len(rows) // 20, 1)
+        with ThreadPoolExecutor(max_workers=self.workers, initializer=initializer) as pool:
+            futures = [pool.submit(fetch_card_enrichment, movie) for movie in rows]
+            for future in as_completed(futures):
+                try:
+                    details, img = future.result()
+                    self.with_poster += img is not None
+                    self.failed += not details
+                except Exception:
+                    self.failed += 1
+                self.done += 1
+                self.elapsed = time.perf_counter() - started
+                if self.progress and (self.done % step == 0 or self.done == len(rows)):
+                    self.progress(self)
+        self.finished = True
+        return self
+
+    def status(self):
+        rate = self.done / self.elapsed if self.elapsed else 0.0
+        eta = (self.total - self.done) / rate if rate else float('nan')
+        return (f"{self.done}/{self.total} titles warmed, {self.with_poster} posters, {self.failed} failed "
+                f"({rate:.1f}/s, {self.elapsed:.1f}s elapsed, ETA {eta:.0f}s)")
+
+def print_progress(warmer):
+    print(f"[warm] {warmer.status()}", flush=True)
+
+# Warm inside the server on a background thread; returns the warmer for status display
+def start_background_warm(catalog, top_n=WARM_TOP_N, ctx=None, by='views'):
+    warmer = CacheWarmer(warm_candidates(catalog, top_n, by), progress=print_progress)
+    threading.Thread(target=warmer.run, args=(ctx, True), name='cinematch-warm', daemon=True).start()
+    return warmer
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm the CineMatch upstream caches")
+    parser.add_argument('--top', type=int, default=WARM_TOP_N or 500, help="number of titles to warm")
+    parser.add_argument('--by', choices=RANKINGS, default='views', help="rank by interaction count or IMDb votes")
+    parser.add_argument('--workers', type=int, default=WARM_WORKERS)
+    parser.add_argument('--data-dir', default='data')
+    args = parser.parse_args()
+
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    if not RESPONSE_CACHE_DIR:
+        print("CINEMATCH_UPSTREAM_CACHE is not set; responses will not outlive this process", file=sys.stderr)
+    catalog = load_data(args.data_dir, os.environ.get('CINEMATCH_SHARED_CATALOG'))
+    titles = warm_candidates(catalog, args.top, args.by)
+    print(f"[warm] {len(titles)} titles by {args.by}, {args.workers} workers, {f'{UPSTREAM_RPS:g} requests/s' if UPSTREAM_RPS else 'no rate limit'}", flush=True)
+    warmer = CacheWarmer(titles, args.workers, progress=print_progress).run()
+    sys.exit(1 if warmer.total and warmer.failed == warmer.total else 0)
+
+if __name__ == '__main__':
+    main()